@@ -0,0 +1,79 @@
+"""In-process routing table of the callback endpoint.
+
+Maps the (app_id, type) of every channel that is not deleted to the channel
+id, bot id and status, so incoming messages are routed without reading the
+database. The table is loaded at startup and reloaded on the first lookup
+after it expired, or after this replica created or updated a channel. The
+TTL bounds how long a replica routes with a stale table when a channel was
+changed through another replica.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+from lib.db_session_handler import DBSessionHandler
+from lib.models import JBChannel
+
+CHANNEL_ROUTES_TTL = float(os.getenv("CHANNEL_ROUTES_TTL") or 60)
+
+
+class ChannelRoute(NamedTuple):
+    channel_id: str
+    bot_id: str
+    status: str
+
+
+async def get_channel_routes() -> Dict[Tuple[str, str], ChannelRoute]:
+    query = select(
+        JBChannel.app_id,
+        JBChannel.type,
+        JBChannel.id,
+        JBChannel.bot_id,
+        JBChannel.status,
+    ).where(JBChannel.status != "deleted")
+    async with DBSessionHandler.get_async_session() as session:
+        async with session.begin():
+            result = await session.execute(query)
+            rows = result.all()
+    routes = {}
+    for app_id, channel_type, channel_id, bot_id, status in rows:
+        # inactive channels of other bots may share the app id of the active one
+        if (app_id, channel_type) not in routes or status == "active":
+            routes[(app_id, channel_type)] = ChannelRoute(channel_id, bot_id, status)
+    return routes
+
+
+class ChannelRoutes:
+    __routes__: Dict[Tuple[str, str], ChannelRoute] = {}
+    __expires_at__ = 0.0
+    __generation__ = 0
+    __lock__ = asyncio.Lock()
+    ttl = CHANNEL_ROUTES_TTL
+
+    @classmethod
+    async def refresh(cls):
+        """Reloads the table from the database."""
+        generation = cls.__generation__
+        cls.__routes__ = await get_channel_routes()
+        # a channel changed while loading may be missing, reload on next lookup
+        if generation == cls.__generation__:
+            cls.__expires_at__ = time.monotonic() + cls.ttl
+
+    @classmethod
+    async def get(cls, app_id: str, channel_type: str) -> Optional[ChannelRoute]:
+        if time.monotonic() >= cls.__expires_at__:
+            async with cls.__lock__:
+                # the table may have been reloaded while waiting for the lock
+                if time.monotonic() >= cls.__expires_at__:
+                    await cls.refresh()
+        return cls.__routes__.get((app_id, channel_type))
+
+    @classmethod
+    def invalidate(cls):
+        """Makes the next lookup reload the table, once a channel changed."""
+        cls.__generation__ += 1
+        cls.__expires_at__ = 0.0
@@ -1,6 +1,7 @@
-from typing import Sequence
+from typing import Dict, List, Sequence, Tuple
 import uuid
-from sqlalchemy import select, update
+from sqlalchemy import and_, select, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import joinedload
 
 from lib.db_session_handler import DBSessionHandler
@@ -12,30 +13,38 @@ from lib.models import (
     JBBot,
     JBChannel,
 )
+from .channel_routes import ChannelRoutes
 
 
-async def create_user(
-    channel_id: str, phone_number: str, first_name: str, last_name: str
-) -> JBUser:
-    user_id = str(uuid.uuid4())
-    user = JBUser(
-        id=user_id,
+async def upsert_user(
+    channel_id: str, identifier: str, first_name: str, last_name: str
+) -> str:
+    """Returns the id of the user with the identifier on the channel,
+    registering the user first if needed, in one statement. Concurrent calls
+    for the same new user get the same id."""
+    stmt = insert(JBUser).values(
+        id=str(uuid.uuid4()),
         channel_id=channel_id,
+        identifier=identifier,
         first_name=first_name,
         last_name=last_name,
-        identifier=phone_number,
     )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[JBUser.channel_id, JBUser.identifier],
+        set_={
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+        },
+    ).returning(JBUser.id)
     async with DBSessionHandler.get_async_session() as session:
         async with session.begin():
-            session.add(user)
-            await session.commit()
-            return user
-    return None
+            result = await session.execute(stmt)
+            return result.scalar_one()
 
 
 async def get_user_by_number(number: str, channel_id: str) -> JBUser:
     query = select(JBUser).where(
-        JBUser.identifier == number and JBUser.channel_id == channel_id
+        and_(JBUser.identifier == number, JBUser.channel_id == channel_id)
     )
     async with DBSessionHandler.get_async_session() as session:
         async with session.begin():
@@ -61,6 +70,58 @@ async def create_turn(bot_id: str, channel_id: str, user_id: str):
             return turn_id
 
 
+async def upsert_users(
+    users: Sequence[Tuple[str, str, str, str]]
+) -> Dict[Tuple[str, str], str]:
+    """Like `upsert_user` for many (channel_id, identifier, first_name,
+    last_name) in one statement. Returns the user ids by (channel_id,
+    identifier)."""
+    # a statement can not update a row twice, the last names given win
+    values = {
+        (channel_id, identifier): dict(
+            id=str(uuid.uuid4()),
+            channel_id=channel_id,
+            identifier=identifier,
+            first_name=first_name,
+            last_name=last_name,
+        )
+        for channel_id, identifier, first_name, last_name in users
+    }
+    if not values:
+        return {}
+    stmt = insert(JBUser).values(list(values.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[JBUser.channel_id, JBUser.identifier],
+        set_={
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+        },
+    ).returning(JBUser.channel_id, JBUser.identifier, JBUser.id)
+    async with DBSessionHandler.get_async_session() as session:
+        async with session.begin():
+            result = await session.execute(stmt)
+            return {
+                (channel_id, identifier): user_id
+                for channel_id, identifier, user_id in result.all()
+            }
+
+
+async def create_turns(turns: Sequence[Tuple[str, str, str]]) -> List[str]:
+    """Like `create_turn` for many (bot_id, channel_id, user_id) in one
+    statement. Returns the turn ids in the same order."""
+    values = [
+        dict(
+            id=str(uuid.uuid4()), bot_id=bot_id, channel_id=channel_id, user_id=user_id
+        )
+        for bot_id, channel_id, user_id in turns
+    ]
+    if values:
+        async with DBSessionHandler.get_async_session() as session:
+            async with session.begin():
+                await session.execute(insert(JBTurn).values(values))
+    return [value["id"] for value in values]
+
+
 async def get_bot_by_id(bot_id: str):
     query = select(JBBot).options(joinedload(JBBot.channels)).where(JBBot.id == bot_id)
     async with DBSessionHandler.get_async_session() as session:
@@ -100,6 +161,16 @@ async def get_plugin_reference(plugin_uuid: str) -> JBWebhookReference:
     return None
 
 
+async def get_turn_user_id(turn_id: str) -> str | None:
+    query = select(JBTurn.user_id).where(JBTurn.id == turn_id)
+
+    async with DBSessionHandler.get_async_session() as session:
+        async with session.begin():
+            result = await session.execute(query)
+            return result.scalars().first()
+    return None
+
+
 async def get_bot_list():
     async with DBSessionHandler.get_async_session() as session:
         async with session.begin():
@@ -177,7 +248,8 @@ async def create_channel(bot_id, data):
         async with session.begin():
             session.add(channel)
             await session.commit()
-            return channel
+    ChannelRoutes.invalidate()
+    return channel
 
 
 async def get_channels_by_identifier(
@@ -233,7 +305,8 @@ async def update_channel(channel_id: str, data):
             stmt = update(JBChannel).where(JBChannel.id == channel_id).values(**data)
             await session.execute(stmt)
             await session.commit()
-            return channel_id
+    ChannelRoutes.invalidate()
+    return channel_id
 
 
 async def update_channel_by_bot_id(bot_id: str, data):
@@ -242,4 +315,5 @@ async def update_channel_by_bot_id(bot_id: str, data):
             stmt = update(JBChannel).where(JBChannel.bot_id == bot_id).values(**data)
             await session.execute(stmt)
             await session.commit()
-            return bot_id
+    ChannelRoutes.invalidate()
+    return bot_id
@@ -1,7 +1,11 @@
+import concurrent.futures
 import os
 import logging
-from lib.kafka_utils import KafkaProducer, KafkaException
-from lib.data_models import Flow, Channel, Indexer
+from typing import Optional
+from confluent_kafka import KafkaException
+from lib.kafka import AsyncKafkaProducer
+from lib.data_models import Flow, Channel, Indexer, IngestWebhook, encode_message
+from lib.tracing import SpanKind, span
 
 logger = logging.getLogger("jb-manager-api")
 
@@ -14,28 +18,54 @@ if not flow_topic:
 indexer_topic = os.getenv("KAFKA_INDEXER_TOPIC")
 if not indexer_topic:
     raise ValueError("KAFKA_INDEXER_TOPIC is not set in the environment")
+# webhooks are queued to the ingest topic instead of handled on receipt if set
+ingest_topic = os.getenv("KAFKA_INGEST_TOPIC") or None
 logger.info("Channel Topic: %s", channel_topic)
 logger.info("Flow Topic: %s", flow_topic)
 logger.info("Indexer Topic: %s", indexer_topic)
+logger.info("Ingest Topic: %s", ingest_topic)
 
 # Connect Kafka Producer automatically using env variables
 # and SASL, if applicable
-producer = KafkaProducer.from_env_vars()
+producer = AsyncKafkaProducer.from_env_vars()
 
 
-def produce_message(message: Flow | Channel | Indexer):
+def produce_message(
+    message: Flow | Channel | Indexer, key: Optional[str] = None
+) -> Optional[concurrent.futures.Future]:
+    """Sends the message to its topic. Messages of a user should be keyed by
+    the user id so they are handled in order. Starts the trace of the turn
+    the message belongs to. Returns the future of its delivery."""
+    turn_id = None
     if isinstance(message, Flow):
         topic = flow_topic
+        turn = message.user_input or message.callback or message.dialog
+        turn_id = turn.turn_id if turn else None
     elif isinstance(message, Channel):
         topic = channel_topic
+        turn_id = message.turn_id
     elif isinstance(message, Indexer):
         topic = indexer_topic
     else:
         raise ValueError("Invalid message type")
     try:
         logger.info("Sending msg to %s topic: %s", topic, message)
-        producer.send_message(
-            topic=topic, value=message.model_dump_json(exclude_none=True)
-        )
+        value, headers = encode_message(message)
+        with span(f"{topic} send", kind=SpanKind.PRODUCER, turn_id=turn_id):
+            return producer.send_message(
+                topic=topic, value=value, key=key, headers=headers
+            )
     except KafkaException as e:
-        return e
+        logger.error("Error while sending msg to %s topic: %s", topic, e)
+        return None
+
+
+async def ingest_webhook(webhook: IngestWebhook):
+    """Queues a webhook to the ingest topic and waits until it is stored by
+    Kafka, so it is not lost once the provider got its response. Webhooks of
+    a channel are keyed by its identifier, to be ingested in order."""
+    value, headers = encode_message(webhook)
+    with span(f"{ingest_topic} send", kind=SpanKind.PRODUCER):
+        await producer.deliver(
+            ingest_topic, value, key=webhook.bot_identifier, headers=headers
+        )
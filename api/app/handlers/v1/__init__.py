@@ -10,10 +10,9 @@ from lib.data_models import (
     Callback,
     CallbackType,
 )
+from ...channel_routes import ChannelRoutes
 from ...crud import (
-    get_active_channel_by_identifier,
-    get_user_by_number,
-    create_user,
+    upsert_user,
     create_turn,
     get_plugin_reference,
 )
@@ -56,25 +55,20 @@ async def handle_callback(
         user = channel_data.user
         message_data = channel_data.message_data
 
-        jb_channel = await get_active_channel_by_identifier(
+        route = await ChannelRoutes.get(
             bot_identifier, chosen_channel.get_channel_name()
         )
-        if jb_channel is None:
+        if route is None or route.status != "active":
             logger.error("Active channel not found for identifier %s", bot_identifier)
             yield ValueError("Active channel not found"), None
+            continue
 
-        bot_id: str = jb_channel.bot_id
-        channel_id: str = jb_channel.id
+        bot_id: str = route.bot_id
+        channel_id: str = route.channel_id
 
-        jb_user = await get_user_by_number(user.user_identifier, channel_id=channel_id)
-        if jb_user is None:
-            # register user
-            logger.info("Registering user")
-            jb_user = await create_user(
-                channel_id, user.user_identifier, user.user_name, user.user_name
-            )
-
-        user_id: str = jb_user.id
+        user_id: str = await upsert_user(
+            channel_id, user.user_identifier, user.user_name, user.user_name
+        )
         turn_id = await create_turn(
             bot_id=bot_id, channel_id=channel_id, user_id=user_id
         )
@@ -1,50 +1,65 @@
 import logging
-from typing import Dict, AsyncGenerator, Optional, Tuple
+from typing import Dict, AsyncGenerator, List, Optional, Sequence, Tuple
 from lib.channel_handler import ChannelHandler
+from lib.channel_handler.channel_handler import User
 from lib.data_models import Channel, ChannelIntent, RestBotInput
+from ...channel_routes import ChannelRoute, ChannelRoutes
 from ...crud import (
-    get_active_channel_by_identifier,
-    get_user_by_number,
-    create_user,
-    create_turn,
+    upsert_users,
+    create_turns,
 )
 
 logger = logging.getLogger("jb-manager-api")
 
 
+async def register_turns(
+    messages: Sequence[Tuple[ChannelRoute, User]]
+) -> List[Tuple[str, str]]:
+    """Registers the users of the messages with one statement and creates a
+    turn for each message with another. Returns the user id and turn id of
+    each message."""
+    user_ids = await upsert_users(
+        [
+            (route.channel_id, user.user_identifier, user.user_name, user.user_name)
+            for route, user in messages
+        ]
+    )
+    users = [
+        user_ids[(route.channel_id, user.user_identifier)] for route, user in messages
+    ]
+    turn_ids = await create_turns(
+        [
+            (route.bot_id, route.channel_id, user_id)
+            for (route, _), user_id in zip(messages, users)
+        ]
+    )
+    return list(zip(users, turn_ids))
+
+
 async def handle_callback(
     bot_identifier: str,
     callback_data: Dict,
     headers: Dict,
     query_params: Dict,
     chosen_channel: type[ChannelHandler],
-) -> AsyncGenerator[Tuple[Optional[ValueError], Optional[Channel]], None]:
-    for channel_data in chosen_channel.process_message(callback_data):
-        user = channel_data.user
-        message_data = channel_data.message_data
-
-        jb_channel = await get_active_channel_by_identifier(
-            bot_identifier, chosen_channel.get_channel_name()
-        )
-        if jb_channel is None:
-            logger.error("Active channel not found for identifier %s", bot_identifier)
-            yield ValueError("Active channel not found"), None
-
-        bot_id: str = jb_channel.bot_id
-        channel_id: str = jb_channel.id
+) -> AsyncGenerator[
+    Tuple[Optional[ValueError], Optional[Channel], Optional[str]], None
+]:
+    # a webhook may carry many messages, their turns are created together
+    messages = list(chosen_channel.process_message(callback_data))
+    if not messages:
+        return
 
-        jb_user = await get_user_by_number(user.user_identifier, channel_id=channel_id)
-        if jb_user is None:
-            # register user
-            logger.info("Registering user")
-            jb_user = await create_user(
-                channel_id, user.user_identifier, user.user_name, user.user_name
-            )
+    route = await ChannelRoutes.get(bot_identifier, chosen_channel.get_channel_name())
+    if route is None or route.status != "active":
+        logger.error("Active channel not found for identifier %s", bot_identifier)
+        yield ValueError("Active channel not found"), None, None
+        return
 
-        user_id: str = jb_user.id
-        turn_id = await create_turn(
-            bot_id=bot_id, channel_id=channel_id, user_id=user_id
-        )
+    turns = await register_turns(
+        [(route, channel_data.user) for channel_data in messages]
+    )
+    for channel_data, (user_id, turn_id) in zip(messages, turns):
         channel_input = Channel(
             source="api",
             turn_id=turn_id,
@@ -52,8 +67,8 @@ async def handle_callback(
             bot_input=RestBotInput(
                 channel_name=chosen_channel.get_channel_name(),
                 headers=headers,
-                data=message_data,
+                data=channel_data.message_data,
                 query_params=query_params,
             ),
         )
-        yield None, channel_input
+        yield None, channel_input, user_id
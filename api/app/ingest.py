@@ -0,0 +1,204 @@
+"""Consumer of the webhooks queued by the callback endpoint.
+
+With KAFKA_INGEST_TOPIC set, the callback endpoint only validates a webhook,
+queues it to the ingest topic and responds, so the providers do not wait for
+the database. This consumer takes the queued webhooks in batches, registers
+the users of all their messages with one statement, creates their turns with
+another, and sends the messages to the channel topic. A batch is committed
+once its messages are delivered, so a webhook is handled again, rather than
+lost, when the consumer stops in between.
+
+A batch that fails is retried up to INGEST_MAX_RETRIES times (default: 5),
+waiting INGEST_RETRY_BACKOFF seconds (default: 1) doubled on each retry, up
+to 30 seconds. Its turns are registered only once; a retry sends only the
+messages that were not delivered. If it still fails, the webhooks of the
+undelivered messages are sent unchanged to KAFKA_INGEST_DEAD_LETTER_TOPIC,
+or only logged if that is not set, and the consumer moves on to the next
+batch.
+
+Runs with the environment of the api:
+
+    python -m app.ingest
+"""
+
+import asyncio
+import logging
+import os
+from typing import List, Tuple
+from confluent_kafka import Message
+from dotenv import load_dotenv
+from lib.channel_handler import channel_map
+from lib.channel_handler.channel_handler import ChannelData
+from lib.data_models import (
+    Channel,
+    ChannelIntent,
+    IngestWebhook,
+    RestBotInput,
+    decode_message,
+)
+from lib.kafka import AsyncKafkaConsumer, set_message_context
+from lib.metrics import HANDLER_SECONDS, start_metrics_server
+from .channel_routes import ChannelRoute, ChannelRoutes
+from .extensions import ingest_topic, produce_message, producer
+from .handlers.v2.callback import register_turns
+
+load_dotenv()
+
+logging.basicConfig()
+logger = logging.getLogger("jb-manager-api")
+logger.setLevel(logging.INFO)
+
+max_retries = int(os.getenv("INGEST_MAX_RETRIES") or 5)
+retry_backoff = float(os.getenv("INGEST_RETRY_BACKOFF") or 1)
+MAX_RETRY_BACKOFF = 30
+dead_letter_topic = os.getenv("KAFKA_INGEST_DEAD_LETTER_TOPIC") or None
+
+# a message received by a webhook, with the webhook and its route
+IngestedMessage = Tuple[Message, IngestWebhook, ChannelRoute, ChannelData]
+# a message received by a webhook, with the webhook and its user and turn ids
+IngestedTurn = Tuple[Message, IngestWebhook, ChannelData, str, str]
+
+
+async def parse_webhooks(batch: List[Message]) -> List[IngestedMessage]:
+    """Splits the webhooks of a batch into their messages, in order. Skips
+    the webhooks that can not be handled."""
+    messages = []
+    for msg in batch:
+        try:
+            webhook = decode_message(IngestWebhook, msg.value(), msg.headers())
+        except ValueError as e:
+            logger.error("Invalid message %s: %s", msg.value(), e)
+            continue
+        channel_name = webhook.bot_input.channel_name
+        route = await ChannelRoutes.get(webhook.bot_identifier, channel_name)
+        if route is None or route.status != "active":
+            logger.error(
+                "Active channel not found for identifier %s", webhook.bot_identifier
+            )
+            continue
+        try:
+            for channel_data in channel_map[channel_name].process_message(
+                webhook.bot_input.data
+            ):
+                messages.append((msg, webhook, route, channel_data))
+        except Exception as e:
+            logger.error("Error while parsing webhook %s: %s", msg.value(), e)
+    return messages
+
+
+async def register(batch: List[Message]) -> List[IngestedTurn]:
+    """Registers the users and turns of the webhooks of a batch."""
+    messages = await parse_webhooks(batch)
+    turns = await register_turns(
+        [(route, channel_data.user) for _, _, route, channel_data in messages]
+    )
+    return [
+        (msg, webhook, channel_data, user_id, turn_id)
+        for (msg, webhook, _, channel_data), (user_id, turn_id) in zip(
+            messages, turns
+        )
+    ]
+
+
+async def deliver(turns: List[IngestedTurn]) -> List[IngestedTurn]:
+    """Sends the messages of the turns to the channel topic and waits until
+    they are delivered. Returns the turns whose message was not delivered."""
+    deliveries = []
+    for msg, webhook, channel_data, user_id, turn_id in turns:
+        # the turn continues the trace of the webhook
+        set_message_context(msg)
+        channel_input = Channel(
+            source="api",
+            turn_id=turn_id,
+            intent=ChannelIntent.CHANNEL_IN,
+            bot_input=RestBotInput(
+                channel_name=webhook.bot_input.channel_name,
+                headers=webhook.bot_input.headers,
+                data=channel_data.message_data,
+                query_params=webhook.bot_input.query_params,
+            ),
+        )
+        delivery = produce_message(channel_input, key=user_id)
+        deliveries.append(
+            asyncio.wrap_future(delivery) if delivery is not None else None
+        )
+    results = await asyncio.gather(
+        *(delivery for delivery in deliveries if delivery is not None),
+        return_exceptions=True,
+    )
+    delivered = iter(results)
+    return [
+        turn
+        for turn, delivery in zip(turns, deliveries)
+        if delivery is None or isinstance(next(delivered), Exception)
+    ]
+
+
+async def dead_letter(batch: List[Message]):
+    """Sends the webhooks of a batch unchanged to the dead letter topic and
+    waits until they are delivered."""
+    if not dead_letter_topic:
+        return
+    await asyncio.gather(
+        *(
+            producer.deliver(
+                dead_letter_topic, msg.value(), key=msg.key(), headers=msg.headers()
+            )
+            for msg in batch
+        )
+    )
+
+
+async def ingest(batch: List[Message]):
+    """Ingests a batch, retrying with backoff while it fails. The turns are
+    registered once, and a retry only sends the messages that were not
+    delivered, so that it does not duplicate turns. The webhooks that keep
+    failing are dead lettered, so that they do not stop the consumer."""
+    turns = None
+    for attempt in range(max_retries + 1):
+        try:
+            if turns is None:
+                turns = await register(batch)
+            turns = await deliver(turns)
+            if not turns:
+                return
+            error = f"{len(turns)} messages were not delivered"
+        except Exception as e:
+            error = e
+        if attempt == max_retries:
+            break
+        delay = min(retry_backoff * 2**attempt, MAX_RETRY_BACKOFF)
+        logger.warning("Error while ingesting, retrying in %.1fs: %s", delay, error)
+        await asyncio.sleep(delay)
+    if turns is not None:
+        # only the webhooks of the messages that were not delivered
+        batch = list({id(msg): msg for msg, *_ in turns}.values())
+    logger.error(
+        "Giving up on %d webhooks, sending them to %s: %s",
+        len(batch),
+        dead_letter_topic,
+        error,
+    )
+    await dead_letter(batch)
+
+
+async def start_ingest():
+    """Starts the ingest consumer"""
+    if not ingest_topic:
+        raise ValueError("KAFKA_INGEST_TOPIC is not set in the environment")
+    # webhooks queued before the consumer group first started are ingested too
+    consumer = AsyncKafkaConsumer.from_env_vars(
+        group_id="ingest",
+        auto_offset_reset="earliest",
+        topics=[ingest_topic],
+        manual_commit=True,
+    )
+    start_metrics_server()
+    logger.info("Starting Listening")
+    async for batch in consumer.batches():
+        with HANDLER_SECONDS.labels(intent="ingest").time():
+            await ingest(batch)
+
+
+if __name__ == "__main__":
+    asyncio.run(start_ingest())
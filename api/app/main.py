@@ -1,14 +1,28 @@
 import logging
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from lib.metrics import CONTENT_TYPE, REGISTRY, generate_latest
+from .channel_routes import ChannelRoutes
 from .routers import v1_router, v2_router
 
 load_dotenv()
 logger = logging.getLogger("jb-manager-api")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm the routing table, lookups retry loading it if this fails
+    try:
+        await ChannelRoutes.refresh()
+    except Exception as e:
+        logger.error("Error while loading channel routes: %s", e)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(v1_router)
 app.include_router(v2_router)
 app.add_middleware(
@@ -23,3 +37,8 @@ app.add_middleware(
 @app.get("/")
 def read_root():
     return {"This is": "JB Manager"}
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE)
@@ -4,10 +4,16 @@ from typing import List
 
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.datastructures import UploadFile
+from lib.data_models import Flow, FlowIntent, BotConfig, BotIntent
 from lib.data_models.indexer import Indexer, IndexType
 from lib.file_storage import StorageHandler
 
-from ...crud import get_bot_chat_sessions, get_bot_list, get_chat_history
+from ...crud import (
+    get_bot_chat_sessions,
+    get_bot_list,
+    get_chat_history,
+    get_turn_user_id,
+)
 from ...extensions import produce_message
 from ...handlers.v1 import handle_webhook
 from ...handlers.v1.bot_handlers import (
@@ -116,6 +122,18 @@ async def add_bot_configuraton(bot_id: str, request: Request):
     updated_info = await handle_update_bot(bot_id, bot_data)
     if updated_info["status"] == "error":
         raise HTTPException(status_code=404, detail=updated_info["message"])
+    # let flow drop its cached copy of the bot's config
+    flow_input = Flow(
+        source="api",
+        intent=FlowIntent.BOT,
+        bot_config=BotConfig(bot_id=bot_id, intent=BotIntent.CONFIGURE),
+    )
+    try:
+        produce_message(flow_input)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error producing message: {e}"
+        ) from e
     return {"status": "success"}
 
 
@@ -145,7 +163,9 @@ async def plugin_webhook(request: Request):
     webhook_data = webhook_data.decode("utf-8")
     try:
         async for flow_input in handle_webhook(webhook_data):
-            produce_message(flow_input)
+            # keyed by user so it is handled in order with the user's messages
+            user_id = await get_turn_user_id(flow_input.callback.turn_id)
+            produce_message(flow_input, key=user_id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
     return 200
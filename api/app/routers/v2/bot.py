@@ -1,6 +1,7 @@
 import logging
 from fastapi import APIRouter, HTTPException, Request
 from lib.channel_handler import channel_map
+from lib.data_models import Flow, FlowIntent, BotConfig, BotIntent
 from ...extensions import produce_message
 from ...handlers.v2.bot import install, delete, add_credentials, list_bots, add_channel
 from ...jb_schema import JBBotCode, JBChannelContent
@@ -46,6 +47,18 @@ async def add_bot_credentials(bot_id: str, request: Request):
     add_credentials_response = await add_credentials(bot_id, credentials)
     if add_credentials_response["status"] == "error":
         raise HTTPException(status_code=404, detail=add_credentials_response["message"])
+    # let flow drop its cached copy of the bot's credentials
+    flow_input = Flow(
+        source="api",
+        intent=FlowIntent.BOT,
+        bot_config=BotConfig(bot_id=bot_id, intent=BotIntent.CONFIGURE),
+    )
+    try:
+        produce_message(flow_input)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error producing message: {e}"
+        ) from e
     return {"status": "success"}
 
 
@@ -1,9 +1,13 @@
 from typing import Optional
+import asyncio
 import logging
+from confluent_kafka import KafkaException
 from fastapi import APIRouter, HTTPException, Request
 from lib.channel_handler import ChannelHandler, channel_map
+from lib.data_models import IngestWebhook, RestBotInput
+from ...channel_routes import ChannelRoutes
 from ...handlers.v2.callback import handle_callback
-from ...extensions import produce_message
+from ...extensions import ingest_topic, ingest_webhook, produce_message
 
 logger = logging.getLogger("jb-manager-api")
 router = APIRouter(
@@ -25,7 +29,34 @@ async def callback(provider: str, bot_identifier: str, request: Request):
         logger.error("No valid channel found")
         return 404
 
-    async for err, channel_input in handle_callback(
+    if ingest_topic:
+        # users and turns are registered by the ingest consumer, app.ingest
+        route = await ChannelRoutes.get(
+            bot_identifier, chosen_channel.get_channel_name()
+        )
+        if route is None or route.status != "active":
+            logger.error("Active channel not found for identifier %s", bot_identifier)
+            raise HTTPException(status_code=400, detail="Active channel not found")
+        webhook = IngestWebhook(
+            bot_identifier=bot_identifier,
+            bot_input=RestBotInput(
+                channel_name=chosen_channel.get_channel_name(),
+                headers=headers,
+                data=data,
+                query_params=query_params,
+            ),
+        )
+        try:
+            await ingest_webhook(webhook)
+        except KafkaException as e:
+            # the provider retries the webhook
+            logger.error("Error while queueing webhook: %s", e)
+            raise HTTPException(status_code=503, detail="Webhook not queued") from e
+        return 200
+
+    # the messages of the webhook are sent together, then awaited at once
+    deliveries = []
+    async for err, channel_input, user_id in handle_callback(
         bot_identifier=bot_identifier,
         callback_data=data,
         headers=headers,
@@ -35,6 +66,13 @@ async def callback(provider: str, bot_identifier: str, request: Request):
         if err:
             raise HTTPException(status_code=400, detail=str(err))
         elif channel_input:
-            produce_message(channel_input)
+            delivery = produce_message(channel_input, key=user_id)
+            if delivery is not None:
+                deliveries.append(asyncio.wrap_future(delivery))
+    try:
+        await asyncio.gather(*deliveries)
+    except KafkaException as e:
+        logger.error("Error while sending messages: %s", e)
+        raise HTTPException(status_code=503, detail="Messages not sent") from e
 
     return 200
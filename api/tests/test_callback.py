@@ -7,26 +7,22 @@ from lib.data_models import (
 )
 
 from lib.channel_handler import PinnacleWhatsappHandler
+from app.channel_routes import ChannelRoute
 from app.handlers.v2.callback import handle_callback
 
 
 @pytest.mark.asyncio
-@patch("app.handlers.v2.callback.get_active_channel_by_identifier")
-@patch("app.handlers.v2.callback.get_user_by_number")
-@patch("app.handlers.v2.callback.create_user")
-@patch("app.handlers.v2.callback.create_turn")
+@patch("app.handlers.v2.callback.ChannelRoutes.get")
+@patch("app.handlers.v2.callback.upsert_users")
+@patch("app.handlers.v2.callback.create_turns")
 async def test_text_message(
-    mock_create_turn,
-    mock_create_user,
-    mock_get_user_by_number,
-    mock_get_active_channel_by_identifier,
+    mock_create_turns,
+    mock_upsert_users,
+    mock_get_route,
 ):
-    mock_get_active_channel_by_identifier.return_value = MagicMock(
-        id="channel123", bot=MagicMock(id="bot123"), bot_id="bot123"
-    )
-    mock_get_user_by_number.return_value = None
-    mock_create_user.return_value = MagicMock(id="user123")
-    mock_create_turn.return_value = "turn123"
+    mock_get_route.return_value = ChannelRoute("channel123", "bot123", "active")
+    mock_upsert_users.return_value = {("channel123", "919999999999"): "user123"}
+    mock_create_turns.return_value = ["turn123"]
 
     callback_data = {
         "object": "whatsapp_business_account",
@@ -89,39 +85,27 @@ async def test_text_message(
         == callback_data["entry"][0]["changes"][0]["value"]["messages"][0]
     )
 
-    mock_get_active_channel_by_identifier.assert_called_once_with(
+    mock_get_route.assert_called_once_with(
         "919876543210", PinnacleWhatsappHandler.get_channel_name()
     )
-    mock_get_user_by_number.assert_called_once_with(
-        "919999999999", channel_id="channel123"
-    )
-    mock_create_user.assert_called_once_with(
-        "channel123", "919999999999", "Dummy", "Dummy"
-    )
-    mock_create_turn.assert_called_once_with(
-        bot_id="bot123",
-        channel_id="channel123",
-        user_id="user123",
+    mock_upsert_users.assert_called_once_with(
+        [("channel123", "919999999999", "Dummy", "Dummy")]
     )
+    mock_create_turns.assert_called_once_with([("bot123", "channel123", "user123")])
 
 
 @pytest.mark.asyncio
-@patch("app.handlers.v2.callback.get_active_channel_by_identifier")
-@patch("app.handlers.v2.callback.get_user_by_number")
-@patch("app.handlers.v2.callback.create_user")
-@patch("app.handlers.v2.callback.create_turn")
+@patch("app.handlers.v2.callback.ChannelRoutes.get")
+@patch("app.handlers.v2.callback.upsert_users")
+@patch("app.handlers.v2.callback.create_turns")
 async def test_audio_message(
-    mock_create_turn,
-    mock_create_user,
-    mock_get_user_by_number,
-    mock_get_active_channel_by_identifier,
+    mock_create_turns,
+    mock_upsert_users,
+    mock_get_route,
 ):
-    mock_get_active_channel_by_identifier.return_value = MagicMock(
-        id="channel123", bot=MagicMock(id="bot123"), bot_id="bot123"
-    )
-    mock_get_user_by_number.return_value = None
-    mock_create_user.return_value = MagicMock(id="user123")
-    mock_create_turn.return_value = "turn123"
+    mock_get_route.return_value = ChannelRoute("channel123", "bot123", "active")
+    mock_upsert_users.return_value = {("channel123", "919999999999"): "user123"}
+    mock_create_turns.return_value = ["turn123"]
 
     callback_data = {
         "object": "whatsapp_business_account",
@@ -188,39 +172,27 @@ async def test_audio_message(
         == callback_data["entry"][0]["changes"][0]["value"]["messages"][0]
     )
 
-    mock_get_active_channel_by_identifier.assert_called_once_with(
+    mock_get_route.assert_called_once_with(
         "919876543210", PinnacleWhatsappHandler.get_channel_name()
     )
-    mock_get_user_by_number.assert_called_once_with(
-        "919999999999", channel_id="channel123"
-    )
-    mock_create_user.assert_called_once_with(
-        "channel123", "919999999999", "Dummy", "Dummy"
-    )
-    mock_create_turn.assert_called_once_with(
-        bot_id="bot123",
-        channel_id="channel123",
-        user_id="user123",
+    mock_upsert_users.assert_called_once_with(
+        [("channel123", "919999999999", "Dummy", "Dummy")]
     )
+    mock_create_turns.assert_called_once_with([("bot123", "channel123", "user123")])
 
 
 @pytest.mark.asyncio
-@patch("app.handlers.v2.callback.get_active_channel_by_identifier")
-@patch("app.handlers.v2.callback.get_user_by_number")
-@patch("app.handlers.v2.callback.create_user")
-@patch("app.handlers.v2.callback.create_turn")
+@patch("app.handlers.v2.callback.ChannelRoutes.get")
+@patch("app.handlers.v2.callback.upsert_users")
+@patch("app.handlers.v2.callback.create_turns")
 async def test_button_reply_message(
-    mock_create_turn,
-    mock_create_user,
-    mock_get_user_by_number,
-    mock_get_active_channel_by_identifier,
+    mock_create_turns,
+    mock_upsert_users,
+    mock_get_route,
 ):
-    mock_get_active_channel_by_identifier.return_value = MagicMock(
-        id="channel123", bot=MagicMock(id="bot123"), bot_id="bot123"
-    )
-    mock_get_user_by_number.return_value = None
-    mock_create_user.return_value = MagicMock(id="user123")
-    mock_create_turn.return_value = "turn123"
+    mock_get_route.return_value = ChannelRoute("channel123", "bot123", "active")
+    mock_upsert_users.return_value = {("channel123", "919999999999"): "user123"}
+    mock_create_turns.return_value = ["turn123"]
 
     callback_data = {
         "object": "whatsapp_business_account",
@@ -289,39 +261,27 @@ async def test_button_reply_message(
         == callback_data["entry"][0]["changes"][0]["value"]["messages"][0]
     )
 
-    mock_get_active_channel_by_identifier.assert_called_once_with(
+    mock_get_route.assert_called_once_with(
         "919876543210", PinnacleWhatsappHandler.get_channel_name()
     )
-    mock_get_user_by_number.assert_called_once_with(
-        "919999999999", channel_id="channel123"
-    )
-    mock_create_user.assert_called_once_with(
-        "channel123", "919999999999", "Dummy", "Dummy"
-    )
-    mock_create_turn.assert_called_once_with(
-        bot_id="bot123",
-        channel_id="channel123",
-        user_id="user123",
+    mock_upsert_users.assert_called_once_with(
+        [("channel123", "919999999999", "Dummy", "Dummy")]
     )
+    mock_create_turns.assert_called_once_with([("bot123", "channel123", "user123")])
 
 
 @pytest.mark.asyncio
-@patch("app.handlers.v2.callback.get_active_channel_by_identifier")
-@patch("app.handlers.v2.callback.get_user_by_number")
-@patch("app.handlers.v2.callback.create_user")
-@patch("app.handlers.v2.callback.create_turn")
+@patch("app.handlers.v2.callback.ChannelRoutes.get")
+@patch("app.handlers.v2.callback.upsert_users")
+@patch("app.handlers.v2.callback.create_turns")
 async def test_list_reply_message(
-    mock_create_turn,
-    mock_create_user,
-    mock_get_user_by_number,
-    mock_get_active_channel_by_identifier,
+    mock_create_turns,
+    mock_upsert_users,
+    mock_get_route,
 ):
-    mock_get_active_channel_by_identifier.return_value = MagicMock(
-        id="channel123", bot=MagicMock(id="bot123"), bot_id="bot123"
-    )
-    mock_get_user_by_number.return_value = None
-    mock_create_user.return_value = MagicMock(id="user123")
-    mock_create_turn.return_value = "turn123"
+    mock_get_route.return_value = ChannelRoute("channel123", "bot123", "active")
+    mock_upsert_users.return_value = {("channel123", "919999999999"): "user123"}
+    mock_create_turns.return_value = ["turn123"]
 
     callback_data = {
         "object": "whatsapp_business_account",
@@ -393,17 +353,131 @@ async def test_list_reply_message(
         == callback_data["entry"][0]["changes"][0]["value"]["messages"][0]
     )
 
-    mock_get_active_channel_by_identifier.assert_called_once_with(
+    mock_get_route.assert_called_once_with(
         "919876543210", PinnacleWhatsappHandler.get_channel_name()
     )
-    mock_get_user_by_number.assert_called_once_with(
-        "919999999999", channel_id="channel123"
+    mock_upsert_users.assert_called_once_with(
+        [("channel123", "919999999999", "Dummy", "Dummy")]
     )
-    mock_create_user.assert_called_once_with(
-        "channel123", "919999999999", "Dummy", "Dummy"
+    mock_create_turns.assert_called_once_with([("bot123", "channel123", "user123")])
+
+
+@pytest.mark.asyncio
+@patch("app.handlers.v2.callback.ChannelRoutes.get")
+@patch("app.handlers.v2.callback.upsert_users")
+@patch("app.handlers.v2.callback.create_turns")
+async def test_messages_of_a_webhook_are_registered_together(
+    mock_create_turns,
+    mock_upsert_users,
+    mock_get_route,
+):
+    mock_get_route.return_value = ChannelRoute("channel123", "bot123", "active")
+    mock_upsert_users.return_value = {
+        ("channel123", "919999999999"): "user1",
+        ("channel123", "918888888888"): "user2",
+    }
+    mock_create_turns.return_value = ["turn1", "turn2", "turn3"]
+
+    def change(*senders):
+        return {
+            "value": {
+                "messaging_product": "whatsapp",
+                "metadata": {
+                    "display_phone_number": "919876543210",
+                    "phone_number_id": "phone_no_id1",
+                },
+                "messages": [
+                    {
+                        "from": sender,
+                        "id": f"whatsapp_msg_{sender}",
+                        "timestamp": "1714990325",
+                        "text": {"body": "Hi"},
+                        "type": "text",
+                    }
+                    for sender in senders
+                ],
+            },
+            "field": "messages",
+        }
+
+    callback_data = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {"id": "some_id", "changes": [change("919999999999", "918888888888")]},
+            {"id": "some_id", "changes": [change("919999999999")]},
+        ],
+    }
+    result = [
+        msg
+        async for msg in handle_callback(
+            "919876543210", callback_data, {}, {}, PinnacleWhatsappHandler
+        )
+    ]
+
+    assert [(err, channel.turn_id, user_id) for err, channel, user_id in result] == [
+        (None, "turn1", "user1"),
+        (None, "turn2", "user2"),
+        (None, "turn3", "user1"),
+    ]
+    mock_get_route.assert_called_once()
+    mock_upsert_users.assert_called_once_with(
+        [
+            ("channel123", "919999999999", "Dummy", "Dummy"),
+            ("channel123", "918888888888", "Dummy", "Dummy"),
+            ("channel123", "919999999999", "Dummy", "Dummy"),
+        ]
     )
-    mock_create_turn.assert_called_once_with(
-        bot_id="bot123",
-        channel_id="channel123",
-        user_id="user123",
+    mock_create_turns.assert_called_once_with(
+        [
+            ("bot123", "channel123", "user1"),
+            ("bot123", "channel123", "user2"),
+            ("bot123", "channel123", "user1"),
+        ]
     )
+
+
+@pytest.mark.asyncio
+@patch("app.handlers.v2.callback.ChannelRoutes.get")
+@patch("app.handlers.v2.callback.upsert_users")
+async def test_inactive_channel_is_reported_once(mock_upsert_users, mock_get_route):
+    mock_get_route.return_value = ChannelRoute("channel123", "bot123", "inactive")
+    callback_data = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {
+                "id": "some_id",
+                "changes": [
+                    {
+                        "value": {
+                            "messaging_product": "whatsapp",
+                            "metadata": {
+                                "display_phone_number": "919876543210",
+                                "phone_number_id": "phone_no_id1",
+                            },
+                            "messages": [
+                                {
+                                    "from": "919999999999",
+                                    "id": f"whatsapp_msg_id{i}",
+                                    "timestamp": "1714990325",
+                                    "text": {"body": "Hi"},
+                                    "type": "text",
+                                }
+                                for i in range(2)
+                            ],
+                        },
+                        "field": "messages",
+                    }
+                ],
+            }
+        ],
+    }
+    result = [
+        msg
+        async for msg in handle_callback(
+            "919876543210", callback_data, {}, {}, PinnacleWhatsappHandler
+        )
+    ]
+
+    assert len(result) == 1
+    assert isinstance(result[0][0], ValueError)
+    mock_upsert_users.assert_not_called()
@@ -0,0 +1,74 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from app.channel_routes import ChannelRoute, ChannelRoutes, get_channel_routes
+
+KEY = ("919876543210", "pinnacle_whatsapp")
+ROUTE = ChannelRoute("channel123", "bot123", "active")
+
+
+@pytest.fixture(autouse=True)
+def empty_routes():
+    ChannelRoutes.invalidate()
+    ChannelRoutes.__routes__ = {}
+    yield
+    ChannelRoutes.invalidate()
+    ChannelRoutes.__routes__ = {}
+
+
+@pytest.mark.asyncio
+@patch("app.channel_routes.get_channel_routes", new_callable=AsyncMock)
+async def test_routes_are_loaded_once_until_they_expire(mock_get_channel_routes):
+    mock_get_channel_routes.return_value = {KEY: ROUTE}
+
+    assert await ChannelRoutes.get(*KEY) == ROUTE
+    assert await ChannelRoutes.get(*KEY) == ROUTE
+    assert await ChannelRoutes.get("unknown", "pinnacle_whatsapp") is None
+    mock_get_channel_routes.assert_awaited_once()
+
+    ChannelRoutes.__expires_at__ = 0.0
+    await ChannelRoutes.get(*KEY)
+    assert mock_get_channel_routes.await_count == 2
+
+
+@pytest.mark.asyncio
+@patch("app.channel_routes.get_channel_routes", new_callable=AsyncMock)
+async def test_invalidated_routes_are_reloaded(mock_get_channel_routes):
+    mock_get_channel_routes.return_value = {}
+    assert await ChannelRoutes.get(*KEY) is None
+
+    mock_get_channel_routes.return_value = {KEY: ROUTE}
+    ChannelRoutes.invalidate()
+
+    assert await ChannelRoutes.get(*KEY) == ROUTE
+
+
+@pytest.mark.asyncio
+@patch("app.channel_routes.get_channel_routes", new_callable=AsyncMock)
+async def test_routes_invalidated_while_loading_expire(mock_get_channel_routes):
+    async def load():
+        ChannelRoutes.invalidate()
+        return {}
+
+    mock_get_channel_routes.side_effect = load
+    await ChannelRoutes.refresh()
+
+    assert ChannelRoutes.__expires_at__ == 0.0
+
+
+@pytest.mark.asyncio
+@patch("app.channel_routes.DBSessionHandler.get_async_session")
+async def test_active_channel_wins_over_inactive_ones(mock_get_async_session):
+    session = AsyncMock()
+    session.begin = MagicMock(return_value=AsyncMock())
+    session.execute.return_value.all = MagicMock(
+        return_value=[
+            ("919876543210", "pinnacle_whatsapp", "channel1", "bot1", "inactive"),
+            ("919876543210", "pinnacle_whatsapp", "channel2", "bot2", "active"),
+            ("919876543210", "pinnacle_whatsapp", "channel3", "bot3", "inactive"),
+        ]
+    )
+    mock_get_async_session.return_value.__aenter__.return_value = session
+
+    routes = await get_channel_routes()
+
+    assert routes == {KEY: ChannelRoute("channel2", "bot2", "active")}
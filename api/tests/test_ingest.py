@@ -0,0 +1,284 @@
+import concurrent.futures
+import os
+from unittest.mock import AsyncMock, patch
+import pytest
+from confluent_kafka import KafkaException
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("KAFKA_BACKEND", "memory")
+os.environ.setdefault("KAFKA_CHANNEL_TOPIC", "channel")
+os.environ.setdefault("KAFKA_FLOW_TOPIC", "flow")
+os.environ.setdefault("KAFKA_INDEXER_TOPIC", "indexer")
+os.environ.setdefault("KAFKA_INGEST_TOPIC", "ingest")
+
+# pylint: disable=wrong-import-position
+from lib.data_models import (
+    Channel,
+    IngestWebhook,
+    RestBotInput,
+    decode_message,
+    encode_message,
+)
+from lib.kafka.memory import MemoryBroker
+from app.channel_routes import ChannelRoute
+from app.ingest import ingest
+from app.main import app
+
+ROUTE = ChannelRoute("channel123", "bot123", "active")
+
+
+def whatsapp_data(*messages):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {
+                "id": "some_id",
+                "changes": [
+                    {
+                        "value": {
+                            "messaging_product": "whatsapp",
+                            "metadata": {
+                                "display_phone_number": "919876543210",
+                                "phone_number_id": "phone_no_id1",
+                            },
+                            "messages": [
+                                {
+                                    "from": sender,
+                                    "id": f"whatsapp_msg_id{i}",
+                                    "timestamp": "1714990325",
+                                    "text": {"body": body},
+                                    "type": "text",
+                                }
+                                for i, (sender, body) in enumerate(messages)
+                            ],
+                        },
+                        "field": "messages",
+                    }
+                ],
+            }
+        ],
+    }
+
+
+def queued(topic: str):
+    partitions = MemoryBroker.get_instance().topic(topic)
+    return [msg for partition in partitions for msg in partition]
+
+
+def queue_webhook(bot_identifier: str, data):
+    webhook = IngestWebhook(
+        bot_identifier=bot_identifier,
+        bot_input=RestBotInput(
+            channel_name="pinnacle_whatsapp", headers={}, data=data, query_params={}
+        ),
+    )
+    value, headers = encode_message(webhook)
+    return MemoryBroker.get_instance().append("ingest", -1, None, value, headers)
+
+
+@pytest.fixture(autouse=True)
+def empty_topics():
+    MemoryBroker.get_instance().topics.clear()
+    yield
+    MemoryBroker.get_instance().topics.clear()
+
+
+@patch("app.routers.v2.callback.handle_callback")
+@patch("app.routers.v2.callback.ChannelRoutes.get", new_callable=AsyncMock)
+def test_callback_queues_the_webhook(mock_get_route, mock_handle_callback):
+    mock_get_route.return_value = ROUTE
+    data = whatsapp_data(("919999999999", "Hi"))
+
+    response = TestClient(app).post(
+        "/v2/callback/pinnacle_whatsapp/919876543210", json=data
+    )
+
+    assert response.status_code == 200
+    mock_handle_callback.assert_not_called()
+    [msg] = queued("ingest")
+    assert msg.key() == b"919876543210"
+    webhook = decode_message(IngestWebhook, msg.value(), msg.headers())
+    assert webhook.bot_identifier == "919876543210"
+    assert webhook.bot_input.channel_name == "pinnacle_whatsapp"
+    assert webhook.bot_input.data == data
+
+
+@patch("app.routers.v2.callback.ChannelRoutes.get", new_callable=AsyncMock)
+def test_callback_rejects_webhooks_of_unknown_channels(mock_get_route):
+    mock_get_route.return_value = None
+
+    response = TestClient(app).post(
+        "/v2/callback/pinnacle_whatsapp/919876543210",
+        json=whatsapp_data(("919999999999", "Hi")),
+    )
+
+    assert response.status_code == 400
+    assert not queued("ingest")
+
+
+@pytest.mark.asyncio
+@patch("app.ingest.ChannelRoutes.get", new_callable=AsyncMock)
+@patch("app.handlers.v2.callback.upsert_users", new_callable=AsyncMock)
+@patch("app.handlers.v2.callback.create_turns", new_callable=AsyncMock)
+async def test_batch_is_registered_in_bulk(
+    mock_create_turns, mock_upsert_users, mock_get_route
+):
+    mock_get_route.side_effect = lambda app_id, _: ROUTE if app_id == "9198" else None
+    mock_upsert_users.return_value = {
+        ("channel123", "919999999999"): "user1",
+        ("channel123", "918888888888"): "user2",
+    }
+    mock_create_turns.return_value = ["turn1", "turn2", "turn3"]
+    batch = [
+        queue_webhook("9198", whatsapp_data(("919999999999", "a"))),
+        queue_webhook("unknown", whatsapp_data(("917777777777", "b"))),
+        queue_webhook(
+            "9198", whatsapp_data(("918888888888", "c"), ("919999999999", "d"))
+        ),
+    ]
+
+    await ingest(batch)
+
+    mock_upsert_users.assert_awaited_once_with(
+        [
+            ("channel123", "919999999999", "Dummy", "Dummy"),
+            ("channel123", "918888888888", "Dummy", "Dummy"),
+            ("channel123", "919999999999", "Dummy", "Dummy"),
+        ]
+    )
+    mock_create_turns.assert_awaited_once_with(
+        [
+            ("bot123", "channel123", "user1"),
+            ("bot123", "channel123", "user2"),
+            ("bot123", "channel123", "user1"),
+        ]
+    )
+    messages = [
+        (msg.key(), decode_message(Channel, msg.value(), msg.headers()))
+        for msg in queued("channel")
+    ]
+    assert [(key, channel.turn_id) for key, channel in messages] == [
+        (b"user1", "turn1"),
+        (b"user2", "turn2"),
+        (b"user1", "turn3"),
+    ]
+    assert [channel.bot_input.data["text"]["body"] for _, channel in messages] == [
+        "a",
+        "c",
+        "d",
+    ]
+
+
+def delivery(error=None):
+    future = concurrent.futures.Future()
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+    return future
+
+
+@pytest.mark.asyncio
+@patch("app.ingest.asyncio.sleep", new_callable=AsyncMock)
+@patch("app.ingest.produce_message")
+@patch("app.ingest.register_turns", new_callable=AsyncMock)
+@patch("app.ingest.ChannelRoutes.get", new_callable=AsyncMock)
+async def test_retry_only_sends_the_undelivered_messages(
+    mock_get_route, mock_register_turns, mock_produce_message, mock_sleep
+):
+    mock_get_route.return_value = ROUTE
+    mock_register_turns.return_value = [("user1", "turn1"), ("user2", "turn2")]
+    mock_produce_message.side_effect = [
+        delivery(),
+        delivery(KafkaException("broker is down")),
+        delivery(),
+    ]
+    batch = [
+        queue_webhook("9198", whatsapp_data(("919999999999", "a"))),
+        queue_webhook("9198", whatsapp_data(("918888888888", "b"))),
+    ]
+
+    with (
+        patch("app.ingest.retry_backoff", 1),
+        patch("app.ingest.dead_letter_topic", "ingest-dead-letter"),
+    ):
+        await ingest(batch)
+
+    mock_register_turns.assert_awaited_once()
+    turn_ids = [
+        call.args[0].turn_id for call in mock_produce_message.call_args_list
+    ]
+    assert turn_ids == ["turn1", "turn2", "turn2"]
+    mock_sleep.assert_awaited_once_with(1)
+    assert not queued("ingest-dead-letter")
+
+
+@pytest.mark.asyncio
+@patch("app.ingest.asyncio.sleep", new_callable=AsyncMock)
+@patch("app.ingest.register", new_callable=AsyncMock)
+async def test_failed_batch_is_retried(mock_register, mock_sleep):
+    mock_register.side_effect = [ConnectionError("database is down"), []]
+    batch = [queue_webhook("9198", whatsapp_data(("919999999999", "a")))]
+
+    with (
+        patch("app.ingest.retry_backoff", 1),
+        patch("app.ingest.dead_letter_topic", "ingest-dead-letter"),
+    ):
+        await ingest(batch)
+
+    assert mock_register.await_count == 2
+    mock_sleep.assert_awaited_once_with(1)
+    assert not queued("ingest-dead-letter")
+
+
+@pytest.mark.asyncio
+@patch("app.ingest.asyncio.sleep", new_callable=AsyncMock)
+@patch("app.ingest.register", new_callable=AsyncMock)
+async def test_batch_that_keeps_failing_is_dead_lettered(mock_register, mock_sleep):
+    mock_register.side_effect = ConnectionError("database is down")
+    batch = [
+        queue_webhook("9198", whatsapp_data(("919999999999", "a"))),
+        queue_webhook("9198", whatsapp_data(("918888888888", "b"))),
+    ]
+
+    with (
+        patch("app.ingest.max_retries", 3),
+        patch("app.ingest.retry_backoff", 1),
+        patch("app.ingest.dead_letter_topic", "ingest-dead-letter"),
+    ):
+        await ingest(batch)
+
+    assert mock_register.await_count == 4
+    assert [call.args for call in mock_sleep.await_args_list] == [(1,), (2,), (4,)]
+    assert sorted(msg.value() for msg in queued("ingest-dead-letter")) == sorted(
+        msg.value() for msg in batch
+    )
+
+
+@pytest.mark.asyncio
+@patch("app.ingest.asyncio.sleep", new_callable=AsyncMock)
+@patch("app.ingest.produce_message")
+@patch("app.ingest.register_turns", new_callable=AsyncMock)
+@patch("app.ingest.ChannelRoutes.get", new_callable=AsyncMock)
+async def test_only_undelivered_webhooks_are_dead_lettered(
+    mock_get_route, mock_register_turns, mock_produce_message, mock_sleep
+):
+    mock_get_route.return_value = ROUTE
+    mock_register_turns.return_value = [("user1", "turn1"), ("user2", "turn2")]
+    mock_produce_message.side_effect = lambda channel, key: delivery(
+        KafkaException("broker is down") if channel.turn_id == "turn2" else None
+    )
+    batch = [
+        queue_webhook("9198", whatsapp_data(("919999999999", "a"))),
+        queue_webhook("9198", whatsapp_data(("918888888888", "b"))),
+    ]
+
+    with (
+        patch("app.ingest.max_retries", 1),
+        patch("app.ingest.dead_letter_topic", "ingest-dead-letter"),
+    ):
+        await ingest(batch)
+
+    assert [msg.value() for msg in queued("ingest-dead-letter")] == [
+        batch[1].value()
+    ]
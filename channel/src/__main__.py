@@ -1,5 +1,4 @@
 import asyncio
-import json
 import os
 import logging
 import traceback
@@ -10,8 +9,17 @@ from lib.data_models import (
     ChannelIntent,
     Flow,
     Language,
+    decode_message,
+    encode_message,
 )
-from lib.kafka import KafkaHandler
+from lib.kafka import (
+    AsyncKafkaConsumer,
+    AsyncKafkaProducer,
+    Deliveries,
+    set_message_context,
+)
+from lib.metrics import HANDLER_SECONDS, start_metrics_server
+from lib.tracing import span
 from .handlers import process_incoming_messages, send_message_to_user
 
 load_dotenv()
@@ -34,45 +42,67 @@ logger.info("Channel Topic: %s", channel_topic)
 logger.info("Language Topic: %s", language_topic)
 logger.info("Flow Topic: %s", flow_topic)
 
-consumer = KafkaHandler.get_consumer()
-producer = KafkaHandler.get_producer()
+# offsets are committed once a batch of messages has been handled
+consumer = AsyncKafkaConsumer.from_env_vars(
+    group_id="channel",
+    auto_offset_reset="latest",
+    topics=[channel_topic],
+    manual_commit=True,
+)
+producer = AsyncKafkaProducer.from_env_vars()
+
+
+async def handle_message(input_data: Channel, deliveries: Deliveries):
+    """Handles a message from the channel topic, sending messages on through
+    `deliveries`."""
+    try:
+        logger.info(
+            "Input received in object form: %s",
+            input_data.model_dump(exclude_none=True),
+        )
+        if input_data.intent == ChannelIntent.CHANNEL_IN:
+            incoming_message = await process_incoming_messages(
+                turn_id=input_data.turn_id, bot_input=input_data.bot_input
+            )
+            if isinstance(incoming_message, Flow):
+                logger.info("Sending to flow")
+                value, headers = encode_message(incoming_message)
+                deliveries.send_message(flow_topic, value, headers=headers)
+            elif isinstance(incoming_message, Language):
+                logger.info("Sending to language")
+                value, headers = encode_message(incoming_message)
+                deliveries.send_message(language_topic, value, headers=headers)
+        elif input_data.intent == ChannelIntent.CHANNEL_OUT:
+            await send_message_to_user(
+                turn_id=input_data.turn_id, message=input_data.bot_output
+            )
+    except Exception as e:
+        logger.error("Error %s", e)
+        traceback.print_exc()
 
 
 async def start_channel():
     """Starts the channel server"""
+    start_metrics_server()
     logger.info("Starting Listening")
-    while True:
-        try:
-            msg = consumer.receive_message(channel_topic)
-            msg = json.loads(msg)
-            logger.info("Input received: %s", msg)
-            input_data = Channel(**msg)
-            logger.info(
-                "Input received in object form: %s",
-                input_data.model_dump(exclude_none=True),
-            )
-            if input_data.intent == ChannelIntent.CHANNEL_IN:
-                incoming_message = await process_incoming_messages(
-                    turn_id=input_data.turn_id, bot_input=input_data.bot_input
-                )
-                if isinstance(incoming_message, Flow):
-                    logger.info("Sending to flow")
-                    producer.send_message(
-                        flow_topic, incoming_message.model_dump_json(exclude_none=True)
-                    )
-                elif isinstance(incoming_message, Language):
-                    logger.info("Sending to language")
-                    producer.send_message(
-                        language_topic,
-                        incoming_message.model_dump_json(exclude_none=True),
-                    )
-            elif input_data.intent == ChannelIntent.CHANNEL_OUT:
-                await send_message_to_user(
-                    turn_id=input_data.turn_id, message=input_data.bot_output
-                )
-        except Exception as e:
-            logger.error("Error %s", e)
-            traceback.print_exc()
+    async for batch in consumer.batches():
+        deliveries = producer.deliveries()
+        for msg in batch:
+            # messages sent while handling it are keyed and traced like it
+            set_message_context(msg)
+            try:
+                input_data = decode_message(Channel, msg.value(), msg.headers())
+            except ValueError as e:
+                logger.error("Invalid message %s: %s", msg.value(), e)
+                continue
+            with (
+                span("channel handle", turn_id=input_data.turn_id),
+                HANDLER_SECONDS.labels(intent=input_data.intent.value).time(),
+            ):
+                await handle_message(input_data, deliveries)
+        # the batch is committed once the messages sent for it are delivered,
+        # or given up after retrying them
+        await deliveries.wait()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import logging
 from lib.data_models import Message
 from lib.channel_handler import channel_map
+from lib.metrics import external_call
 from ..crud import (
     get_user_by_turn_id,
     get_channel_by_turn_id,
@@ -24,7 +25,8 @@ async def send_message_to_user(turn_id: str, message: Message):
         return None
     channel_name: str = jb_channel.type
     channel_handler = channel_map[channel_name]
-    channel_handler.send_message(channel=jb_channel, user=jb_user, message=message)
+    with external_call(channel_name, "send_message"):
+        channel_handler.send_message(channel=jb_channel, user=jb_user, message=message)
     logger.info("Message type: %s", message.message_type)
     await create_message(
         turn_id=turn_id,
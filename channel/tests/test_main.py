@@ -0,0 +1,86 @@
+import asyncio
+import concurrent.futures
+import os
+from unittest.mock import AsyncMock, patch
+import pytest
+from confluent_kafka import KafkaException
+
+os.environ.setdefault("KAFKA_BACKEND", "memory")
+os.environ.setdefault("KAFKA_CHANNEL_TOPIC", "channel")
+os.environ.setdefault("KAFKA_LANGUAGE_TOPIC", "language")
+os.environ.setdefault("KAFKA_FLOW_TOPIC", "flow")
+
+# pylint: disable=wrong-import-position
+from lib.data_models import (
+    Channel,
+    ChannelIntent,
+    Language,
+    LanguageIntent,
+    Message,
+    MessageType,
+    RestBotInput,
+    TextMessage,
+    encode_message,
+)
+from lib.kafka.memory import MemoryBroker
+import src.__main__ as channel_main
+
+
+@pytest.mark.asyncio
+async def test_batch_is_committed_once_a_failed_delivery_is_retried():
+    broker = MemoryBroker.get_instance()
+    topic = os.environ["KAFKA_CHANNEL_TOPIC"]
+    # the group resumes from the start of the topic
+    broker.committed[("channel", topic, 0)] = 0
+    value, headers = encode_message(
+        Channel(
+            source="api",
+            turn_id="test_turn_id",
+            intent=ChannelIntent.CHANNEL_IN,
+            bot_input=RestBotInput(
+                channel_name="telegram", headers={}, query_params={}, data={}
+            ),
+        )
+    )
+    broker.append(topic, 0, None, value, headers)
+    language_input = Language(
+        source="channel",
+        turn_id="test_turn_id",
+        intent=LanguageIntent.LANGUAGE_IN,
+        message=Message(message_type=MessageType.TEXT, text=TextMessage(body="Hi")),
+    )
+    failed = concurrent.futures.Future()
+    failed.set_exception(KafkaException("broker is down"))
+    delivered = concurrent.futures.Future()
+    delivered.set_result(None)
+    commits = []
+
+    def send_message(*args, **kwargs):
+        commits.append(broker.committed[("channel", topic, 0)])
+        return failed if len(commits) == 1 else delivered
+
+    try:
+        with (
+            patch.object(channel_main, "start_metrics_server"),
+            patch.object(
+                channel_main,
+                "process_incoming_messages",
+                AsyncMock(return_value=language_input),
+            ),
+            patch.object(channel_main.producer, "retry_backoff", 0.01),
+            patch.object(
+                channel_main.producer, "send_message", side_effect=send_message
+            ),
+        ):
+            task = asyncio.create_task(channel_main.start_channel())
+            for _ in range(500):
+                if broker.committed[("channel", topic, 0)] == 1:
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+    finally:
+        await channel_main.consumer.close()
+
+    # the batch was not committed before the retry
+    assert commits == [0, 0]
+    assert broker.committed[("channel", topic, 0)] == 1
@@ -0,0 +1,94 @@
+"""Added unique user per channel
+
+Revision ID: 04904149135f
+Revises: ecce2dffb257
+Create Date: 2026-10-18 11:02:17.460391
+
+Users were looked up by identifier and created when missing in two steps, so
+concurrent webhooks of a new user could register it more than once. The
+duplicates of a (channel_id, identifier) are merged into the earliest
+registered one, then the pair is made unique, which the upsert of users
+relies on. The unique index replaces ix_jb_users_identifier_channel_id.
+
+The unique index is built concurrently. If the build fails, e.g. because
+duplicates were registered meanwhile, drop the INVALID index
+uq_jb_users_channel_id_identifier and run the migration again.
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "04904149135f"
+down_revision = "ecce2dffb257"
+branch_labels = None
+depends_on = None
+
+# tables referring to jb_users.id
+USER_REFERENCES = [
+    ("jb_session", "user_id"),
+    ("jb_turn", "user_id"),
+    ("jb_qa_log", "pid"),
+    ("jb_chat_history", "pid"),
+]
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE jb_users_duplicates ON COMMIT DROP AS
+        SELECT id, keep_id FROM (
+            SELECT
+                id,
+                first_value(id) OVER (
+                    PARTITION BY channel_id, identifier ORDER BY created_at, id
+                ) AS keep_id
+            FROM jb_users
+            WHERE channel_id IS NOT NULL AND identifier IS NOT NULL
+        ) AS users
+        WHERE id <> keep_id
+        """
+    )
+    for table, column in USER_REFERENCES:
+        op.execute(
+            f"""
+            UPDATE {table} SET {column} = duplicates.keep_id
+            FROM jb_users_duplicates AS duplicates
+            WHERE {table}.{column} = duplicates.id
+            """
+        )
+    op.execute(
+        "DELETE FROM jb_users USING jb_users_duplicates AS duplicates "
+        "WHERE jb_users.id = duplicates.id"
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_jb_users_channel_id_identifier",
+            "jb_users",
+            ["channel_id", "identifier"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.execute(
+            "ALTER TABLE jb_users ADD CONSTRAINT uq_jb_users_channel_id_identifier "
+            "UNIQUE USING INDEX uq_jb_users_channel_id_identifier"
+        )
+        op.drop_index(
+            "ix_jb_users_identifier_channel_id",
+            table_name="jb_users",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    # merged duplicates are not restored
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_jb_users_identifier_channel_id",
+            "jb_users",
+            ["identifier", "channel_id"],
+            postgresql_concurrently=True,
+        )
+    op.drop_constraint("uq_jb_users_channel_id_identifier", "jb_users", type_="unique")
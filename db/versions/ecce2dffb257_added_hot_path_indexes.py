@@ -0,0 +1,50 @@
+"""Added indexes for the lookups of every turn
+
+Revision ID: ecce2dffb257
+Revises: 97038f7ea521
+Create Date: 2026-10-18 10:12:40.118203
+
+The indexes are built with CREATE INDEX CONCURRENTLY, outside of the
+migration transaction, so the tables stay writable while they are built and
+the migration can run against a live database. If a build fails, Postgres
+keeps the index as INVALID: drop it and run the migration again.
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "ecce2dffb257"
+down_revision = "97038f7ea521"
+branch_labels = None
+depends_on = None
+
+# (name, table, columns); jb_turn.id is the primary key, so it is indexed
+INDEXES = [
+    ("ix_jb_turn_session_id", "jb_turn", ["session_id"]),
+    ("ix_jb_fsm_state_session_id", "jb_fsm_state", ["session_id"]),
+    (
+        # latest session of a user on a channel, scanned backwards
+        "ix_jb_session_user_id_channel_id_updated_at",
+        "jb_session",
+        ["user_id", "channel_id", "updated_at"],
+    ),
+    ("ix_jb_users_identifier_channel_id", "jb_users", ["identifier", "channel_id"]),
+    ("ix_jb_channel_app_id_type_status", "jb_channel", ["app_id", "type", "status"]),
+    ("ix_jb_message_turn_id", "jb_message", ["turn_id"]),
+    ("ix_jb_webhook_reference_turn_id", "jb_webhook_reference", ["turn_id"]),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
@@ -1,4 +1,3 @@
-import re
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, Type
 from jb_manager_bot import (
@@ -29,247 +28,15 @@ class CarWashDealerVariables(BaseModel):
 
 class CarWashDealerFSM(AbstractFSM):
 
-    states = [
-        "zero",
-        "language_selection",
-        "welcome_message_display",
-        "service_selection_display",
-        "service_selection_input",
-        "service_selection_logic",
-        "service_selection_fail",
-        "service_selection_task_fail_verify",
-        "service_selection_fail_display",
-        "date_display",
-        "date_input",
-        "date_logic",
-        "time_display",
-        "time_input",
-        "time_logic",
-        "date_fail_display",
-        "time_fail_display",
-        "check_availability_plugin",
-        "plugin_fail_display",
-        "check_booking_status_logic",
-        "booking_confirmation_display",
-        "booking_pending_display",
-        "further_assistance_display",
-        "further_assistance_input",
-        "further_assistance_logic",
-        "further_assistance_fail_display",
-        "further_assistance_verify",
-        "conclusion_display",
-        "end",
-    ]
+    # the failed attempts are counted by hand, the other states come from build()
+    states = ["zero", "service_selection_fail", "end"]
     transitions = [
-        {"source": "zero", "dest": "language_selection", "trigger": "next"},
-        {
-            "source": "language_selection",
-            "dest": "welcome_message_display",
-            "trigger": "next",
-        },
-        {
-            "source": "welcome_message_display",
-            "dest": "service_selection_display",
-            "trigger": "next",
-        },
-        {
-            "source": "service_selection_display",
-            "dest": "service_selection_input",
-            "trigger": "next",
-        },
-        {
-            "source": "service_selection_input",
-            "dest": "service_selection_logic",
-            "trigger": "next",
-        },
-        {
-            "source": "service_selection_logic",
-            "dest": "date_display",
-            "trigger": "next",
-            "conditions": "is_valid_service",
-        },
-        {
-            "source": "service_selection_logic",
-            "dest": "service_selection_fail",
-            "trigger": "next",
-        },
         {
             "source": "service_selection_fail",
             "dest": "service_selection_task_fail_verify",
             "trigger": "next",
         },
-        {
-            "source": "service_selection_task_fail_verify",
-            "dest": "service_selection_display",
-            "trigger": "next",
-            "conditions": "is_service_fail_count_less_than_3",
-        },
-        {
-            "source": "service_selection_task_fail_verify",
-            "dest": "end",
-            "trigger": "next",
-            "conditions": "is_service_fail_count_3",
-        },
-        {
-            "source": "date_display",
-            "dest": "date_input",
-            "trigger": "next",
-        },
-        {
-            "source": "date_input",
-            "dest": "date_logic",
-            "trigger": "next",
-        },
-        {
-            "source": "date_logic",
-            "dest": "time_display",
-            "trigger": "next",
-            "conditions": "is_valid_date",
-        },
-        {
-            "source": "date_logic",
-            "dest": "date_fail_display",
-            "trigger": "next",
-        },
-        {
-            "source": "date_fail_display",
-            "dest": "date_display",
-            "trigger": "next",
-        },
-        {
-            "source": "time_display",
-            "dest": "time_input",
-            "trigger": "next",
-        },
-        {
-            "source": "time_input",
-            "dest": "time_logic",
-            "trigger": "next",
-        },
-        {
-            "source": "time_logic",
-            "dest": "check_availability_plugin",
-            "trigger": "next",
-            "conditions": "is_valid_time",
-        },
-        {
-            "source": "time_logic",
-            "dest": "time_fail_display",
-            "trigger": "next",
-        },
-        {
-            "source": "time_fail_display",
-            "dest": "time_display",
-            "trigger": "next",
-        },
-        {
-            "source": "check_availability_plugin",
-            "dest": "check_booking_status_logic",
-            "trigger": "next",
-            "conditions": "is_error_code_200",
-        },
-        {
-            "source": "check_availability_plugin",
-            "dest": "plugin_fail_display",
-            "trigger": "next",
-            "conditions": "is_error_code_400",
-        },
-        {
-            "source": "check_availability_plugin",
-            "dest": "plugin_fail_display",
-            "trigger": "next",
-            "conditions": "is_error_code_500",
-        },
-        {
-            "source": "check_availability_plugin",
-            "dest": "plugin_fail_display",
-            "trigger": "next",
-            "conditions": "is_error_code_404",
-        },
-        {
-            "source": "plugin_fail_display",
-            "dest": "end",
-            "trigger": "next",
-        },
-        {
-            "source": "check_booking_status_logic",
-            "dest": "booking_confirmation_display",
-            "trigger": "next",
-            "conditions": "is_booking_confirmed",
-        },
-        {
-            "source": "check_booking_status_logic",
-            "dest": "booking_pending_display",
-            "trigger": "next",
-        },
-        {
-            "source": "booking_pending_display",
-            "dest": "end",
-            "trigger": "next",
-        },
-        {
-            "source": "booking_confirmation_display",
-            "dest": "further_assistance_display",
-            "trigger": "next",
-        },
-        {
-            "source": "further_assistance_display",
-            "dest": "further_assistance_input",
-            "trigger": "next",
-        },
-        {
-            "source": "further_assistance_input",
-            "dest": "further_assistance_logic",
-            "trigger": "next",
-        },
-        {
-            "source": "further_assistance_logic",
-            "dest": "further_assistance_verify",
-            "trigger": "next",
-            "conditions": "is_further_assistance_valid",
-        },
-        {
-            "source": "further_assistance_logic",
-            "dest": "further_assistance_fail_display",
-            "trigger": "next",
-        },
-        {
-            "source": "further_assistance_verify",
-            "dest": "service_selection_display",
-            "trigger": "next",
-            "conditions": "is_further_assistance",
-        },
-        {
-            "source": "further_assistance_verify",
-            "dest": "conclusion_display",
-            "trigger": "next",
-            "conditions": "is_not_further_assistance",
-        },
-        {
-            "source": "further_assistance_fail_display",
-            "dest": "further_assistance_display",
-            "trigger": "next",
-        },
-        {
-            "source": "conclusion_display",
-            "dest": "end",
-            "trigger": "next",
-        },
     ]
-    conditions = {
-        "is_valid_service",
-        "is_valid_date",
-        "is_valid_time",
-        "is_booking_confirmed",
-        "is_booking_pending",
-        "is_error_code_200",
-        "is_error_code_400",
-        "is_error_code_500",
-        "is_error_code_404",
-        "is_further_assistance_valid",
-        "is_further_assistance",
-        "is_not_further_assistance",
-    }
     output_variables = set()
     variable_names = CarWashDealerVariables
 
@@ -309,115 +76,89 @@ class CarWashDealerFSM(AbstractFSM):
         super().__init__(send_message=send_message)
         # print(self.variables.__dict__)
 
-    def on_enter_language_selection(self):
-        self._on_enter_select_language()
-
-    def on_enter_welcome_message_display(self):
-        self._on_enter_display(
-            message="Welcome to the Car Dealer Bot! How can I help you today?"
-        )
+    @classmethod
+    def build(cls):
+        services = [
+            "Buy a Car",
+            "Service Car",
+            "Test Drive",
+            "Buy Accessories or Parts",
+            "Warranty and Protection Plan",
+        ]
+        times = ["Morning", "Afternoon", "Evening"]
 
-    def on_enter_service_selection_display(self):
-        self._on_enter_display(
-            message="Would you like to buy a car, service your car, test drive, buy accessories or parts, or get a warranty and protection plan?",
-            options=[
-                "Buy a Car",
-                "Service Car",
-                "Test Drive",
-                "Buy Accessories or Parts",
-                "Warranty and Protection Plan",
-            ],
+        cls.create_select_language("language_selection", "welcome_message_display")
+        cls.create_display_task(
+            "welcome_message_display",
+            "service_selection_display",
+            "Welcome to the Car Dealer Bot! How can I help you today?",
         )
 
-    def on_enter_service_selection_input(self):
-        self._on_enter_empty_input()
-
-    def on_enter_service_selection_logic(self):
-        self._on_enter_input_logic(
-            message="Please select one of the following options:",
+        cls.create_input_task(
+            "service_selection",
+            "Would you like to buy a car, service your car, test drive, buy accessories or parts, or get a warranty and protection plan?",
+            success_dest="date_display",
+            options=services,
+            fail_dest="service_selection_fail",
             write_var="selected_service",
-            options=[
-                "Buy a Car",
-                "Service Car",
-                "Test Drive",
-                "Buy Accessories or Parts",
-                "Warranty and Protection Plan",
+            validation_expression=f"selected_service in {services}",
+        )
+        cls.create_branching_task(
+            "service_selection_task_fail_verify",
+            [
+                {
+                    "condition": "is_service_fail_count_less_than_3",
+                    "expression": "fail_service_count < 3",
+                    "variable": "fail_service_count",
+                    "dest": "service_selection_fail_display",
+                },
+                {
+                    "condition": "is_service_fail_count_3",
+                    "expression": "fail_service_count >= 3",
+                    "variable": "fail_service_count",
+                    "dest": "end",
+                },
             ],
-            validation="selected_service in ['Buy a Car', 'Service Car', 'Test Drive', 'Buy Accessories or Parts', 'Warranty and Protection Plan']",
         )
-
-    def on_enter_service_selection_fail(self):
-        self.status = Status.WAIT_FOR_ME
-        variable_name = "fail_service_count"
-        validation = lambda x: x + 1
-        self._on_enter_assign(
-            variable_name,
-            validation,
-        )
-
-        self.status = Status.MOVE_FORWARD
-
-    def on_enter_service_selection_task_fail_verify(self):
-        self._on_enter_empty_branching()
-
-    def is_service_fail_count_less_than_3(self):
-        variable_name = "fail_service_count"
-        validation = lambda x: x < 3
-        return self._validate_method(variable_name, validation)
-
-    def is_service_fail_count_3(self):
-        variable_name = "fail_service_count"
-        validation = lambda x: x >= 3
-        return self._validate_method(variable_name, validation)
-
-    def on_enter_service_selection_fail_display(self):
-        self._on_enter_display(
-            message="Sorry, I didn't understand that. Please select one of the following options:",
-        )
-
-    def on_enter_date_display(self):
-        self._on_enter_display(
-            message="Please enter the date you would like to schedule your appointment (YYYY-MM-DD):"
+        cls.create_display_task(
+            "service_selection_fail_display",
+            "service_selection_display",
+            "Sorry, I didn't understand that. Please select one of the following options:",
         )
 
-    def on_enter_date_input(self):
-        self._on_enter_empty_input()
-
-    def on_enter_date_logic(self):
-        self._on_enter_input_logic(
+        cls.create_input_task(
+            "date",
+            "Please enter the date you would like to schedule your appointment (YYYY-MM-DD):",
+            success_dest="time_display",
+            fail_dest="date_fail_display",
             write_var="appointment_date",
-            validation="re.match(r'^\d{4}-\d{2}-\d{2}$', appointment_date) is not None",
-        )
-
-    def on_enter_date_fail_display(self):
-        self._on_enter_display(
-            message="Sorry, I didn't understand that. Please enter the date you would like to schedule your appointment (YYYY-MM-DD):"
+            validation_expression="isinstance(appointment_date, str) and len(appointment_date) == 10 and appointment_date.replace('-', '', 2).isdigit()",
         )
-
-    def on_enter_time_display(self):
-        self._on_enter_display(
-            message="Please enter the time of day you would like to schedule your appointment (Morning, Afternoon, Evening):",
-            options=["Morning", "Afternoon", "Evening"],
+        cls.create_display_task(
+            "date_fail_display",
+            "date_display",
+            "Sorry, I didn't understand that. Please enter the date you would like to schedule your appointment (YYYY-MM-DD):",
         )
 
-    def on_enter_time_input(self):
-        self._on_enter_empty_input()
-
-    def on_enter_time_logic(self):
-        self._on_enter_input_logic(
+        cls.create_input_task(
+            "time",
+            "Please enter the time of day you would like to schedule your appointment (Morning, Afternoon, Evening):",
+            success_dest="check_availability_plugin",
+            options=times,
+            fail_dest="time_fail_display",
             write_var="appointment_time",
-            options=["Morning", "Afternoon", "Evening"],
-            validation="appointment_time in ['Morning', 'Afternoon', 'Evening']",
+            validation_expression=f"appointment_time in {times}",
         )
-
-    def on_enter_time_fail_display(self):
-        self._on_enter_display(
-            "Sorry, I didn't understand that. Please enter the time of day you would like to schedule your appointment (Morning, Afternoon, Evening):"
+        cls.create_display_task(
+            "time_fail_display",
+            "time_display",
+            "Sorry, I didn't understand that. Please enter the time of day you would like to schedule your appointment (Morning, Afternoon, Evening):",
         )
 
-    def on_enter_check_availability_plugin(self):
-        self._on_enter_plugin(
-            plugin=availability_plugin,
+        cls.create_plugin_task(
+            "check_availability_plugin",
+            "Checking availability for your appointment...",
+            availability_plugin,
             input_variables={
                 "SELECTED_SERVICE": "selected_service",
                 "APPOINTMENT_DATE": "appointment_date",
@@ -426,114 +167,86 @@ class CarWashDealerFSM(AbstractFSM):
             output_variables={
                 "booking_status": "booking_status",
                 "appointment_image": "appointment_image",
-                # "error_code": "error_code",
             },
-            message="Checking availability for your appointment...",
+            transitions=[
+                {"condition": 200, "dest": "check_booking_status_logic"},
+                {"condition": 400, "dest": "plugin_fail_display"},
+                {"condition": 500, "dest": "plugin_fail_display"},
+                {"condition": 404, "dest": "plugin_fail_display"},
+            ],
         )
-
-    def on_enter_plugin_fail_display(self):
-        self._on_enter_display(
-            message="Sorry, We couldn't complete your booking. Apologies, Please try again after sometime."
+        cls.create_display_task(
+            "plugin_fail_display",
+            "end",
+            "Sorry, We couldn't complete your booking. Apologies, Please try again after sometime.",
+        )
+
+        cls.create_branching_task(
+            "check_booking_status_logic",
+            [
+                {
+                    "condition": "is_booking_confirmed",
+                    "expression": "booking_status == 'confirmed'",
+                    "variable": "booking_status",
+                    "dest": "booking_confirmation_display",
+                },
+                {
+                    "condition": "is_booking_pending",
+                    "expression": "booking_status != 'confirmed'",
+                    "variable": "booking_status",
+                    "dest": "booking_pending_display",
+                },
+            ],
         )
-
-    def on_enter_check_booking_status_logic(self):
-        self._on_enter_empty_branching()
-
-    def on_enter_booking_pending_display(self):
-        self._on_enter_display(
-            message="Sorry, We couldn't complete your booking. Apologies, Please try again after sometime."
+        cls.create_display_task(
+            "booking_pending_display",
+            "end",
+            "Sorry, We couldn't complete your booking. Apologies, Please try again after sometime.",
         )
-
-    def on_enter_booking_confirmation_display(self):
-        self._on_enter_display(
-            message="Your appointment has been confirmed! Please check your email for more details.",
+        cls.create_display_task(
+            "booking_confirmation_display",
+            "further_assistance_display",
+            "Your appointment has been confirmed! Please check your email for more details.",
         )
 
-    def on_enter_further_assistance_display(self):
-        self._on_enter_display(
-            message="Do you need further assistance?",
+        cls.create_input_task(
+            "further_assistance",
+            "Do you need further assistance?",
+            success_dest="further_assistance_verify",
             options=["Yes", "No"],
-        )
-
-    def on_enter_further_assistance_input(self):
-        self._on_enter_empty_input()
-
-    def on_enter_further_assistance_logic(self):
-        self._on_enter_input_logic(
+            fail_dest="further_assistance_fail_display",
             write_var="further_assistance",
-            options=["Yes", "No"],
-            validation="isinstance(further_assistance, str) and re.match(r'^(Yes|No)$', further_assistance) is not None",
-        )
-
-    def on_enter_further_assistance_fail_display(self):
-        self._on_enter_display(
-            message="Sorry, I didn't understand that. Please select one of the following options: Yes or No",
-        )
-
-    def on_enter_further_assistance_verify(self):
-        self._on_enter_empty_branching()
-
-    def on_enter_conclusion_display(self):
-        self._on_enter_display(
-            message="Thank you for using the Car Dealer Bot! Have a great day!"
+            validation_expression="further_assistance in ['Yes', 'No']",
+        )
+        cls.create_display_task(
+            "further_assistance_fail_display",
+            "further_assistance_display",
+            "Sorry, I didn't understand that. Please select one of the following options: Yes or No",
+        )
+        cls.create_branching_task(
+            "further_assistance_verify",
+            [
+                {
+                    "condition": "is_further_assistance",
+                    "expression": "further_assistance == 'Yes'",
+                    "variable": "further_assistance",
+                    "dest": "service_selection_display",
+                },
+                {
+                    "condition": "is_not_further_assistance",
+                    "expression": "further_assistance == 'No'",
+                    "variable": "further_assistance",
+                    "dest": "conclusion_display",
+                },
+            ],
         )
-
-    def is_valid_service(self):
-        variable_name = "selected_service"
-        validation = lambda x: x in [
-            "Buy a Car",
-            "Service Car",
-            "Test Drive",
-            "Buy Accessories or Parts",
-            "Warranty and Protection Plan",
-        ]
-        return self._validate_method(variable_name, validation)
-
-    def is_valid_date(self):
-        variable_name = "appointment_date"
-        validation = lambda x: re.match(r"^\d{4}-\d{2}-\d{2}$", x) is not None
-        return self._validate_method(variable_name, validation)
-
-    def is_valid_time(self):
-        variable_name = "appointment_time"
-        validation = lambda x: x in ["Morning", "Afternoon", "Evening"]
-        return self._validate_method(variable_name, validation)
-
-    def is_booking_confirmed(self):
-        variable_name = "booking_status"
-        validation = lambda x: x == "confirmed"
-        return self._validate_method(variable_name, validation)
-
-    def is_booking_pending(self):
-        variable_name = "booking_status"
-        validation = lambda x: x != "confirmed"
-        return self._validate_method(variable_name, validation)
-
-    def is_error_code_200(self):
-        return self._plugin_error_code_validation(200)
-
-    def is_further_assistance_valid(self):
-        variable = "further_assistance"
-        validation = (
-            lambda x: isinstance(x, str) and re.match(r"^(Yes|No)$", x) is not None
+        cls.create_display_task(
+            "conclusion_display",
+            "end",
+            "Thank you for using the Car Dealer Bot! Have a great day!",
         )
-        return self._validate_method(variable, validation)
-
-    def is_further_assistance(self):
-        variable_name = "further_assistance"
-        validation = lambda x: x == "Yes"
-        return self._validate_method(variable_name, validation)
-
-    def is_not_further_assistance(self):
-        variable_name = "further_assistance"
-        validation = lambda x: x == "No"
-        return self._validate_method(variable_name, validation)
 
-    def is_error_code_400(self):
-        return self._plugin_error_code_validation(400)
-
-    def is_error_code_500(self):
-        return self._plugin_error_code_validation(500)
-
-    def is_error_code_404(self):
-        return self._plugin_error_code_validation(404)
+    def on_enter_service_selection_fail(self):
+        self.status = Status.WAIT_FOR_ME
+        self._on_enter_assign("fail_service_count", lambda x: x + 1)
+        self.status = Status.MOVE_FORWARD
@@ -0,0 +1,112 @@
+"""Compares the ways of handing the runner input to an FSM subprocess.
+
+For growing state sizes it measures a full round trip to a child python
+process: the input is sent either as a JSON argv argument (the old way) or as
+a single stdin frame in each supported encoding, and the child echoes it back
+as a stdout frame.
+
+Run from the flow directory:
+
+    python -m benchmarks.fsm_runner_input
+"""
+
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+
+FRAME_HEADER = struct.Struct(">I")
+ROUNDS = 20
+
+child_code = """
+import json, os, struct, sys
+header = struct.Struct(">I")
+encoding = os.environ["FSM_RUNNER_ENCODING"]
+if encoding == "argv":
+    payload = json.loads(sys.argv[1])
+    data = json.dumps(payload).encode()
+else:
+    (length,) = header.unpack(sys.stdin.buffer.read(header.size))
+    data = sys.stdin.buffer.read(length)
+    if encoding == "msgpack":
+        import msgpack
+        data = msgpack.packb(msgpack.unpackb(data, raw=False), use_bin_type=True)
+    else:
+        data = json.dumps(json.loads(data)).encode()
+sys.stdout.buffer.write(header.pack(len(data)) + data)
+"""
+
+
+def codecs():
+    yield "json", lambda p: json.dumps(p).encode(), json.loads
+    try:
+        import msgpack  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        print("msgpack is not installed, skipping it")
+        return
+    yield (
+        "msgpack",
+        lambda p: msgpack.packb(p, use_bin_type=True),
+        lambda d: msgpack.unpackb(d, raw=False),
+    )
+
+
+def runner_input(state_size: int) -> dict:
+    return {
+        "state": {
+            "state": "zero",
+            "variables": {
+                f"key_{i}": {"text": "x" * 100, "count": i, "flags": [True, None]}
+                for i in range(state_size // 150)
+            },
+        },
+        "bot_name": "Bot",
+        "credentials": {},
+        "config_env": {},
+        "fsm_input": {"user_input": "hello", "callback_input": None},
+    }
+
+
+def round_trip(encoding: str, payload: dict, encode, decode) -> float:
+    start = time.perf_counter()
+    env = {**os.environ, "FSM_RUNNER_ENCODING": encoding}
+    if encoding == "argv":
+        args, stdin = [json.dumps(payload)], b""
+    else:
+        data = encode(payload)
+        args, stdin = [], FRAME_HEADER.pack(len(data)) + data
+    result = subprocess.run(
+        [sys.executable, "-c", child_code, *args],
+        input=stdin,
+        capture_output=True,
+        env=env,
+        check=True,
+    )
+    (length,) = FRAME_HEADER.unpack(result.stdout[: FRAME_HEADER.size])
+    decode(result.stdout[FRAME_HEADER.size : FRAME_HEADER.size + length])
+    return time.perf_counter() - start
+
+
+def main():
+    available = list(codecs())
+    print(f"{'state size':>12} {'encoding':>10} {'payload':>10} {'ms/turn':>10}")
+    for state_size in (1_000, 10_000, 100_000, 1_000_000, 10_000_000):
+        payload = runner_input(state_size)
+        for encoding, encode, decode in [("argv", None, json.loads)] + available:
+            size = len(encode(payload)) if encode else len(json.dumps(payload))
+            try:
+                elapsed = sum(
+                    round_trip(encoding, payload, encode, decode)
+                    for _ in range(ROUNDS)
+                )
+                result = f"{elapsed / ROUNDS * 1000:10.2f}"
+            except OSError as e:
+                # argv is capped by the kernel, e.g. 128KiB per argument on linux
+                result = f"{'failed':>10} ({e.strerror})"
+            print(f"{state_size:>12} {encoding:>10} {size:>10} {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,53 @@
 import asyncio
-import json
+import os
 import traceback
 import logging
 from dotenv import load_dotenv
 
 from lib.data_models import (
     Flow,
+    BotIntent,
+    decode_message,
 )
-from .extensions import consumer, flow_topic
+from lib.kafka import message_key
+from lib.metrics import HANDLER_SECONDS, start_metrics_server
+from lib.tracing import span
+from .extensions import consumer
 from .crud import (
     get_all_bots,
 )
-from .handlers.bot_install import install_bot
-from .handlers.flow_input import handle_flow_input
+from .handlers.bot_install import BotInstallTracker, install_bot
+from .handlers.flow_input import (
+    get_bot_install,
+    handle_flow_input,
+    route_flow_input,
+    route_unkeyed_flow_input,
+)
+from .scheduler import KeyedScheduler
+from .venv_cache import prune_venvs, requirements_for, venv_key
 
 load_dotenv()
 
 logger = logging.getLogger("flow")
 
+# flow inputs handled concurrently, inputs of the same user stay in order
+FLOW_MAX_CONCURRENCY = int(os.getenv("FLOW_MAX_CONCURRENCY") or 16)
+# flow inputs received and not handled yet, beyond which the loop stops
+# receiving and the consumer pauses, so a burst becomes consumer lag
+FLOW_MAX_PENDING = int(os.getenv("FLOW_MAX_PENDING") or FLOW_MAX_CONCURRENCY * 4)
+
 
-async def flow_init():
-    # fetch all bots from db and install them
+async def flow_init() -> asyncio.Task:
+    # fetch all bots from db and install them in the background, turns of a
+    # bot wait until its install has finished
     bots = await get_all_bots()
     for bot in bots:
+        BotInstallTracker.start(bot.id)
+    return asyncio.create_task(install_bots(bots))
+
+
+async def install_bots(bots):
+    async def install(bot):
         try:
             await install_bot(
                 bot_id=bot.id,
@@ -35,24 +60,80 @@ async def flow_init():
                 "Error while installing bot: %s :: %s", e, traceback.format_exc()
             )
 
+    # installs run concurrently, venv_cache bounds the number of pip installs
+    await asyncio.gather(*(install(bot) for bot in bots))
+    logger.info("Finished installing bots")
+    prune_venvs(
+        keep=(
+            venv_key(requirements_for(bot.requirements), bot.index_urls)
+            for bot in bots
+        )
+    )
+
+
+async def handle_bot_flow_input(flow_input: Flow):
+    try:
+        with (
+            span("flow bot"),
+            HANDLER_SECONDS.labels(intent=flow_input.intent.value).time(),
+        ):
+            await handle_flow_input(flow_input=flow_input)
+    finally:
+        if flow_input.bot_config.intent == BotIntent.INSTALL:
+            BotInstallTracker.finish(flow_input.bot_config.bot_id)
+
+
+async def handle_turn_flow_input(flow_input: Flow):
+    turn = flow_input.user_input or flow_input.callback or flow_input.dialog
+    with (
+        span("flow handle", turn_id=turn.turn_id if turn else None),
+        HANDLER_SECONDS.labels(intent=flow_input.intent.value).time(),
+    ):
+        await handle_flow_input(flow_input=flow_input)
+
 
 async def flow_loop():
+    start_metrics_server()
     logger.info("Installing bots")
+    install_task = None
     try:
-        await flow_init()
+        # keep a reference, the event loop only holds a weak one to the task
+        install_task = await flow_init()
     except Exception as e:
         logger.error("Error while installing bots: %s :: %s", e, traceback.format_exc())
-    logger.info("Finished installing bots, starting flow loop")
+    logger.info("Starting flow loop")
 
-    while True:
+    scheduler = KeyedScheduler(
+        max_concurrency=FLOW_MAX_CONCURRENCY, max_pending=FLOW_MAX_PENDING
+    )
+    logger.info("Waiting for message")
+    async for msg in consumer.messages():
         try:
-            logger.info("Waiting for message")
-            msg = consumer.receive_message(flow_topic)
-            msg = json.loads(msg)
-            logger.info("Message Recieved :: %s", msg)
-            flow_input = Flow(**msg)
+            flow_input = decode_message(Flow, msg.value(), msg.headers())
+            logger.info("Message Recieved :: %s", flow_input)
 
-            await handle_flow_input(flow_input=flow_input)
+            # the key is resolved before the next message is received, which
+            # keeps the submission order equal to the topic order. Messages
+            # are keyed by user, only unkeyed ones need a lookup of the user
+            if message_key(msg):
+                key = route_flow_input(flow_input, message_key(msg))
+            else:
+                key = await route_unkeyed_flow_input(flow_input)
+            if flow_input.bot_config:
+                if flow_input.bot_config.intent == BotIntent.INSTALL:
+                    # turns received from now on wait for the new install
+                    BotInstallTracker.start(flow_input.bot_config.bot_id)
+                await scheduler.submit(
+                    key, lambda flow_input=flow_input: handle_bot_flow_input(flow_input)
+                )
+                continue
+
+            # the bot of the turn is looked up by the job, not by this loop
+            await scheduler.submit(
+                key,
+                lambda flow_input=flow_input: handle_turn_flow_input(flow_input),
+                ready=lambda flow_input=flow_input: get_bot_install(flow_input),
+            )
 
         except Exception as e:
             logger.error("Error in flow loop: %s :: %s", e, traceback.format_exc())
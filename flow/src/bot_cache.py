@@ -0,0 +1,50 @@
+"""LRU/TTL cache of the bot metadata every turn needs.
+
+Entries hold the bot's id, name, config_env and (encrypted) credentials. They
+are invalidated when flow handles an install, delete or configure of the bot.
+The TTL bounds how long a replica can serve stale config when it missed an
+invalidation, e.g. one handled by another flow replica.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from sqlalchemy import Row
+
+from .crud import get_bot_runtime
+
+BOT_CACHE_TTL = float(os.getenv("BOT_CACHE_TTL") or 300)
+BOT_CACHE_SIZE = int(os.getenv("BOT_CACHE_SIZE") or 256)
+
+
+class BotRuntimeCache:
+    __entries__: "OrderedDict[str, Tuple[float, Row]]" = OrderedDict()
+    __generations__: Dict[str, int] = {}
+    ttl = BOT_CACHE_TTL
+    max_size = BOT_CACHE_SIZE
+
+    @classmethod
+    async def get(cls, bot_id: str) -> Row | None:
+        entry = cls.__entries__.get(bot_id)
+        if entry is not None and entry[0] > time.monotonic():
+            cls.__entries__.move_to_end(bot_id)
+            return entry[1]
+
+        generation = cls.__generations__.get(bot_id, 0)
+        bot = await get_bot_runtime(bot_id)
+        # the bot may have been invalidated while it was being fetched
+        if bot is None or generation != cls.__generations__.get(bot_id, 0):
+            cls.__entries__.pop(bot_id, None)
+            return bot
+        cls.__entries__[bot_id] = (time.monotonic() + cls.ttl, bot)
+        cls.__entries__.move_to_end(bot_id)
+        while len(cls.__entries__) > cls.max_size:
+            cls.__entries__.popitem(last=False)
+        return bot
+
+    @classmethod
+    def invalidate(cls, bot_id: str):
+        cls.__generations__[bot_id] = cls.__generations__.get(bot_id, 0) + 1
+        cls.__entries__.pop(bot_id, None)
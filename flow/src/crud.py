@@ -1,7 +1,6 @@
 import uuid
-from datetime import datetime
-from typing import Dict
-from sqlalchemy import join, select, update, and_
+from typing import Dict, Optional
+from sqlalchemy import Row, func, select, update
 from lib.db_session_handler import DBSessionHandler
 from lib.models import (
     JBFSMState,
@@ -14,74 +13,6 @@ from lib.models import (
 )
 
 
-async def get_state_by_session_id(session_id: str) -> JBFSMState:
-    query = select(JBFSMState).where(JBFSMState.session_id == session_id)
-    async with DBSessionHandler.get_async_session() as session:
-        async with session.begin():
-            result = await session.execute(query)
-            state = result.scalars().first()
-            return state
-
-
-async def create_session(turn_id: str) -> JBSession:
-    session_id = str(uuid.uuid4())
-    async with DBSessionHandler.get_async_session() as session:
-        async with session.begin():
-            result = await session.execute(select(JBTurn).where(JBTurn.id == turn_id))
-            jb_turn = result.scalars().first()
-        async with session.begin():
-            jb_session = JBSession(
-                id=session_id, user_id=jb_turn.user_id, channel_id=jb_turn.channel_id
-            )
-            session.add(jb_session)
-            await session.commit()
-        async with session.begin():
-            await session.execute(
-                update(JBTurn).where(JBTurn.id == turn_id).values(session_id=session_id)
-            )
-            await session.commit()
-            return jb_session
-
-
-async def update_session(session_id: str):
-    async with DBSessionHandler.get_async_session() as session:
-        async with session.begin():
-            stmt = (
-                update(JBSession)
-                .where(JBSession.id == session_id)
-                .values(updated_at=datetime.now())
-            )
-            await session.execute(stmt)
-            await session.commit()
-            return None
-
-
-async def update_turn(session_id: str, turn_id: str):
-    async with DBSessionHandler.get_async_session() as session:
-        async with session.begin():
-            stmt = (
-                update(JBTurn).where(JBTurn.id == turn_id).values(session_id=session_id)
-            )
-            await session.execute(stmt)
-            await session.commit()
-            return None
-
-
-async def insert_state(
-    session_id: str, state: str, variables: dict = dict()
-) -> JBFSMState:
-    state_id = str(uuid.uuid4())
-    state = JBFSMState(
-        id=state_id, session_id=session_id, state=state, variables=variables
-    )
-    async with DBSessionHandler.get_async_session() as session:
-        async with session.begin():
-            session.add(state)
-            await session.commit()
-            return state
-    return None
-
-
 async def update_state_and_variables(
     session_id: str, state: str, variables: dict
 ) -> JBFSMState:
@@ -99,39 +30,129 @@ async def update_state_and_variables(
     return None
 
 
-async def get_bot_by_session_id(session_id: str) -> JBBot | None:
+async def get_turn_owner(turn_id: str) -> Row | None:
+    """The user and bot of the turn."""
     async with DBSessionHandler.get_async_session() as session:
         async with session.begin():
             result = await session.execute(
-                select(JBBot)
-                .select_from(
-                    join(JBSession, JBTurn, JBSession.id == JBTurn.session_id).join(
-                        JBBot, JBTurn.bot_id == JBBot.id
-                    )
+                select(JBTurn.user_id, JBTurn.bot_id).where(JBTurn.id == turn_id)
+            )
+            return result.first()
+
+
+class TurnContext:
+    """The turn with its latest session and FSM state."""
+
+    def __init__(
+        self,
+        turn: JBTurn,
+        session: Optional[JBSession],
+        state: Optional[JBFSMState],
+    ):
+        self.turn = turn
+        self.session = session
+        self.state = state
+
+
+async def load_turn_context(turn_id: str) -> TurnContext | None:
+    """Loads the turn context in a single joined query."""
+    latest_session_id = (
+        select(JBSession.id)
+        .where(
+            JBSession.user_id == JBTurn.user_id,
+            JBSession.channel_id == JBTurn.channel_id,
+        )
+        .order_by(JBSession.updated_at.desc())
+        .limit(1)
+        .correlate(JBTurn)
+        .scalar_subquery()
+    )
+    query = (
+        select(JBTurn, JBSession, JBFSMState)
+        .outerjoin(JBSession, JBSession.id == latest_session_id)
+        .outerjoin(JBFSMState, JBFSMState.session_id == JBSession.id)
+        .where(JBTurn.id == turn_id)
+    )
+    async with DBSessionHandler.get_async_session() as session:
+        async with session.begin():
+            result = await session.execute(query)
+            row = result.first()
+            if row is None:
+                return None
+            return TurnContext(*row)
+
+
+async def save_turn_context(
+    context: TurnContext,
+    new_session: bool,
+    message: Optional[Dict] = None,
+    message_type: Optional[str] = None,
+    selected_language: Optional[str] = None,
+) -> TurnContext:
+    """Writes the session bookkeeping of a turn in a single transaction.
+
+    Starts a new session or touches the current one, links the turn to it,
+    creates the initial FSM state of a new session and stores the user's
+    message and language preference, if given.
+    """
+    turn = context.turn
+    async with DBSessionHandler.get_async_session() as session:
+        async with session.begin():
+            if new_session:
+                context.session = JBSession(
+                    id=str(uuid.uuid4()),
+                    user_id=turn.user_id,
+                    channel_id=turn.channel_id,
+                )
+                context.state = None
+                session.add(context.session)
+                # the turn below references the new session
+                await session.flush()
+            else:
+                await session.execute(
+                    update(JBSession)
+                    .where(JBSession.id == context.session.id)
+                    .values(updated_at=func.now())
                 )
-                .where(JBSession.id == session_id)
+            session_id = context.session.id
+            await session.execute(
+                update(JBTurn).where(JBTurn.id == turn.id).values(session_id=session_id)
             )
-            s = result.scalars().first()
-            return s
+            if context.state is None:
+                context.state = JBFSMState(
+                    id=str(uuid.uuid4()), session_id=session_id, state="zero", variables={}
+                )
+                session.add(context.state)
+            if message is not None:
+                session.add(
+                    JBMessage(
+                        id=str(uuid.uuid4()),
+                        turn_id=turn.id,
+                        message_type=message_type,
+                        is_user_sent=True,
+                        message=message,
+                    )
+                )
+            if selected_language is not None:
+                await session.execute(
+                    update(JBUser)
+                    .where(JBUser.id == turn.user_id)
+                    .values(language_preference=selected_language)
+                )
+            await session.commit()
+            return context
 
 
-async def get_session_by_turn_id(turn_id: str) -> JBSession | None:
+async def get_bot_runtime(bot_id: str) -> Row | None:
+    """Fetches only what a turn needs from the bot, leaving out e.g. its code."""
     async with DBSessionHandler.get_async_session() as session:
         async with session.begin():
             result = await session.execute(
-                select(JBSession)
-                .join(
-                    JBTurn,
-                    and_(
-                        JBSession.user_id == JBTurn.user_id,
-                        JBSession.channel_id == JBTurn.channel_id,
-                    ),
-                )
-                .where(JBTurn.id == turn_id)
-                .order_by(JBSession.updated_at.desc())
+                select(
+                    JBBot.id, JBBot.name, JBBot.config_env, JBBot.credentials
+                ).where(JBBot.id == bot_id)
             )
-            s = result.scalars().first()
-            return s
+            return result.first()
 
 
 async def get_all_bots():
@@ -172,44 +193,3 @@ async def create_bot(
             session.add(bot)
             await session.commit()
             return bot
-
-
-async def create_message(
-    turn_id: str,
-    message_type: str,
-    message: Dict,
-    is_user_sent: bool = False,
-):
-    message_id = str(uuid.uuid4())
-    async with DBSessionHandler.get_async_session() as session:
-        async with session.begin():
-            session.add(
-                JBMessage(
-                    id=message_id,
-                    turn_id=turn_id,
-                    message_type=message_type,
-                    is_user_sent=is_user_sent,
-                    message=message,
-                )
-            )
-            await session.commit()
-            return message_id
-
-
-async def update_user_language(turn_id: str, selected_language: str):
-    async with DBSessionHandler.get_async_session() as session:
-        async with session.begin():
-            stmt = (
-                update(JBUser)
-                .where(
-                    JBUser.id.in_(
-                        select(JBTurn.user_id)
-                        .where(JBTurn.id == turn_id)
-                        .scalar_subquery()
-                    )
-                )
-                .values(language_preference=selected_language)
-            )
-            await session.execute(stmt)
-            await session.commit()
-            return None
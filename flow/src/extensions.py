@@ -1,7 +1,8 @@
 import os
 import logging
-from lib.kafka_utils import KafkaProducer, KafkaConsumer
-from lib.data_models import Channel, Language, RAG, Flow
+from typing import Optional
+from lib.kafka import AsyncKafkaConsumer, AsyncKafkaProducer
+from lib.data_models import Channel, Language, RAG, Flow, encode_message
 
 logging.basicConfig()
 logger = logging.getLogger("flow")
@@ -25,18 +26,22 @@ if not channel_topic:
 
 logger.info("Connecting to topic %s", flow_topic)
 
-consumer = KafkaConsumer.from_env_vars(
-    group_id="cooler_group_id", auto_offset_reset="latest"
+consumer = AsyncKafkaConsumer.from_env_vars(
+    group_id="flow", auto_offset_reset="latest", topics=[flow_topic]
 )
 logger.info("Connecting to topic %s", language_topic)
 logger.info("Connecting to topic %s", retriever_topic)
 logger.info("Connecting to topic %s", channel_topic)
-producer = KafkaProducer.from_env_vars()
+producer = AsyncKafkaProducer.from_env_vars()
 
 logger.info("Connected to Kafka Topics")
 
 
-def produce_message(message: Channel | Language | RAG | Flow):
+def produce_message(
+    message: Channel | Language | RAG | Flow, key: Optional[str] = None
+):
+    """Sends the message, keyed like the message being handled unless a key
+    is given."""
     if isinstance(message, Channel):
         topic = channel_topic
     elif isinstance(message, Language):
@@ -49,4 +54,5 @@ def produce_message(message: Channel | Language | RAG | Flow):
         raise ValueError("Invalid message type")
 
     logger.info("Sending msg to %s topic: %s", topic, message)
-    producer.send_message(topic=topic, value=message.model_dump_json(exclude_none=True))
+    value, headers = encode_message(message)
+    producer.send_message(topic=topic, value=value, key=key, headers=headers)
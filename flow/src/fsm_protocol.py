@@ -0,0 +1,47 @@
+import asyncio
+import json
+import os
+import struct
+from typing import Dict, Optional
+
+# Must match template/fsm_protocol.py, which is the bot side of the pipe. The
+# fsm processes inherit FSM_RUNNER_ENCODING from flow, so both sides agree on
+# the payload encoding.
+FRAME_HEADER = struct.Struct(">I")
+FSM_RUNNER_ENCODING = os.getenv("FSM_RUNNER_ENCODING") or "json"
+
+if FSM_RUNNER_ENCODING == "msgpack":
+    import msgpack
+
+    def encode(payload: Dict) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def decode(data: bytes) -> Dict:
+        return msgpack.unpackb(data, raw=False)
+
+elif FSM_RUNNER_ENCODING == "json":
+
+    def encode(payload: Dict) -> bytes:
+        return json.dumps(payload).encode("utf-8")
+
+    def decode(data: bytes) -> Dict:
+        return json.loads(data)
+
+else:
+    raise ValueError(f"Unsupported FSM_RUNNER_ENCODING: {FSM_RUNNER_ENCODING}")
+
+
+def encode_frame(payload: Dict) -> bytes:
+    data = encode(payload)
+    return FRAME_HEADER.pack(len(data)) + data
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict]:
+    """Reads one frame from the reader, returns None once the stream is closed."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        (length,) = FRAME_HEADER.unpack(header)
+        payload = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return decode(payload)
@@ -0,0 +1,304 @@
+"""Pool of warm, long-lived FSM worker processes per bot.
+
+Each worker runs `template/fsm_worker.py` inside the bot's venv, imports the
+bot once and then serves turns over length-prefixed frames on stdin/stdout,
+so a turn only pays for `run_machine` instead of interpreter startup and
+imports. Workers are health checked when they have been idle for a while,
+recycled after `max_requests` turns and replaced when they crash.
+
+With FSM_WORKER_POOL_SIZE unset or 0, the pool is disabled and every turn
+runs in a fresh `fsm_wrapper.py` subprocess. With a positive size, turns go
+to that many warm workers per bot.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import AsyncGenerator, Dict, Optional, Set
+
+from .fsm_protocol import encode_frame, read_frame
+
+logger = logging.getLogger("flow")
+
+FSM_WORKER_POOL_SIZE = int(os.getenv("FSM_WORKER_POOL_SIZE") or 0)
+FSM_WORKER_MAX_REQUESTS = int(os.getenv("FSM_WORKER_MAX_REQUESTS") or 500)
+FSM_WORKER_TIMEOUT = float(os.getenv("FSM_WORKER_TIMEOUT") or 300)
+FSM_WORKER_HEALTHCHECK_INTERVAL = float(
+    os.getenv("FSM_WORKER_HEALTHCHECK_INTERVAL") or 60
+)
+
+bots_root_directory = Path(__file__).parent.parent / "bots"
+
+
+class FSMWorkerError(Exception):
+    pass
+
+
+class FSMWorker:
+    def __init__(self, bot_dir: Path):
+        self.bot_dir = bot_dir
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.requests_served = 0
+        self.last_used = 0.0
+        self.healthy = True
+        self._stderr_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            str(self.bot_dir / ".venv" / "bin" / "python"),
+            str(self.bot_dir / "fsm_worker.py"),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._stderr_task = asyncio.create_task(self._log_stderr())
+        self.last_used = time.monotonic()
+        logger.info(
+            "Started fsm worker %s for bot %s", self.process.pid, self.bot_dir.name
+        )
+
+    @property
+    def is_alive(self) -> bool:
+        return (
+            self.healthy
+            and self.process is not None
+            and self.process.returncode is None
+        )
+
+    async def _log_stderr(self):
+        async for line in self.process.stderr:
+            logger.info(
+                "Output from fsm worker %s: %s",
+                self.process.pid,
+                line.decode("utf-8", errors="replace").rstrip(),
+            )
+
+    async def _send(self, payload: Dict):
+        try:
+            self.process.stdin.write(encode_frame(payload))
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise FSMWorkerError(f"FSM worker {self.process.pid} is not running") from e
+
+    async def _receive(self, timeout: float) -> Dict:
+        try:
+            frame = await asyncio.wait_for(read_frame(self.process.stdout), timeout)
+        except asyncio.TimeoutError as e:
+            raise FSMWorkerError(
+                f"FSM worker {self.process.pid} timed out after {timeout}s"
+            ) from e
+        if frame is None:
+            raise FSMWorkerError(f"FSM worker {self.process.pid} exited unexpectedly")
+        return frame
+
+    async def ping(self, timeout: float) -> bool:
+        try:
+            await self._send({"type": "ping"})
+            frame = await self._receive(timeout)
+        except FSMWorkerError as e:
+            logger.warning("Health check failed: %s", e)
+            self.healthy = False
+            return False
+        self.last_used = time.monotonic()
+        return frame.get("pong") is True
+
+    async def run(self, runner_input: Dict, timeout: float) -> AsyncGenerator[Dict, None]:
+        """Runs one turn, yielding runner outputs as soon as the worker emits them."""
+        self.requests_served += 1
+        completed = False
+        error = None
+        try:
+            await self._send({"type": "run", "payload": runner_input})
+            while True:
+                frame = await self._receive(timeout)
+                if "done" in frame:
+                    completed = True
+                    break
+                if "error" in frame:
+                    error = frame["error"]
+                    continue
+                yield frame
+        finally:
+            self.last_used = time.monotonic()
+            # a worker left in the middle of a turn can not be reused
+            if not completed:
+                self.healthy = False
+        if error:
+            raise FSMWorkerError(error)
+
+    async def stop(self):
+        if self.process is None:
+            return
+        if self.process.returncode is None:
+            # the worker exits on its own once stdin is closed
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        if self._stderr_task:
+            self._stderr_task.cancel()
+        logger.info(
+            "Stopped fsm worker %s for bot %s", self.process.pid, self.bot_dir.name
+        )
+
+
+class FSMWorkerPool:
+    def __init__(
+        self,
+        bot_dir: Path,
+        size: int,
+        max_requests: int = FSM_WORKER_MAX_REQUESTS,
+        timeout: float = FSM_WORKER_TIMEOUT,
+        healthcheck_interval: float = FSM_WORKER_HEALTHCHECK_INTERVAL,
+    ):
+        self.bot_dir = bot_dir
+        self.size = size
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        # idle workers, and None for the slots whose worker failed to start
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._workers: Set[FSMWorker] = set()
+        self._background_tasks: Set[asyncio.Task] = set()
+        self._closed = False
+
+    async def start(self):
+        results = await asyncio.gather(
+            *(self._spawn() for _ in range(self.size)), return_exceptions=True
+        )
+        workers = [r for r in results if isinstance(r, FSMWorker)]
+        errors = [r for r in results if not isinstance(r, FSMWorker)]
+        if errors:
+            await asyncio.gather(
+                *(self._retire(worker) for worker in workers), return_exceptions=True
+            )
+            raise errors[0]
+        for worker in workers:
+            self._idle.put_nowait(worker)
+
+    async def _spawn(self) -> FSMWorker:
+        worker = FSMWorker(self.bot_dir)
+        await worker.start()
+        self._workers.add(worker)
+        return worker
+
+    async def _retire(self, worker: FSMWorker):
+        self._workers.discard(worker)
+        await worker.stop()
+
+    async def _replace(self, worker: FSMWorker):
+        await self._retire(worker)
+        if self._closed:
+            return
+        try:
+            worker = await self._spawn()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Unable to replace fsm worker for %s: %s", self.bot_dir.name, e)
+            # the slot is kept empty and spawned again by the next acquire
+            self._idle.put_nowait(None)
+            return
+        if self._closed:
+            await self._retire(worker)
+        else:
+            self._idle.put_nowait(worker)
+
+    async def _respawn(self) -> FSMWorker:
+        """Spawns the worker of an empty slot. The slot stays empty if that
+        fails, so the pool keeps `size` slots."""
+        try:
+            return await self._spawn()
+        except Exception as e:
+            self._idle.put_nowait(None)
+            raise FSMWorkerError(
+                f"Unable to start fsm worker for bot {self.bot_dir.name}: {e}"
+            ) from e
+
+    async def _acquire(self) -> FSMWorker:
+        try:
+            worker: Optional[FSMWorker] = await asyncio.wait_for(
+                self._idle.get(), self.timeout
+            )
+        except asyncio.TimeoutError as e:
+            raise FSMWorkerError(
+                f"No fsm worker available for bot {self.bot_dir.name}"
+            ) from e
+        if worker is None:
+            return await self._respawn()
+        idle_for = time.monotonic() - worker.last_used
+        if worker.is_alive and (
+            idle_for < self.healthcheck_interval or await worker.ping(self.timeout)
+        ):
+            return worker
+        logger.warning("Restarting unhealthy fsm worker for bot %s", self.bot_dir.name)
+        await self._retire(worker)
+        return await self._respawn()
+
+    async def _release(self, worker: FSMWorker):
+        if self._closed:
+            await self._retire(worker)
+        elif not worker.is_alive or worker.requests_served >= self.max_requests:
+            task = asyncio.create_task(self._replace(worker))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        else:
+            self._idle.put_nowait(worker)
+
+    async def run(self, runner_input: Dict) -> AsyncGenerator[Dict, None]:
+        worker = await self._acquire()
+        try:
+            async for output in worker.run(runner_input, self.timeout):
+                yield output
+        finally:
+            await self._release(worker)
+
+    async def close(self):
+        """Stops idle workers, busy workers are stopped once their turn completes."""
+        self._closed = True
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        idle_workers = []
+        while not self._idle.empty():
+            worker = self._idle.get_nowait()
+            if worker is not None:
+                idle_workers.append(worker)
+        await asyncio.gather(
+            *(self._retire(worker) for worker in idle_workers), return_exceptions=True
+        )
+
+
+class FSMWorkerPoolManager:
+    __pools__: Dict[str, FSMWorkerPool] = {}
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return FSM_WORKER_POOL_SIZE > 0
+
+    @classmethod
+    async def get_pool(cls, bot_id: str) -> FSMWorkerPool:
+        pool = cls.__pools__.get(bot_id)
+        if pool is None:
+            logger.info("Starting %s fsm workers for bot %s", FSM_WORKER_POOL_SIZE, bot_id)
+            pool = FSMWorkerPool(bots_root_directory / bot_id, FSM_WORKER_POOL_SIZE)
+            cls.__pools__[bot_id] = pool
+            try:
+                await pool.start()
+            except Exception:
+                cls.__pools__.pop(bot_id, None)
+                raise
+        return pool
+
+    @classmethod
+    async def close_pool(cls, bot_id: str):
+        pool = cls.__pools__.pop(bot_id, None)
+        if pool is not None:
+            await pool.close()
+
+    @classmethod
+    async def restart_pool(cls, bot_id: str):
+        """Replaces the workers of a bot, e.g. after its code has been reinstalled."""
+        await cls.close_pool(bot_id)
+        if cls.is_enabled():
+            await cls.get_pool(bot_id)
@@ -1,8 +1,9 @@
+import asyncio
 import logging
 import json
-import subprocess
 from datetime import datetime
 from pathlib import Path
+from typing import AsyncGenerator, Dict, Optional
 from lib.data_models import (
     FSMOutput,
     Language,
@@ -24,19 +25,16 @@ from lib.data_models import (
     CallbackType,
 )
 from ..crud import (
-    get_bot_by_session_id,
-    get_session_by_turn_id,
-    get_state_by_session_id,
-    insert_state,
+    TurnContext,
+    load_turn_context,
+    save_turn_context,
     update_state_and_variables,
-    create_message,
-    create_session,
-    update_session,
-    update_turn,
-    update_user_language,
     insert_jb_webhook_reference,
 )
+from ..bot_cache import BotRuntimeCache
 from ..extensions import produce_message
+from ..fsm_protocol import encode_frame, read_frame
+from ..fsm_worker_pool import FSMWorkerPoolManager, FSMWorkerError
 
 logger = logging.getLogger("flow")
 
@@ -111,35 +109,46 @@ def handle_bot_output(fsm_output: FSMOutput, turn_id: str):
     return flow_output
 
 
-async def manage_session(turn_id: str, new_session: bool = False):
+async def manage_session(
+    turn_id: str,
+    new_session: bool = False,
+    message: Optional[Dict] = None,
+    message_type: Optional[str] = None,
+    selected_language: Optional[str] = None,
+) -> TurnContext | None:
+    context = await load_turn_context(turn_id)
+    if context is None:
+        logger.error("Turn not found for turn_id: %s", turn_id)
+        return None
     if new_session:
         logger.info("Creating new session for turn_id: %s", turn_id)
-        session = await create_session(turn_id)
     else:
         logger.info("Managing session for turn_id: %s", turn_id)
-        session = await get_session_by_turn_id(turn_id)
+        session = context.session
         timeout = 60 * 60 * 24 * 1000  # 24 hours
         if not session:
             logger.info("Session not found for turn_id: %s", turn_id)
-            session = await create_session(turn_id)
+            new_session = True
         elif session.updated_at.timestamp() + timeout < datetime.now().timestamp():
             logger.info("Session expired for turn_id: %s", turn_id)
-            session = await create_session(turn_id)
+            new_session = True
         else:
             logger.info("Updating session for turn_id: %s", turn_id)
-            await update_session(session.id)
-            await update_turn(session_id=session.id, turn_id=turn_id)
-    return session
+    return await save_turn_context(
+        context,
+        new_session=new_session,
+        message=message,
+        message_type=message_type,
+        selected_language=selected_language,
+    )
 
 
-async def handle_bot_input(fsm_input: FSMInput, session_id: str):
-    state = await get_state_by_session_id(session_id)
-    if state is None:
-        state = await insert_state(session_id, "zero")
+async def handle_bot_input(fsm_input: FSMInput, context: TurnContext):
+    session_id: str = context.session.id
+    state = context.state
     logger.info("State: %s", state)
 
-    # get name from bot id
-    bot_details = await get_bot_by_session_id(session_id)
+    bot_details = await BotRuntimeCache.get(context.turn.bot_id)
     if not bot_details:
         logger.error("Bot not found for session_id: %s", session_id)
         return
@@ -160,37 +169,75 @@ async def handle_bot_input(fsm_input: FSMInput, session_id: str):
         "credentials": credentials,
         "config_env": config_env,
     }
-    completed_process = subprocess.run(
-        [
-            str(path / ".venv" / "bin" / "python"),
-            str(path / "fsm_wrapper.py"),
-            json.dumps(fsm_runner_input),
-        ],
-        capture_output=True,
-        text=True,
-    )
 
-    if completed_process.stderr:
-        logger.error("Error while running fsm: %s", completed_process.stderr)
-        return
+    if FSMWorkerPoolManager.is_enabled():
+        fsm_runner_outputs = run_fsm_in_worker_pool(bot_id, fsm_runner_input)
+    else:
+        fsm_runner_outputs = run_fsm_in_subprocess(path, fsm_runner_input)
+
+    try:
+        async for fsm_runner_output in fsm_runner_outputs:
+            logger.info("Output from fsm: %s", fsm_runner_output)
+            if "fsm_output" in fsm_runner_output:
+                fsm_output = fsm_runner_output["fsm_output"]
+                logger.info("Callback message: %s", fsm_output)
+                fsm_output = FSMOutput.model_validate(fsm_output)
+                # execute callback
+                yield fsm_output
+            else:
+                # save new state to db
+                new_state_variables = fsm_runner_output["new_state"]
+                logger.info("FSM Runner message: %s", fsm_runner_output)
+                await update_state_and_variables(
+                    session_id, "zerotwo", new_state_variables
+                )
+    except FSMWorkerError as e:
+        logger.error("Error while running fsm: %s", e)
 
-    # logger.error("Output from fsm: %s", completed_process.stdout)
-    for line in completed_process.stdout.split("\n"):
-        if not line:
-            continue
-        logger.error("Output from fsm: %s", line)
-        fsm_runner_output = json.loads(line)
-        if "fsm_output" in fsm_runner_output:
-            fsm_output = fsm_runner_output["fsm_output"]
-            logger.info("Callback message: %s", fsm_output)
-            fsm_output = FSMOutput.model_validate(fsm_output)
-            # execute callback
-            yield fsm_output
-        else:
-            # save new state to db
-            new_state_variables = fsm_runner_output["new_state"]
-            logger.info("FSM Runner message: %s", fsm_runner_output)
-            await update_state_and_variables(session_id, "zerotwo", new_state_variables)
+
+async def run_fsm_in_worker_pool(
+    bot_id: str, fsm_runner_input: Dict
+) -> AsyncGenerator[Dict, None]:
+    pool = await FSMWorkerPoolManager.get_pool(bot_id)
+    async for fsm_runner_output in pool.run(fsm_runner_input):
+        yield fsm_runner_output
+
+
+async def run_fsm_in_subprocess(
+    path: Path, fsm_runner_input: Dict
+) -> AsyncGenerator[Dict, None]:
+    # the input goes over stdin rather than argv, which is capped by the OS
+    # and visible to every process on the host
+    process = await asyncio.create_subprocess_exec(
+        str(path / ".venv" / "bin" / "python"),
+        str(path / "fsm_wrapper.py"),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    # drain stderr concurrently so a chatty bot can not block on a full pipe
+    stderr_task = asyncio.create_task(process.stderr.read())
+    try:
+        try:
+            process.stdin.write(encode_frame(fsm_runner_input))
+            await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # the fsm exited before reading its input, reported below
+            pass
+        # outputs are forwarded as soon as the bot writes them
+        while (fsm_runner_output := await read_frame(process.stdout)) is not None:
+            yield fsm_runner_output
+    finally:
+        if process.returncode is None and not process.stdout.at_eof():
+            process.kill()
+        stderr = await stderr_task
+        returncode = await process.wait()
+
+    if returncode != 0:
+        logger.error("Error while running fsm: %s", stderr.decode())
+    elif stderr:
+        logger.warning("Output from fsm on stderr: %s", stderr.decode())
 
 
 async def handle_user_input(user_input: UserInput):
@@ -223,19 +270,18 @@ async def handle_user_input(user_input: UserInput):
         return NotImplemented
 
     turn_id = user_input.turn_id
-    await create_message(
+    context = await manage_session(
         turn_id=turn_id,
         message_type=message_type.value,
-        is_user_sent=True,
         message=json.loads(
             getattr(message, message.message_type.value).model_dump_json(
                 exclude_none=True
             )
         ),
     )
-    session = await manage_session(turn_id=turn_id)
-    session_id: str = session.id
-    async for fsm_output in handle_bot_input(fsm_input, session_id=session_id):
+    if context is None:
+        return
+    async for fsm_output in handle_bot_input(fsm_input, context=context):
         if fsm_output.intent == FSMIntent.WEBHOOK:
             reference_id = fsm_output.webhook.reference_id
             insert_jb_webhook_reference(reference_id=reference_id, turn_id=turn_id)
@@ -260,9 +306,10 @@ async def handle_callback_input(callback: Callback):
         fsm_input = FSMInput(callback_input=callback_input)
 
     turn_id = callback.turn_id
-    session = await manage_session(turn_id=turn_id)
-    session_id: str = session.id
-    async for fsm_output in handle_bot_input(fsm_input, session_id=session_id):
+    context = await manage_session(turn_id=turn_id)
+    if context is None:
+        return
+    async for fsm_output in handle_bot_input(fsm_input, context=context):
         if fsm_output.intent == FSMIntent.WEBHOOK:
             reference_id = fsm_output.webhook.reference_id
             insert_jb_webhook_reference(reference_id=reference_id, turn_id=turn_id)
@@ -277,20 +324,23 @@ async def handle_dialog_input(dialog: Dialog):
         logger.error("Message not found in dialog input")
         return
     dialog_id = dialog.message.dialog.dialog_id
+    selected_language = None
     if dialog_id == DialogOption.CONVERSATION_RESET:
         fsm_input = FSMInput(user_input="reset")
         new_session = True
     elif dialog_id == DialogOption.LANGUAGE_SELECTED:
-        selected_language: str = dialog.message.dialog.dialog_input
-        await update_user_language(turn_id=turn_id, selected_language=selected_language)
+        selected_language = dialog.message.dialog.dialog_input
         fsm_input = FSMInput(user_input="language_selected")
         new_session = False
     else:
         return NotImplemented
 
-    session = await manage_session(turn_id=turn_id, new_session=new_session)
-    session_id: str = session.id
-    async for fsm_output in handle_bot_input(fsm_input, session_id=session_id):
+    context = await manage_session(
+        turn_id=turn_id, new_session=new_session, selected_language=selected_language
+    )
+    if context is None:
+        return
+    async for fsm_output in handle_bot_input(fsm_input, context=context):
         if fsm_output.intent == FSMIntent.WEBHOOK:
             reference_id = fsm_output.webhook.reference_id
             insert_jb_webhook_reference(reference_id=reference_id, turn_id=turn_id)
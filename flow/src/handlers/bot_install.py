@@ -1,26 +1,73 @@
-from typing import List
+from typing import Dict, List, Optional
+import asyncio
 import os
 import shutil
 import logging
-import subprocess
 from pathlib import Path
 from lib.data_models import BotConfig, BotIntent
+from ..bot_cache import BotRuntimeCache
 from ..crud import create_bot
+from ..fsm_worker_pool import FSMWorkerPoolManager
+from ..venv_cache import ensure_venv, requirements_for
 
 logger = logging.getLogger("flow")
 
 
+class BotInstallTracker:
+    """Tracks bots being installed, so their turns can wait for the install."""
+
+    __installs__: Dict[str, asyncio.Event] = {}
+
+    @classmethod
+    def start(cls, bot_id: str) -> asyncio.Event:
+        event = cls.__installs__.get(bot_id)
+        if event is None:
+            event = cls.__installs__[bot_id] = asyncio.Event()
+        return event
+
+    @classmethod
+    def finish(cls, bot_id: str):
+        event = cls.__installs__.pop(bot_id, None)
+        if event is not None:
+            event.set()
+
+    @classmethod
+    def get_install(cls, bot_id: str) -> Optional[asyncio.Event]:
+        """Event set once the bot's install in progress finishes, if any."""
+        return cls.__installs__.get(bot_id)
+
+    @classmethod
+    def installing(cls) -> bool:
+        """Whether any bot is being installed."""
+        return bool(cls.__installs__)
+
+
 async def install_bot(
     bot_id: str, bot_fsm_code: str, bot_requirements_txt: str, index_urls: List[str]
 ):
-    requirements_txt = (
-        "openai\ncryptography\njb-manager-bot==0.2.4\n" + bot_requirements_txt
-    )
+    BotInstallTracker.start(bot_id)
+    try:
+        await _install_bot(bot_id, bot_fsm_code, bot_requirements_txt, index_urls)
+    finally:
+        # turns waiting for the bot go ahead even if the install failed
+        BotInstallTracker.finish(bot_id)
+
+
+async def _install_bot(
+    bot_id: str, bot_fsm_code: str, bot_requirements_txt: str, index_urls: List[str]
+):
+    requirements_txt = requirements_for(bot_requirements_txt)
 
     bots_parent_directory = Path(__file__).parent.parent.parent
     bots_root_directory = Path(os.path.join(bots_parent_directory, "bots"))
     bot_dir = Path(os.path.join(bots_root_directory, bot_id))
 
+    # a cached venv is reused, so a code-only update does not reinstall anything
+    venv_dir = await ensure_venv(requirements_txt, index_urls)
+
+    # workers of a previous install still have the old bot code imported
+    await FSMWorkerPoolManager.close_pool(bot_id)
+
     # remove directory if it already exists
     if bot_dir.exists():
         shutil.rmtree(bot_dir)
@@ -42,18 +89,14 @@ async def install_bot(
     requirements_file = Path(os.path.join(bot_dir, "requirements.txt"))
     requirements_file.write_text(requirements_txt)
 
-    # create a venv inside the bot's directory
-    venv_dir = Path(os.path.join(bot_dir, ".venv"))
-    subprocess.run(["python3", "-m", "venv", venv_dir])
-    install_command = [str(venv_dir / "bin" / "pip"), "install"]
-    for index_url in index_urls:
-        install_command.extend(["--extra-index-url", index_url])
-    install_command.extend(["-r", requirements_file])
-    subprocess.run(install_command)
+    # link the bot to its venv
+    os.symlink(venv_dir, bot_dir / ".venv", target_is_directory=True)
     logger.info("Installed bot %s", bot_id)
+    await FSMWorkerPoolManager.restart_pool(bot_id)
 
 
 async def delete_bot(bot_id: str):
+    await FSMWorkerPoolManager.close_pool(bot_id)
     bots_parent_directory = Path(__file__).parent.parent.parent
     bots_root_directory = Path(os.path.join(bots_parent_directory, "bots"))
     bot_dir = Path(os.path.join(bots_root_directory, bot_id))
@@ -62,6 +105,7 @@ async def delete_bot(bot_id: str):
 
 
 async def handle_bot(bot_config: BotConfig):
+    BotRuntimeCache.invalidate(bot_config.bot_id)
     if bot_config.intent == BotIntent.DELETE:
         await delete_bot(bot_config.bot_id)
     elif bot_config.intent == BotIntent.INSTALL:
@@ -83,5 +127,9 @@ async def handle_bot(bot_config: BotConfig):
             required_credentials=bot_config.bot.required_credentials,
             version=bot_config.bot.version,
         )
+        # the cache may have been filled while the bot was installing
+        BotRuntimeCache.invalidate(bot_config.bot_id)
+    elif bot_config.intent == BotIntent.CONFIGURE:
+        logger.info("Reloading config of bot %s", bot_config.bot_id)
     else:
         logger.error("Invalid intent in bot config")
@@ -1,6 +1,9 @@
+import asyncio
 import logging
+from typing import Optional
 from lib.data_models import Flow, FlowIntent
-from .bot_install import handle_bot
+from ..crud import get_turn_owner
+from .bot_install import BotInstallTracker, handle_bot
 from .bot_input import handle_user_input, handle_callback_input, handle_dialog_input
 
 logger = logging.getLogger("flow")
@@ -30,3 +33,40 @@ async def handle_flow_input(flow_input: Flow):
         await handle_user_input(flow_input.user_input)
     else:
         logger.error("Invalid flow intent: %s", flow_intent)
+
+
+def route_flow_input(flow_input: Flow, message_key: Optional[str] = None) -> str:
+    """Key of the flow input, inputs sharing a key are handled in order.
+
+    Turns are keyed by their user, so the turns of one session never race on
+    the FSM state. Services key the messages of a turn by its user id, so the
+    key of the message is used as is. Bot config changes are keyed by the bot.
+    """
+    if flow_input.bot_config:
+        return f"bot:{flow_input.bot_config.bot_id}"
+    turn = flow_input.dialog or flow_input.callback or flow_input.user_input
+    if turn is None:
+        return "flow"
+    if message_key:
+        return f"user:{message_key}"
+    return f"turn:{turn.turn_id}"
+
+
+async def route_unkeyed_flow_input(flow_input: Flow) -> str:
+    """Key of a flow input sent without a message key, looked up from the
+    owner of its turn."""
+    turn = flow_input.dialog or flow_input.callback or flow_input.user_input
+    if flow_input.bot_config or turn is None:
+        return route_flow_input(flow_input)
+    owner = await get_turn_owner(turn.turn_id)
+    return route_flow_input(flow_input, owner.user_id if owner else None)
+
+
+async def get_bot_install(flow_input: Flow) -> Optional[asyncio.Event]:
+    """Install in progress of the bot of the turn, if any."""
+    turn = flow_input.dialog or flow_input.callback or flow_input.user_input
+    # no need to look up the bot while no bot is being installed
+    if turn is None or not BotInstallTracker.installing():
+        return None
+    owner = await get_turn_owner(turn.turn_id)
+    return BotInstallTracker.get_install(owner.bot_id) if owner else None
@@ -0,0 +1,103 @@
+"""Concurrent job scheduler that keeps jobs sharing a key in order.
+
+Jobs with different keys run concurrently, up to `max_concurrency` at a time.
+Jobs with the same key run one after the other, in the order they were
+submitted, so e.g. the turns of one user never race on the FSM state. At most
+`max_pending` jobs may be outstanding, after which `submit` waits, which
+pushes back on the consumer instead of buffering messages without bound.
+
+A job can be parked until an event is set, e.g. until its bot is installed.
+The event can also be looked up by the job's task, once the previous jobs of
+its key are done, so the lookup does not hold up submitting other jobs.
+Parked jobs do not count against `max_pending`, so they can not hold up the
+jobs of other keys.
+
+The jobs in flight are exported as the jb_jobs_in_flight metric, by whether
+they run, wait for a slot or are parked.
+"""
+
+import asyncio
+import logging
+import traceback
+from typing import Awaitable, Callable, Dict, Optional, Set, Union
+from lib.metrics import JOBS_IN_FLIGHT
+
+logger = logging.getLogger("flow")
+
+# an event, or a coroutine function looking up the event, if any
+Ready = Union[asyncio.Event, Callable[[], Awaitable[Optional[asyncio.Event]]]]
+
+
+class KeyedScheduler:
+    def __init__(self, max_concurrency: int, max_pending: Optional[int] = None):
+        self._running = asyncio.Semaphore(max_concurrency)
+        self._pending = asyncio.Semaphore(max_pending or max_concurrency * 4)
+        self._tails: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(
+        self,
+        key: str,
+        job: Callable[[], Awaitable[None]],
+        ready: Optional[Ready] = None,
+    ):
+        """Schedules `job` after every job previously submitted with `key`.
+
+        If `ready` is given, the job does not start before it is set.
+        """
+        parked = isinstance(ready, asyncio.Event) and not ready.is_set()
+        if not parked:
+            await self._pending.acquire()
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._run(key, previous, job, ready, not parked))
+        self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self,
+        key: str,
+        previous: Optional[asyncio.Task],
+        job: Callable[[], Awaitable[None]],
+        ready: Optional[Ready],
+        holds_pending: bool,
+    ):
+        state = "waiting" if holds_pending else "parked"
+        JOBS_IN_FLIGHT.labels(state=state).inc()
+        try:
+            if previous is not None:
+                # only wait for completion, a failed job must not block its key
+                await asyncio.wait([previous])
+            if ready is not None and not isinstance(ready, asyncio.Event):
+                ready = await ready()
+            if ready is not None and not ready.is_set():
+                if holds_pending:
+                    # parked from now on, like the jobs parked on submit
+                    self._pending.release()
+                    holds_pending = False
+                state = self._track(state, "parked")
+                await ready.wait()
+            state = self._track(state, "waiting")
+            async with self._running:
+                state = self._track(state, "running")
+                await job()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Error in job for %s: %s :: %s", key, e, traceback.format_exc())
+        finally:
+            JOBS_IN_FLIGHT.labels(state=state).dec()
+            if holds_pending:
+                self._pending.release()
+            if self._tails.get(key) is asyncio.current_task():
+                del self._tails[key]
+
+    @staticmethod
+    def _track(state: str, new_state: str) -> str:
+        if new_state != state:
+            JOBS_IN_FLIGHT.labels(state=state).dec()
+            JOBS_IN_FLIGHT.labels(state=new_state).inc()
+        return new_state
+
+    async def join(self):
+        """Waits for every submitted job to finish."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
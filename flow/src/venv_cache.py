@@ -0,0 +1,134 @@
+"""Content-addressed cache of bot virtualenvs.
+
+A venv is keyed by a hash of everything that determines its contents: the
+requirements (including the base packages every bot gets), the extra index
+urls and the python it is created with. Bots with identical requirements
+share one venv, and a restart or a code-only update of a bot reuses the venv
+that is already on disk instead of reinstalling it.
+
+Venvs are built in a temporary directory and renamed into place once pip has
+finished, so a directory named after a key is always a complete venv, even
+if flow was stopped in the middle of an install. Builds run as asyncio
+subprocesses, at most BOT_INSTALL_CONCURRENCY at a time, and concurrent
+installs needing the same venv wait for a single build.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+logger = logging.getLogger("flow")
+
+BASE_REQUIREMENTS = "openai\ncryptography\nmsgpack\njb-manager-bot==0.2.5\n"
+
+venv_cache_directory = Path(
+    os.getenv("BOT_VENV_CACHE_DIR") or Path(__file__).parent.parent / "venvs"
+)
+
+# builds left behind by a stopped flow are removed after this many seconds
+STALE_BUILD_AGE = 24 * 60 * 60
+
+BOT_INSTALL_CONCURRENCY = int(os.getenv("BOT_INSTALL_CONCURRENCY") or 4)
+
+_build_slots = asyncio.Semaphore(BOT_INSTALL_CONCURRENCY)
+_build_locks: Dict[str, asyncio.Lock] = {}
+# venvs handed out by this process, never pruned while it runs
+_used_keys: Set[str] = set()
+
+
+class VenvBuildError(Exception):
+    pass
+
+
+def requirements_for(bot_requirements_txt: str) -> str:
+    return BASE_REQUIREMENTS + bot_requirements_txt
+
+
+def venv_key(requirements_txt: str, index_urls: List[str]) -> str:
+    """Hash of everything that goes into a venv."""
+    venv_spec = {
+        "requirements": sorted(
+            line.strip()
+            for line in requirements_txt.splitlines()
+            if line.strip() and not line.strip().startswith("#")
+        ),
+        "index_urls": list(index_urls or []),
+        "python": [
+            platform.python_implementation(),
+            platform.python_version(),
+            platform.machine(),
+        ],
+    }
+    return hashlib.sha256(
+        json.dumps(venv_spec, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:32]
+
+
+async def run_command(*command: str):
+    process = await asyncio.create_subprocess_exec(*command)
+    returncode = await process.wait()
+    if returncode != 0:
+        raise VenvBuildError(f"{' '.join(command)} exited with {returncode}")
+
+
+async def ensure_venv(requirements_txt: str, index_urls: List[str]) -> Path:
+    """Returns the cached venv for the requirements, building it if needed."""
+    key = venv_key(requirements_txt, index_urls)
+    _used_keys.add(key)
+    venv_dir = venv_cache_directory / key
+    lock = _build_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        if venv_dir.exists():
+            logger.info("Reusing venv %s", key)
+            return venv_dir
+        async with _build_slots:
+            await build_venv(venv_dir, requirements_txt, index_urls)
+    logger.info("Built venv %s", key)
+    return venv_dir
+
+
+async def build_venv(venv_dir: Path, requirements_txt: str, index_urls: List[str]):
+    venv_cache_directory.mkdir(parents=True, exist_ok=True)
+    build_dir = venv_cache_directory / f".build-{venv_dir.name}-{uuid.uuid4().hex}"
+    try:
+        await run_command(sys.executable, "-m", "venv", str(build_dir))
+        requirements_file = build_dir / "requirements.txt"
+        requirements_file.write_text(requirements_txt)
+        install_command = [str(build_dir / "bin" / "python"), "-m", "pip", "install"]
+        for index_url in index_urls or []:
+            install_command.extend(["--extra-index-url", index_url])
+        install_command.extend(["-r", str(requirements_file)])
+        await run_command(*install_command)
+        try:
+            os.rename(build_dir, venv_dir)
+        except OSError:
+            # built concurrently by someone else, use theirs
+            if not venv_dir.exists():
+                raise
+    finally:
+        if build_dir.exists():
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def prune_venvs(keep: Iterable[str]):
+    """Removes cached venvs whose key is not in `keep`, and stale builds."""
+    if not venv_cache_directory.exists():
+        return
+    keep = set(keep) | _used_keys
+    for path in venv_cache_directory.iterdir():
+        if path.name.startswith(".build-"):
+            if time.time() - path.stat().st_mtime < STALE_BUILD_AGE:
+                continue
+        elif path.name in keep:
+            continue
+        logger.info("Removing unused venv %s", path.name)
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,63 @@
+import json
+import os
+import struct
+import sys
+from typing import BinaryIO, Dict, Optional, Tuple
+
+# Every frame is a 4 byte big-endian length followed by the encoded payload.
+# The payload encoding is chosen by flow through FSM_RUNNER_ENCODING.
+FRAME_HEADER = struct.Struct(">I")
+FSM_RUNNER_ENCODING = os.getenv("FSM_RUNNER_ENCODING") or "json"
+
+if FSM_RUNNER_ENCODING == "msgpack":
+    import msgpack
+
+    def encode(payload: Dict) -> bytes:
+        return msgpack.packb(payload, use_bin_type=True)
+
+    def decode(data: bytes) -> Dict:
+        return msgpack.unpackb(data, raw=False)
+
+elif FSM_RUNNER_ENCODING == "json":
+
+    def encode(payload: Dict) -> bytes:
+        return json.dumps(payload).encode("utf-8")
+
+    def decode(data: bytes) -> Dict:
+        return json.loads(data)
+
+else:
+    # flow rejects it as well, rather than both sides guessing differently
+    raise ValueError(f"Unsupported FSM_RUNNER_ENCODING: {FSM_RUNNER_ENCODING}")
+
+
+_protocol_streams: Optional[Tuple[BinaryIO, BinaryIO]] = None
+
+
+def open_protocol_streams() -> Tuple[BinaryIO, BinaryIO]:
+    """Reserves stdin/stdout for frames, anything the bot prints goes to stderr."""
+    global _protocol_streams  # pylint: disable=global-statement
+    if _protocol_streams is None:
+        _protocol_streams = (sys.stdin.buffer, sys.stdout.buffer)
+        sys.stdout = sys.stderr
+    return _protocol_streams
+
+
+def read_frame(stream: BinaryIO) -> Optional[Dict]:
+    """Reads one frame from the stream, returns None once the stream is closed."""
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return decode(payload)
+
+
+def write_frame(stream: BinaryIO, payload: Dict):
+    """Writes one frame to the stream and flushes it."""
+    data = encode(payload)
+    stream.write(FRAME_HEADER.pack(len(data)))
+    stream.write(data)
+    stream.flush()
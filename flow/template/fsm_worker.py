@@ -0,0 +1,33 @@
+"""Long-lived FSM worker.
+
+Imports the bot once and then serves turns over stdin/stdout using the
+length-prefixed frames defined in `fsm_protocol`. Each request frame is
+answered with any number of output frames followed by a `done` frame.
+"""
+
+import traceback
+
+from fsm_protocol import open_protocol_streams, read_frame, write_frame
+
+# stdout is reserved for the protocol, anything the bot prints goes to stderr
+protocol_in, protocol_out = open_protocol_streams()
+
+from fsm_wrapper import run_fsm  # pylint: disable=wrong-import-position
+
+
+def emit(output):
+    write_frame(protocol_out, output)
+
+
+while True:
+    request = read_frame(protocol_in)
+    if request is None:
+        break
+    if request.get("type") == "ping":
+        emit({"pong": True})
+        continue
+    try:
+        run_fsm(request["payload"], emit=emit)
+    except Exception:  # pylint: disable=broad-except
+        emit({"error": traceback.format_exc()})
+    emit({"done": True})
@@ -1,6 +1,13 @@
-import sys
 import os
 import json
+from typing import Callable, Dict
+from fsm_protocol import open_protocol_streams, read_frame, write_frame
+
+# claim stdin/stdout before the bot is imported, so its prints can not
+# corrupt the frames
+protocol_in, protocol_out = open_protocol_streams()
+
+# pylint: disable=wrong-import-position
 from cryptography.fernet import Fernet
 import bot
 from jb_manager_bot import AbstractFSM
@@ -17,29 +24,39 @@ def decrypt_credentials(credentials: dict) -> dict:
     return decrypted_credentials
 
 
-def callback_function(fsm_output: FSMOutput):
-    output = json.loads(fsm_output.model_dump_json())
-    print(json.dumps({"fsm_output": output}))
-
-
-runner_input = json.loads(sys.argv[1])
-fsm_state_dict = runner_input.get("state")
-bot_name = runner_input.get("bot_name")
-credentials = runner_input.get("credentials")
-config_env = runner_input.get("config_env")
-
-fsm_input = runner_input.get("fsm_input")
-fsm_input = FSMInput.model_validate(fsm_input)
-jb_bot: AbstractFSM = getattr(bot, bot_name)
-
-if fsm_input.user_input and fsm_input.user_input.lower() == "hi":
-    callback_function(FSMOutput(intent=FSMIntent.CONVERSATION_RESET))
-else:
-    new_state = jb_bot.run_machine(
-        send_message=callback_function,
-        user_input=fsm_input.user_input,
-        callback_input=fsm_input.callback_input,
-        state=fsm_state_dict,
-        credentials=decrypt_credentials(credentials),
+def run_fsm(runner_input: Dict, emit: Callable[[Dict], None]):
+    """Runs one turn of the bot, passing every runner output to `emit`."""
+
+    def callback_function(fsm_output: FSMOutput):
+        output = json.loads(fsm_output.model_dump_json())
+        emit({"fsm_output": output})
+
+    fsm_state_dict = runner_input.get("state")
+    bot_name = runner_input.get("bot_name")
+    credentials = runner_input.get("credentials")
+    config_env = runner_input.get("config_env")
+
+    fsm_input = runner_input.get("fsm_input")
+    fsm_input = FSMInput.model_validate(fsm_input)
+    jb_bot: AbstractFSM = getattr(bot, bot_name)
+
+    if fsm_input.user_input and fsm_input.user_input.lower() == "hi":
+        callback_function(FSMOutput(intent=FSMIntent.CONVERSATION_RESET))
+    else:
+        new_state = jb_bot.run_machine(
+            send_message=callback_function,
+            user_input=fsm_input.user_input,
+            callback_input=fsm_input.callback_input,
+            state=fsm_state_dict,
+            credentials=decrypt_credentials(credentials),
+        )
+        emit({"new_state": new_state})
+
+
+if __name__ == "__main__":
+    # every output is flushed as its own frame, so flow can forward it while
+    # the FSM is still running
+    run_fsm(
+        read_frame(protocol_in),
+        emit=lambda output: write_frame(protocol_out, output),
     )
-    print(json.dumps({"new_state": new_state}))
@@ -0,0 +1,84 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+import pytest
+from src.bot_cache import BotRuntimeCache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    BotRuntimeCache.__entries__.clear()
+    yield
+    BotRuntimeCache.__entries__.clear()
+
+
+@pytest.mark.asyncio
+@patch("src.bot_cache.get_bot_runtime")
+async def test_cache_hit_does_not_query(mock_get_bot_runtime):
+    bot = MagicMock(id="test_bot_id")
+    mock_get_bot_runtime.return_value = bot
+
+    assert await BotRuntimeCache.get("test_bot_id") is bot
+    assert await BotRuntimeCache.get("test_bot_id") is bot
+
+    mock_get_bot_runtime.assert_awaited_once_with("test_bot_id")
+
+
+@pytest.mark.asyncio
+@patch("src.bot_cache.get_bot_runtime")
+async def test_invalidate_refetches_bot(mock_get_bot_runtime):
+    mock_get_bot_runtime.side_effect = [MagicMock(name="old"), MagicMock(name="new")]
+
+    old = await BotRuntimeCache.get("test_bot_id")
+    BotRuntimeCache.invalidate("test_bot_id")
+    new = await BotRuntimeCache.get("test_bot_id")
+
+    assert old is not new
+    assert mock_get_bot_runtime.await_count == 2
+
+
+@pytest.mark.asyncio
+@patch("src.bot_cache.get_bot_runtime")
+async def test_expired_entry_is_refetched(mock_get_bot_runtime):
+    mock_get_bot_runtime.return_value = MagicMock()
+
+    with patch.object(BotRuntimeCache, "ttl", 0):
+        await BotRuntimeCache.get("test_bot_id")
+        await BotRuntimeCache.get("test_bot_id")
+
+    assert mock_get_bot_runtime.await_count == 2
+
+
+@pytest.mark.asyncio
+@patch("src.bot_cache.get_bot_runtime")
+async def test_least_recently_used_bot_is_evicted(mock_get_bot_runtime):
+    mock_get_bot_runtime.return_value = MagicMock()
+
+    with patch.object(BotRuntimeCache, "max_size", 2):
+        await BotRuntimeCache.get("bot_1")
+        await BotRuntimeCache.get("bot_2")
+        await BotRuntimeCache.get("bot_1")
+        await BotRuntimeCache.get("bot_3")
+
+    assert list(BotRuntimeCache.__entries__) == ["bot_1", "bot_3"]
+
+
+@pytest.mark.asyncio
+@patch("src.bot_cache.get_bot_runtime")
+async def test_bot_invalidated_while_fetching_is_not_cached(mock_get_bot_runtime):
+    fetched = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_get_bot_runtime(bot_id):
+        fetched.set()
+        await release.wait()
+        return MagicMock()
+
+    mock_get_bot_runtime.side_effect = slow_get_bot_runtime
+
+    task = asyncio.create_task(BotRuntimeCache.get("test_bot_id"))
+    await fetched.wait()
+    BotRuntimeCache.invalidate("test_bot_id")
+    release.set()
+    await task
+
+    assert "test_bot_id" not in BotRuntimeCache.__entries__
@@ -1,8 +1,12 @@
+from datetime import datetime, timedelta
 from itertools import product
 from unittest.mock import MagicMock, patch, AsyncMock
+import asyncio
 import json
 import pytest
 from lib.models import JBBot
+from src.crud import TurnContext
+from src.fsm_protocol import encode_frame
 from lib.data_models import (
     Flow,
     FlowIntent,
@@ -386,6 +390,31 @@ test_cases = {
 mock_produce_message = MagicMock()
 
 
+def mock_turn_context(variables: dict, updated_at: datetime | None = None):
+    return TurnContext(
+        turn=MagicMock(id="test_turn_id", bot_id="test_bot_id"),
+        session=MagicMock(
+            id="test_session_id", updated_at=updated_at or datetime.now()
+        ),
+        state=MagicMock(variables=variables),
+    )
+
+
+def mock_fsm_process(outputs: list, stderr: str = "", eof: bool = True):
+    process = MagicMock(returncode=0)
+    process.stdin.drain = AsyncMock()
+    process.stdout = asyncio.StreamReader()
+    for output in outputs:
+        process.stdout.feed_data(encode_frame(output))
+    if eof:
+        process.stdout.feed_eof()
+    process.stderr = asyncio.StreamReader()
+    process.stderr.feed_data(stderr.encode())
+    process.stderr.feed_eof()
+    process.wait = AsyncMock(return_value=0)
+    return process
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "flow_input, mock_fsm_output, flow_output",
@@ -395,34 +424,31 @@ mock_produce_message = MagicMock()
 @patch.dict(
     "sys.modules", {"src.extensions": MagicMock(produce_message=mock_produce_message)}
 )
-@patch("src.handlers.bot_input.get_state_by_session_id", return_value=AsyncMock())
+@patch("src.handlers.bot_input.BotRuntimeCache.get", return_value=mock_bot)
 @patch("src.handlers.bot_input.update_state_and_variables", return_value=AsyncMock())
-@patch("src.handlers.bot_input.get_bot_by_session_id", return_value=mock_bot)
-@patch("src.handlers.bot_input.subprocess.run", return_value=MagicMock())
-@patch("src.handlers.bot_input.update_user_language", return_value=AsyncMock())
-@patch("src.handlers.bot_input.manage_session", return_value=AsyncMock())
-@patch("src.handlers.bot_input.create_message", return_value=AsyncMock())
+@patch("src.handlers.bot_input.asyncio.create_subprocess_exec")
+@patch("src.handlers.bot_input.save_turn_context")
+@patch("src.handlers.bot_input.load_turn_context")
 async def test_handle_flow_input(
-    mock_create_message,
-    mock_manage_session,
-    mock_update_user_language,
-    mock_subprocess_run,
-    mock_get_bot_by_session_id,
+    mock_load_turn_context,
+    mock_save_turn_context,
+    mock_create_subprocess_exec,
     mock_update_state_and_variables,
-    mock_get_state_by_session_id,
+    mock_get_bot,
     flow_input,
     mock_fsm_output,
     flow_output,
 ):
     mock_produce_message.reset_mock()
 
-    mock_manage_session.return_value = MagicMock(id="test_session_id")
-
-    mock_state = MagicMock(variables={"test_key": "test_value"})
-    mock_get_state_by_session_id.return_value = mock_state
-    mock_subprocess_run.return_value = MagicMock(
-        stdout=f'{json.dumps({"fsm_output": json.loads(mock_fsm_output.model_dump_json())})}\n{json.dumps({"new_state": {"state": "test_state", "variables": {"test_key": "test_value"}}})}',
-        stderr=None,
+    context = mock_turn_context(variables={"test_key": "test_value"})
+    mock_load_turn_context.return_value = context
+    mock_save_turn_context.return_value = context
+    mock_create_subprocess_exec.return_value = mock_fsm_process(
+        [
+            {"fsm_output": json.loads(mock_fsm_output.model_dump_json())},
+            {"new_state": {"state": "test_state", "variables": {"test_key": "test_value"}}},
+        ]
     )
 
     from src.handlers.flow_input import handle_flow_input
@@ -435,3 +461,96 @@ async def test_handle_flow_input(
         "zerotwo",
         {"state": "test_state", "variables": {"test_key": "test_value"}},
     )
+
+
+@pytest.mark.asyncio
+@patch.dict(
+    "sys.modules", {"src.extensions": MagicMock(produce_message=mock_produce_message)}
+)
+@patch("src.handlers.bot_input.BotRuntimeCache.get", return_value=mock_bot)
+@patch("src.handlers.bot_input.update_state_and_variables", return_value=AsyncMock())
+@patch("src.handlers.bot_input.asyncio.create_subprocess_exec")
+@patch("src.handlers.bot_input.manage_session")
+async def test_fsm_output_is_forwarded_before_fsm_exits(
+    mock_manage_session,
+    mock_create_subprocess_exec,
+    mock_update_state_and_variables,
+    mock_get_bot,
+):
+    mock_produce_message.reset_mock()
+    mock_manage_session.return_value = mock_turn_context(variables={})
+    fsm_output, flow_output = fsm_and_assertions["out_text"]
+    process = mock_fsm_process(
+        [{"fsm_output": json.loads(fsm_output.model_dump_json())}], eof=False
+    )
+    mock_create_subprocess_exec.return_value = process
+
+    from src.handlers.flow_input import handle_flow_input
+
+    task = asyncio.create_task(handle_flow_input(flow_inputs["language"]))
+    for _ in range(100):
+        if mock_produce_message.called:
+            break
+        await asyncio.sleep(0)
+
+    mock_produce_message.assert_called_once_with(flow_output)
+    mock_update_state_and_variables.assert_not_called()
+
+    process.stdout.feed_data(encode_frame({"new_state": {}}))
+    process.stdout.feed_eof()
+    await task
+
+    mock_update_state_and_variables.assert_called_once_with(
+        "test_session_id", "zerotwo", {}
+    )
+
+
+@pytest.mark.asyncio
+@patch.dict(
+    "sys.modules", {"src.extensions": MagicMock(produce_message=mock_produce_message)}
+)
+@patch("src.handlers.bot_input.save_turn_context")
+@patch("src.handlers.bot_input.load_turn_context")
+async def test_manage_session_writes_bookkeeping_once(
+    mock_load_turn_context, mock_save_turn_context
+):
+    context = mock_turn_context(variables={})
+    mock_load_turn_context.return_value = context
+    mock_save_turn_context.return_value = context
+
+    from src.handlers.bot_input import manage_session
+
+    result = await manage_session(
+        "test_turn_id", message={"body": "hello"}, message_type="text"
+    )
+
+    assert result is context
+    mock_load_turn_context.assert_awaited_once_with("test_turn_id")
+    mock_save_turn_context.assert_awaited_once_with(
+        context,
+        new_session=False,
+        message={"body": "hello"},
+        message_type="text",
+        selected_language=None,
+    )
+
+
+@pytest.mark.asyncio
+@patch.dict(
+    "sys.modules", {"src.extensions": MagicMock(produce_message=mock_produce_message)}
+)
+@patch("src.handlers.bot_input.save_turn_context")
+@patch("src.handlers.bot_input.load_turn_context")
+async def test_manage_session_starts_new_session_when_expired(
+    mock_load_turn_context, mock_save_turn_context
+):
+    context = mock_turn_context(
+        variables={}, updated_at=datetime.now() - timedelta(days=365 * 100)
+    )
+    mock_load_turn_context.return_value = context
+
+    from src.handlers.bot_input import manage_session
+
+    await manage_session("test_turn_id")
+
+    assert mock_save_turn_context.call_args.kwargs["new_session"] is True
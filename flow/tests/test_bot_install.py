@@ -67,3 +67,22 @@ async def test_handle_bot_delete(mock_delete_bot):
     await handle_flow_input(flow_input)
 
     mock_delete_bot.assert_awaited_once_with("test_bot_id")
+
+
+@pytest.mark.asyncio
+@patch.dict("sys.modules", {"src.extensions": mock_extension})
+@patch("src.handlers.bot_install.BotRuntimeCache.invalidate")
+async def test_handle_bot_configure_invalidates_cache(mock_invalidate):
+    flow_input = Flow(
+        source="api",
+        intent=FlowIntent.BOT,
+        bot_config=BotConfig(
+            bot_id="test_bot_id",
+            intent=BotIntent.CONFIGURE,
+        ),
+    )
+    from src.handlers.flow_input import handle_flow_input
+
+    await handle_flow_input(flow_input)
+
+    mock_invalidate.assert_called_once_with("test_bot_id")
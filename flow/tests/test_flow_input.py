@@ -0,0 +1,71 @@
+import asyncio
+import importlib
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from lib.data_models import (
+    BotConfig,
+    BotIntent,
+    Flow,
+    FlowIntent,
+    Message,
+    MessageType,
+    TextMessage,
+    UserInput,
+)
+
+turn_input = Flow(
+    source="language",
+    intent=FlowIntent.USER_INPUT,
+    user_input=UserInput(
+        turn_id="test_turn_id",
+        message=Message(
+            message_type=MessageType.TEXT, text=TextMessage(body="test_body_text")
+        ),
+    ),
+)
+
+
+@pytest.fixture
+def flow_input():
+    """The flow_input handlers, with the turn owner lookup mocked."""
+    with patch.dict("sys.modules", {"src.extensions": MagicMock()}):
+        module = importlib.import_module("src.handlers.flow_input")
+        installs = module.BotInstallTracker.__installs__
+        installs.clear()
+        with patch.object(module, "get_turn_owner", new_callable=AsyncMock) as mock:
+            mock.return_value = MagicMock(
+                user_id="test_user_id", bot_id="test_bot_id"
+            )
+            yield module
+        installs.clear()
+
+
+def test_turns_are_routed_by_message_key(flow_input):
+    assert flow_input.route_flow_input(turn_input, "key_user_id") == "user:key_user_id"
+    flow_input.get_turn_owner.assert_not_called()
+
+
+def test_bot_configs_are_routed_by_bot(flow_input):
+    bot_input = Flow(
+        source="api",
+        intent=FlowIntent.BOT,
+        bot_config=BotConfig(bot_id="test_bot_id", intent=BotIntent.DELETE),
+    )
+
+    assert flow_input.route_flow_input(bot_input, "key_user_id") == "bot:test_bot_id"
+
+
+@pytest.mark.asyncio
+async def test_unkeyed_turns_are_routed_by_their_owner(flow_input):
+    assert await flow_input.route_unkeyed_flow_input(turn_input) == "user:test_user_id"
+    flow_input.get_turn_owner.assert_awaited_once_with("test_turn_id")
+
+
+@pytest.mark.asyncio
+async def test_bot_install_is_looked_up_only_while_installing(flow_input):
+    assert await flow_input.get_bot_install(turn_input) is None
+    flow_input.get_turn_owner.assert_not_called()
+
+    install = flow_input.BotInstallTracker.start("test_bot_id")
+    assert isinstance(install, asyncio.Event)
+    assert await flow_input.get_bot_install(turn_input) is install
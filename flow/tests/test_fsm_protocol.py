@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+flow_dir = Path(__file__).parent.parent
+
+
+def import_protocol(module: str, encoding: str) -> subprocess.CompletedProcess:
+    """Imports a side of the protocol in a fresh interpreter."""
+    return subprocess.run(
+        [sys.executable, "-c", f"import {module}"],
+        cwd=flow_dir if module.startswith("src.") else flow_dir / "template",
+        env={**os.environ, "FSM_RUNNER_ENCODING": encoding},
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+@pytest.mark.parametrize("module", ["src.fsm_protocol", "fsm_protocol"])
+def test_both_sides_reject_unknown_encodings(module):
+    result = import_protocol(module, "jsn")
+
+    assert result.returncode != 0
+    assert "Unsupported FSM_RUNNER_ENCODING: jsn" in result.stderr
+
+
+@pytest.mark.parametrize("encoding", ["json", "msgpack"])
+def test_runner_reads_frames_of_flow(encoding):
+    script = (
+        "import asyncio, io, sys\n"
+        "sys.path.insert(0, 'template')\n"
+        "import fsm_protocol\n"
+        "from src.fsm_protocol import encode_frame, read_frame\n"
+        "payload = {'state': {'key': 'value'}, 'n': [1, 2.5, None]}\n"
+        "stream = io.BytesIO(encode_frame(payload))\n"
+        "assert fsm_protocol.read_frame(stream) == payload\n"
+        "out = io.BytesIO()\n"
+        "fsm_protocol.write_frame(out, payload)\n"
+        "reader = asyncio.StreamReader()\n"
+        "reader.feed_data(out.getvalue())\n"
+        "reader.feed_eof()\n"
+        "assert asyncio.run(read_frame(reader)) == payload\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=flow_dir,
+        env={**os.environ, "FSM_RUNNER_ENCODING": encoding},
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 0, result.stderr
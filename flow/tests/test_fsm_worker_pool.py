@@ -0,0 +1,128 @@
+import asyncio
+import os
+import shutil
+import sys
+from pathlib import Path
+import pytest
+from src.fsm_worker_pool import FSMWorkerPool, FSMWorkerError
+
+template_dir = Path(__file__).parent.parent / "template"
+
+fake_worker = """
+import os
+import sys
+from fsm_protocol import read_frame, write_frame
+
+while True:
+    request = read_frame(sys.stdin.buffer)
+    if request is None:
+        break
+    if request.get("type") == "ping":
+        write_frame(sys.stdout.buffer, {"pong": True})
+        continue
+    payload = request["payload"]
+    if payload.get("crash"):
+        os._exit(1)
+    if payload.get("fail"):
+        write_frame(sys.stdout.buffer, {"error": "test_error"})
+    else:
+        write_frame(sys.stdout.buffer, {"fsm_output": {"pid": os.getpid()}})
+        write_frame(sys.stdout.buffer, {"new_state": payload["state"]})
+    write_frame(sys.stdout.buffer, {"done": True})
+"""
+
+
+@pytest.fixture
+def bot_dir(tmp_path: Path) -> Path:
+    (tmp_path / ".venv" / "bin").mkdir(parents=True)
+    os.symlink(sys.executable, tmp_path / ".venv" / "bin" / "python")
+    shutil.copy2(template_dir / "fsm_protocol.py", tmp_path)
+    (tmp_path / "fsm_worker.py").write_text(fake_worker)
+    return tmp_path
+
+
+async def run_turn(pool: FSMWorkerPool, payload: dict):
+    return [output async for output in pool.run(payload)]
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_streams_outputs(bot_dir):
+    pool = FSMWorkerPool(bot_dir, size=1)
+    await pool.start()
+
+    outputs = await run_turn(pool, {"state": {"test_key": "test_value"}})
+
+    assert len(outputs) == 2
+    assert "fsm_output" in outputs[0]
+    assert outputs[1] == {"new_state": {"test_key": "test_value"}}
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_reuses_warm_worker(bot_dir):
+    pool = FSMWorkerPool(bot_dir, size=1)
+    await pool.start()
+
+    first = await run_turn(pool, {"state": {}})
+    second = await run_turn(pool, {"state": {}})
+
+    assert first[0]["fsm_output"]["pid"] == second[0]["fsm_output"]["pid"]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_recycles_after_max_requests(bot_dir):
+    pool = FSMWorkerPool(bot_dir, size=1, max_requests=1)
+    await pool.start()
+
+    first = await run_turn(pool, {"state": {}})
+    second = await run_turn(pool, {"state": {}})
+
+    assert first[0]["fsm_output"]["pid"] != second[0]["fsm_output"]["pid"]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_restarts_crashed_worker(bot_dir):
+    pool = FSMWorkerPool(bot_dir, size=1)
+    await pool.start()
+
+    with pytest.raises(FSMWorkerError):
+        await run_turn(pool, {"state": {}, "crash": True})
+    outputs = await run_turn(pool, {"state": {}})
+
+    assert outputs[1] == {"new_state": {}}
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_keeps_worker_after_fsm_error(bot_dir):
+    pool = FSMWorkerPool(bot_dir, size=1)
+    await pool.start()
+
+    first = await run_turn(pool, {"state": {}})
+    with pytest.raises(FSMWorkerError, match="test_error"):
+        await run_turn(pool, {"state": {}, "fail": True})
+    second = await run_turn(pool, {"state": {}})
+
+    assert first[0]["fsm_output"]["pid"] == second[0]["fsm_output"]["pid"]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_keeps_slot_after_failed_respawn(bot_dir):
+    pool = FSMWorkerPool(bot_dir, size=1, max_requests=1, timeout=5)
+    await pool.start()
+    python = bot_dir / ".venv" / "bin" / "python"
+
+    await run_turn(pool, {"state": {}})
+    python.unlink()
+    # the worker is recycled after its turn, and can not be replaced
+    await asyncio.gather(*pool._background_tasks)
+    with pytest.raises(FSMWorkerError, match="Unable to start"):
+        await run_turn(pool, {"state": {}})
+    os.symlink(sys.executable, python)
+    outputs = await run_turn(pool, {"state": {}})
+
+    assert outputs[1] == {"new_state": {}}
+    await pool.close()
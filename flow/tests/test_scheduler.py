@@ -0,0 +1,141 @@
+import asyncio
+import pytest
+from lib.metrics import REGISTRY
+from src.scheduler import KeyedScheduler
+
+
+def make_job(events: list, name: str, delay: float = 0):
+    async def job():
+        events.append(f"start {name}")
+        await asyncio.sleep(delay)
+        events.append(f"end {name}")
+
+    return job
+
+
+@pytest.mark.asyncio
+async def test_jobs_with_same_key_run_in_order():
+    scheduler = KeyedScheduler(max_concurrency=4)
+    events = []
+
+    await scheduler.submit("user_1", make_job(events, "first", delay=0.02))
+    await scheduler.submit("user_1", make_job(events, "second"))
+    await scheduler.join()
+
+    assert events == ["start first", "end first", "start second", "end second"]
+
+
+@pytest.mark.asyncio
+async def test_jobs_with_different_keys_run_concurrently():
+    scheduler = KeyedScheduler(max_concurrency=4)
+    events = []
+
+    await scheduler.submit("user_1", make_job(events, "slow", delay=0.05))
+    await scheduler.submit("user_2", make_job(events, "fast"))
+    await scheduler.join()
+
+    assert events == ["start slow", "start fast", "end fast", "end slow"]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    scheduler = KeyedScheduler(max_concurrency=2)
+    running = 0
+    max_running = 0
+
+    async def job():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    for i in range(6):
+        await scheduler.submit(f"user_{i}", job)
+    await scheduler.join()
+
+    assert max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_job_does_not_block_its_key():
+    scheduler = KeyedScheduler(max_concurrency=4)
+    events = []
+
+    async def failing_job():
+        raise ValueError("test_error")
+
+    await scheduler.submit("user_1", failing_job)
+    await scheduler.submit("user_1", make_job(events, "next"))
+    await scheduler.join()
+
+    assert events == ["start next", "end next"]
+
+
+@pytest.mark.asyncio
+async def test_parked_job_waits_for_ready_without_blocking_others():
+    scheduler = KeyedScheduler(max_concurrency=1, max_pending=1)
+    events = []
+    ready = asyncio.Event()
+
+    await scheduler.submit("user_1", make_job(events, "parked"), ready=ready)
+    await scheduler.submit("user_2", make_job(events, "other"))
+    await asyncio.sleep(0.01)
+
+    assert events == ["start other", "end other"]
+
+    ready.set()
+    await scheduler.join()
+
+    assert events[2:] == ["start parked", "end parked"]
+
+
+@pytest.mark.asyncio
+async def test_job_looking_up_its_ready_event_is_parked():
+    scheduler = KeyedScheduler(max_concurrency=1, max_pending=1)
+    events = []
+    ready = asyncio.Event()
+
+    async def lookup():
+        events.append("lookup")
+        return ready
+
+    await scheduler.submit("user_1", make_job(events, "parked"), ready=lookup)
+    await asyncio.sleep(0.01)
+    # the parked job gave back its pending slot
+    await asyncio.wait_for(
+        scheduler.submit("user_2", make_job(events, "other")), timeout=1
+    )
+    await asyncio.sleep(0.01)
+
+    assert events == ["lookup", "start other", "end other"]
+
+    ready.set()
+    await scheduler.join()
+
+    assert events[3:] == ["start parked", "end parked"]
+
+
+@pytest.mark.asyncio
+async def test_jobs_in_flight_are_tracked_by_state():
+    scheduler = KeyedScheduler(max_concurrency=1)
+    ready = asyncio.Event()
+    release = asyncio.Event()
+
+    def in_flight(state):
+        return REGISTRY.get_sample_value("jb_jobs_in_flight", {"state": state}) or 0
+
+    before = {state: in_flight(state) for state in ("running", "waiting", "parked")}
+    await scheduler.submit("user_1", release.wait)
+    await scheduler.submit("user_2", release.wait)
+    await scheduler.submit("user_3", release.wait, ready=ready)
+    await asyncio.sleep(0.01)
+
+    assert in_flight("running") - before["running"] == 1
+    assert in_flight("waiting") - before["waiting"] == 1
+    assert in_flight("parked") - before["parked"] == 1
+
+    ready.set()
+    release.set()
+    await scheduler.join()
+    assert {state: in_flight(state) for state in before} == before
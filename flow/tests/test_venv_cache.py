@@ -0,0 +1,82 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from unittest.mock import patch
+import pytest
+from src import venv_cache
+from src.venv_cache import VenvBuildError, ensure_venv, prune_venvs, venv_key
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path):
+    with patch.object(venv_cache, "venv_cache_directory", tmp_path):
+        yield tmp_path
+
+
+async def fake_venv_build(*command):
+    # `python -m venv <dir>` creates the directory, pip installs into it
+    if list(command[1:3]) == ["-m", "venv"]:
+        await asyncio.sleep(0.01)
+        Path(command[3]).mkdir()
+
+
+def test_venv_key_depends_on_requirements_and_index_urls():
+    key = venv_key("openai\nrequests\n", [])
+
+    assert key == venv_key("requests\n# comment\nopenai", [])
+    assert key != venv_key("openai\nrequests==2.0\n", [])
+    assert key != venv_key("openai\nrequests\n", ["https://test_index_url"])
+
+
+@pytest.mark.asyncio
+@patch("src.venv_cache.run_command", side_effect=fake_venv_build)
+async def test_ensure_venv_builds_once_and_reuses(mock_run, cache_dir):
+    first = await ensure_venv("requests\n", [])
+    second = await ensure_venv("requests\n", [])
+
+    assert first == second == cache_dir / venv_key("requests\n", [])
+    assert (first / "requirements.txt").read_text() == "requests\n"
+    assert mock_run.call_count == 2  # venv + pip install, only once
+    assert [path.name for path in cache_dir.iterdir()] == [first.name]
+
+
+@pytest.mark.asyncio
+@patch("src.venv_cache.run_command", side_effect=fake_venv_build)
+async def test_concurrent_installs_share_one_build(mock_run, cache_dir):
+    first, second = await asyncio.gather(
+        ensure_venv("requests\n", []), ensure_venv("requests\n", [])
+    )
+
+    assert first == second
+    assert mock_run.call_count == 2
+
+
+@pytest.mark.asyncio
+@patch("src.venv_cache.run_command")
+async def test_failed_build_is_not_cached(mock_run, cache_dir):
+    async def failing_pip_install(*command):
+        await fake_venv_build(*command)
+        if "pip" in command:
+            raise VenvBuildError("pip failed")
+
+    mock_run.side_effect = failing_pip_install
+
+    with pytest.raises(VenvBuildError):
+        await ensure_venv("requests\n", [])
+
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_prune_venvs_keeps_used_venvs_and_recent_builds(cache_dir):
+    for name in ["used", "unused", ".build-recent", ".build-stale"]:
+        (cache_dir / name).mkdir()
+    stale = time.time() - venv_cache.STALE_BUILD_AGE - 1
+    os.utime(cache_dir / ".build-stale", (stale, stale))
+
+    prune_venvs(keep=["used"])
+
+    assert sorted(path.name for path in cache_dir.iterdir()) == [
+        ".build-recent",
+        "used",
+    ]
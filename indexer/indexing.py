@@ -14,9 +14,11 @@ from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import PGVector
 from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
-from lib.data_models import Indexer
+from lib.data_models import Indexer, decode_message
 from lib.file_storage import StorageHandler
-from lib.kafka_utils import KafkaConsumer
+from lib.kafka import AsyncKafkaConsumer
+from lib.metrics import HANDLER_SECONDS, start_metrics_server
+from lib.tracing import span
 from model import InternalServerException
 from r2r import ChunkingConfig, R2RBuilder, R2RConfig
 
@@ -26,8 +28,8 @@ kafka_bootstrap_servers = os.getenv("KAFKA_BROKER")
 kafka_topic = os.getenv("KAFKA_CONSUMER_TOPIC")
 print("kafka_bootstrap_servers", kafka_bootstrap_servers)
 print("kafka", kafka_topic)
-consumer = KafkaConsumer.from_env_vars(
-    group_id="cooler_group_id", auto_offset_reset="latest"
+consumer = AsyncKafkaConsumer.from_env_vars(
+    group_id="indexer", auto_offset_reset="latest", topics=[kafka_topic]
 )
 logging.basicConfig()
 logger = logging.getLogger("indexer")
@@ -193,14 +195,17 @@ class DataIndexer:
 async def start_indexer():
     """Starts the indexer server"""
     indexer = DataIndexer()
+    start_metrics_server()
     logger.info("Starting Listening")
-    while True:
-        message = consumer.receive_message(kafka_topic)
-        print("Indexer Message:", message)
-        data = json.loads(message)
-        indexer_input = Indexer(**data)
-
-        asyncio.run(indexer.index(indexer_input))
+    async for message in consumer.messages():
+        indexer_input = decode_message(Indexer, message.value(), message.headers())
+        print("Indexer Message:", indexer_input)
+
+        with (
+            span("indexer handle"),
+            HANDLER_SECONDS.labels(intent=indexer_input.type).time(),
+        ):
+            await indexer.index(indexer_input)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+"""Compares the cost of encoding and decoding the inter-service messages.
+
+"legacy" is what every hop did before the envelope: model_dump_json to
+produce, and decode, json.loads and Model(**data) to consume. "json" decodes
+the bytes straight into the model and "msgpack" is the compact encoding.
+Sizes are the encoded bytes of each message. Run from the jb-lib directory:
+
+    python -m benchmarks.envelope
+"""
+
+import json
+import timeit
+from lib.data_models import (
+    RAG,
+    Channel,
+    Flow,
+    Indexer,
+    Language,
+    decode_message,
+    encode_message,
+)
+
+ROUNDS = 20000
+
+MESSAGES = {
+    "Flow": Flow(
+        source="channel",
+        intent="user_input",
+        user_input={
+            "turn_id": "0b9e9c6e-5d3a-4c7a-9a8e-8f0f3c2d1e4b",
+            "message": {
+                "message_type": "text",
+                "text": {"body": "I would like to book a car wash " * 10},
+            },
+        },
+    ),
+    "Channel": Channel(
+        source="flow",
+        turn_id="0b9e9c6e-5d3a-4c7a-9a8e-8f0f3c2d1e4b",
+        intent="channel_out",
+        bot_output={
+            "message_type": "option_list",
+            "option_list": {
+                "header": "Car wash",
+                "body": "Which service would you like?",
+                "footer": "Reply with an option",
+                "button_text": "Services",
+                "list_title": "Services",
+                "options": [
+                    {"option_id": str(i), "option_text": f"Service {i}"}
+                    for i in range(10)
+                ],
+            },
+        },
+    ),
+    "Language": Language(
+        source="channel",
+        turn_id="0b9e9c6e-5d3a-4c7a-9a8e-8f0f3c2d1e4b",
+        intent="language_in",
+        message={
+            "message_type": "audio",
+            "audio": {"media_url": "https://storage.example.com/audio/1.ogg"},
+        },
+    ),
+    "RAG": RAG(
+        type="default",
+        source="flow",
+        turn_id="0b9e9c6e-5d3a-4c7a-9a8e-8f0f3c2d1e4b",
+        collection_name="car_wash",
+        query="What services are available on Sundays?",
+        top_chunk_k_value=5,
+        do_hybrid_search=False,
+    ),
+    "Indexer": Indexer(
+        type="default",
+        chunk_size=4000,
+        chunk_overlap=200,
+        collection_name="car_wash",
+        files=[f"car_wash/document_{i}.pdf" for i in range(5)],
+    ),
+}
+
+
+def legacy(message):
+    model = type(message)
+    value = message.model_dump_json(exclude_none=True).encode("utf-8")
+    return (
+        value,
+        lambda: message.model_dump_json(exclude_none=True),
+        lambda: model(**json.loads(value.decode("utf-8"))),
+    )
+
+
+def envelope(encoding):
+    def codec(message):
+        model = type(message)
+        value, headers = encode_message(message, encoding=encoding)
+        return (
+            value,
+            lambda: encode_message(message, encoding=encoding),
+            lambda: decode_message(model, value, headers),
+        )
+
+    return codec
+
+
+def microseconds(fn) -> float:
+    return timeit.timeit(fn, number=ROUNDS) / ROUNDS * 1e6
+
+
+def main():
+    codecs = {
+        "legacy": legacy,
+        "json": envelope("json"),
+        "msgpack": envelope("msgpack"),
+    }
+    print(
+        f"{'message':<9} {'codec':<8} {'encode us':>10} {'decode us':>10}"
+        f" {'bytes':>6}"
+    )
+    for name, message in MESSAGES.items():
+        for codec_name, codec in codecs.items():
+            value, encode, decode = codec(message)
+            print(
+                f"{name:<9} {codec_name:<8} {microseconds(encode):>10.2f}"
+                f" {microseconds(decode):>10.2f} {len(value):>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compares the throughput of KafkaProducer and AsyncKafkaProducer.
+
+KafkaProducer.send_message flushes after every message, so each message is a
+round trip to the broker. AsyncKafkaProducer queues the messages and lets
+librdkafka send them in batches, optionally compressed. Every run sends the
+same messages and ends once all of them have been delivered.
+
+Messages go to KAFKA_BROKER if it is set, otherwise to an in-process mock
+cluster (which has no network latency, so the real gap is larger). Run from
+the jb-lib directory:
+
+    python -m benchmarks.kafka_producer
+"""
+
+import concurrent.futures
+import json
+import os
+import time
+import uuid
+from lib.kafka import AsyncKafkaProducer, KafkaProducer
+
+MESSAGES = 2000
+TOPIC = os.getenv("KAFKA_BENCHMARK_TOPIC") or "benchmark"
+
+
+def producer_config(**config) -> dict:
+    if not os.getenv("KAFKA_BROKER"):
+        config["test.mock.num.brokers"] = 1
+    return config
+
+
+def message() -> str:
+    return json.dumps(
+        {
+            "source": "api",
+            "intent": "user_input",
+            "user_input": {
+                "turn_id": str(uuid.uuid4()),
+                "message": {
+                    "message_type": "text",
+                    "text": {"body": "I would like to book a car wash " * 10},
+                },
+            },
+        }
+    )
+
+
+def flushing_producer() -> float:
+    producer = KafkaProducer(
+        os.getenv("KAFKA_BROKER") or "localhost", producer_config=producer_config()
+    )
+    messages = [message() for _ in range(MESSAGES)]
+    start = time.perf_counter()
+    for value in messages:
+        producer.send_message(TOPIC, value)
+    return time.perf_counter() - start
+
+
+def batching_producer(compression: str) -> float:
+    producer = AsyncKafkaProducer(
+        KafkaProducer(
+            os.getenv("KAFKA_BROKER") or "localhost",
+            producer_config=producer_config(
+                **{"linger.ms": 5, "compression.type": compression}
+            ),
+        )
+    )
+    messages = [message() for _ in range(MESSAGES)]
+    start = time.perf_counter()
+    deliveries = [producer.send_message(TOPIC, value) for value in messages]
+    concurrent.futures.wait(deliveries)
+    elapsed = time.perf_counter() - start
+    producer.close()
+    return elapsed
+
+
+def main():
+    runs = [("flush every message", flushing_producer)] + [
+        (f"batched, {compression}", lambda c=compression: batching_producer(c))
+        for compression in ["none", "lz4", "zstd"]
+    ]
+    print(f"{'producer':<22} {'msgs/s':>10}")
+    for name, run in runs:
+        elapsed = run()
+        print(f"{name:<22} {MESSAGES / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Measures the throughput of a chain of services on the in-memory backend.
+
+Each hop consumes a topic, decodes the message, encodes it again and sends it
+to the next topic, like api -> channel -> flow -> channel does, so the
+numbers are the cost of the Kafka plumbing of the services without their
+handlers or a network. Run from the jb-lib directory:
+
+    python -m benchmarks.memory_pipeline
+"""
+
+import asyncio
+import os
+import time
+import uuid
+
+os.environ["KAFKA_BACKEND"] = "memory"
+
+# pylint: disable=wrong-import-position
+from lib.data_models import Flow, decode_message, encode_message
+from lib.kafka import AsyncKafkaConsumer, AsyncKafkaProducer, KafkaConsumer
+
+MESSAGES = 5000
+HOPS = 3
+
+
+def flow_input() -> Flow:
+    return Flow(
+        source="api",
+        intent="user_input",
+        user_input={
+            "turn_id": str(uuid.uuid4()),
+            "message": {"message_type": "text", "text": {"body": "Hello"}},
+        },
+    )
+
+
+def consumer(topic: str) -> AsyncKafkaConsumer:
+    return AsyncKafkaConsumer(
+        KafkaConsumer.from_env_vars(f"{topic}_group", "earliest"),
+        topics=[topic],
+        poll_timeout=0.01,
+        batch_size=100,
+        batch_linger=0.001,
+    )
+
+
+async def hop(source: str, destination: str, producer: AsyncKafkaProducer):
+    async for msg in consumer(source).messages():
+        message = decode_message(Flow, msg.value(), msg.headers())
+        value, headers = encode_message(message)
+        producer.send_message(destination, value, headers=headers)
+
+
+async def main():
+    producer = AsyncKafkaProducer.from_env_vars()
+    topics = [f"hop_{i}" for i in range(HOPS + 1)]
+    hops = [
+        asyncio.create_task(hop(source, destination, producer))
+        for source, destination in zip(topics, topics[1:])
+    ]
+    sink = consumer(topics[-1])
+    messages = [encode_message(flow_input()) for _ in range(MESSAGES)]
+
+    start = time.perf_counter()
+    for value, headers in messages:
+        producer.send_message(topics[0], value, key=str(uuid.uuid4()), headers=headers)
+    for _ in range(MESSAGES):
+        await sink.receive_raw_message()
+    elapsed = time.perf_counter() - start
+
+    print(f"{MESSAGES} messages through {HOPS} hops in {elapsed:.2f}s")
+    print(f"{MESSAGES / elapsed:.0f} msgs/s end to end")
+    for task in hops:
+        task.cancel()
+    producer.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
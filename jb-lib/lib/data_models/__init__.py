@@ -16,7 +16,7 @@ from .message import (
     DialogOption,
 )
 from .language import Language, LanguageIntent
-from .channel import Channel, ChannelIntent, BotInput, RestBotInput
+from .channel import Channel, ChannelIntent, BotInput, RestBotInput, IngestWebhook
 from .flow import (
     Flow,
     FlowIntent,
@@ -34,3 +34,4 @@ from .flow import (
 )
 from .retriever import RAG, RAGResponse
 from .indexer import Indexer
+from .envelope import encode_message, decode_message
@@ -15,6 +15,13 @@ class RestBotInput(BotInput):
     query_params: Dict[str, str]
 
 
+class IngestWebhook(BaseModel):
+    """A webhook received by the api for the channel of a bot, queued as is."""
+
+    bot_identifier: str
+    bot_input: RestBotInput
+
+
 class ChannelIntent(Enum):
     CHANNEL_IN = "channel_in"
     CHANNEL_OUT = "channel_out"
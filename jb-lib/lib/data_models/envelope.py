@@ -0,0 +1,64 @@
+"""Encoding of the messages that services exchange over Kafka.
+
+The body of a message is the encoded model and its `content-type` header
+names the encoding and the version of the envelope, so consumers decode
+the bytes straight into the model. Messages without the header are JSON,
+which is what services sent before the header existed.
+
+KAFKA_MESSAGE_ENCODING selects the encoding of the messages sent (json or
+msgpack, default: json). Every service decodes both, so switch to msgpack
+only once all services run a version that reads the header.
+"""
+
+import os
+from typing import List, Optional, Tuple, Type, TypeVar
+import msgpack
+from pydantic import BaseModel
+
+ENVELOPE_VERSION = 1
+CONTENT_TYPE_HEADER = "content-type"
+CONTENT_TYPES = {
+    "json": f"application/vnd.jb.v{ENVELOPE_VERSION}+json",
+    "msgpack": f"application/vnd.jb.v{ENVELOPE_VERSION}+msgpack",
+}
+KAFKA_MESSAGE_ENCODING = os.getenv("KAFKA_MESSAGE_ENCODING") or "json"
+if KAFKA_MESSAGE_ENCODING not in CONTENT_TYPES:
+    raise ValueError(f"Unsupported KAFKA_MESSAGE_ENCODING: {KAFKA_MESSAGE_ENCODING}")
+
+Headers = List[Tuple[str, bytes]]
+Model = TypeVar("Model", bound=BaseModel)
+
+
+def encode_message(
+    message: BaseModel, encoding: str = KAFKA_MESSAGE_ENCODING
+) -> Tuple[bytes, Headers]:
+    """Encodes a message, returns its body and headers."""
+    if encoding == "msgpack":
+        value = msgpack.packb(
+            message.model_dump(mode="json", exclude_none=True), use_bin_type=True
+        )
+    elif encoding == "json":
+        value = message.model_dump_json(exclude_none=True).encode("utf-8")
+    else:
+        raise ValueError(f"Unsupported message encoding: {encoding}")
+    return value, [(CONTENT_TYPE_HEADER, CONTENT_TYPES[encoding].encode("utf-8"))]
+
+
+def content_type(headers: Optional[Headers]) -> Optional[str]:
+    """Returns the content type of a message, None if it has none."""
+    for key, value in headers or []:
+        if key == CONTENT_TYPE_HEADER:
+            return value.decode("utf-8")
+    return None
+
+
+def decode_message(
+    model: Type[Model], value: bytes, headers: Optional[Headers]
+) -> Model:
+    """Decodes the body of a message into the model."""
+    message_type = content_type(headers)
+    if message_type is None or message_type == CONTENT_TYPES["json"]:
+        return model.model_validate_json(value)
+    if message_type == CONTENT_TYPES["msgpack"]:
+        return model.model_validate(msgpack.unpackb(value, raw=False))
+    raise ValueError(f"Unsupported message content type: {message_type}")
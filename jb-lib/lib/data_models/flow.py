@@ -17,6 +17,7 @@ class FlowIntent(Enum):
 class BotIntent(Enum):
     INSTALL = "install"
     DELETE = "delete"
+    CONFIGURE = "configure"
 
 
 class Bot(BaseModel):
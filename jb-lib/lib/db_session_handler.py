@@ -1,9 +1,32 @@
 import os
+import time
 import sqlalchemy
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
+from .metrics import DB_QUERY_SECONDS
+
+
+def record_query_time(engine: sqlalchemy.Engine):
+    """Records the duration of the queries run by the engine in the metrics."""
+
+    @sqlalchemy.event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, *args):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @sqlalchemy.event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, *args):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        operation = statement.split(None, 1)[0].upper() if statement else ""
+        DB_QUERY_SECONDS.labels(operation=operation).observe(elapsed)
+
+    @sqlalchemy.event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        if context.connection is not None and context.connection.info.get(
+            "query_start"
+        ):
+            context.connection.info["query_start"].pop()
 
 
 class DBSessionHandler:
@@ -32,6 +55,7 @@ class DBSessionHandler:
                 pool_recycle=3600,
                 pool_pre_ping=True,
             )
+            record_query_time(engine.sync_engine)
             async_session = async_sessionmaker(
                 bind=engine, autocommit=False, autoflush=False, expire_on_commit=False
             )
@@ -60,6 +84,7 @@ class DBSessionHandler:
                 pool_recycle=3600,
                 pool_pre_ping=True,
             )
+            record_query_time(engine)
             sync_session = sessionmaker(
                 bind=engine,
                 autocommit=False,
@@ -1,3 +1,7 @@
 from .kafka_producer import KafkaProducer
+from .async_kafka_producer import AsyncKafkaProducer, Deliveries
 from .kafka_consumer import KafkaConsumer
-from .handler import KafkaHandler
\ No newline at end of file
+from .async_kafka_consumer import AsyncKafkaConsumer
+from .handler import KafkaHandler
+from .partition_key import message_key, partition_key
+from .message_context import set_message_context, trace_headers
\ No newline at end of file
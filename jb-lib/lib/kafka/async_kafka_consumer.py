@@ -0,0 +1,235 @@
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import AsyncIterator, Deque, List, Optional
+from confluent_kafka import Message
+from ..metrics import CONSUMER_BUFFERED, CONSUMER_PAUSED
+from .kafka_consumer import KafkaConsumer
+from .message_context import set_message_context
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncKafkaConsumer:
+    """Asyncio interface to a KafkaConsumer.
+
+    The blocking consume runs in a dedicated thread which hands batches of up
+    to `batch_size` messages to the event loop through a queue, so the event
+    loop is free while waiting for messages. A batch waits at most
+    `batch_linger` seconds to fill up.
+
+    Once `max_buffered` messages are waiting to be handled, the thread pauses
+    the assigned partitions until the service has caught up with half of
+    them. It keeps polling meanwhile, so the consumer stays in its group, and
+    a burst turns into consumer lag instead of messages piling up in memory.
+
+    Messages can be received one at a time, decoded or raw, which makes the
+    context of each message, i.e. its partition key and trace, the current
+    context:
+
+        async for msg in consumer:
+            ...
+
+        async for msg in consumer.messages():
+            decode_message(Flow, msg.value(), msg.headers())
+
+    or as batches of raw messages, whose offsets are committed once the batch
+    is processed, i.e. when the next batch is requested. This needs
+    `enable.auto.commit` set to false to take effect:
+
+        async for batch in consumer.batches():
+            for msg in batch:
+                set_message_context(msg)
+                ...
+    """
+
+    def __init__(
+        self,
+        consumer: KafkaConsumer,
+        topics: List[str],
+        poll_timeout: float = 1.0,
+        max_buffered: int = 1000,
+        batch_size: int = 1,
+        batch_linger: Optional[float] = None,
+    ):
+        self.consumer = consumer
+        self.topics = topics
+        self.poll_timeout = poll_timeout
+        self.max_buffered = max_buffered
+        self.batch_size = batch_size
+        self.batch_linger = poll_timeout if batch_linger is None else batch_linger
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._pending: Deque[Message] = collections.deque()
+        # messages handed over by the thread and not received by the service
+        self._buffered = 0
+        self._buffered_lock = threading.Lock()
+        self._paused = False
+        group = consumer.consumer_config.get("group.id")
+        self._buffered_gauge = CONSUMER_BUFFERED.labels(group=group)
+        self._paused_gauge = CONSUMER_PAUSED.labels(group=group)
+
+    @classmethod
+    def from_env_vars(
+        cls,
+        group_id: str,
+        auto_offset_reset: str,
+        topics: List[str],
+        poll_timeout: float = 1.0,
+        max_buffered: Optional[int] = None,
+        manual_commit: bool = False,
+    ):
+        """
+        Creates an AsyncKafkaConsumer from environment variables.
+        See `KafkaConsumer.from_env_vars` for the connection variables, and
+        additionally:
+        - KAFKA_CONSUMER_BATCH_SIZE: max messages per batch (default: 100)
+        - KAFKA_CONSUMER_BATCH_LINGER: seconds a batch waits to fill up
+          (default: 0.05)
+        - KAFKA_CONSUMER_MAX_BUFFERED: messages waiting to be handled at
+          which consuming pauses, unless given as `max_buffered`
+          (default: 1000)
+        With `manual_commit`, auto commit is disabled and offsets are only
+        committed by `batches` and `commit`.
+        """
+        consumer = KafkaConsumer.from_env_vars(
+            group_id=group_id,
+            auto_offset_reset=auto_offset_reset,
+            consumer_config={"enable.auto.commit": False} if manual_commit else None,
+        )
+        return cls(
+            consumer,
+            topics,
+            poll_timeout=poll_timeout,
+            max_buffered=max_buffered
+            or int(os.getenv("KAFKA_CONSUMER_MAX_BUFFERED") or 1000),
+            batch_size=int(os.getenv("KAFKA_CONSUMER_BATCH_SIZE") or 100),
+            batch_linger=float(os.getenv("KAFKA_CONSUMER_BATCH_LINGER") or 0.05),
+        )
+
+    def start(self):
+        """Subscribes and starts consuming. Must be called from the event loop."""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self.consumer.subscribe(self.topics)
+        self._thread = threading.Thread(
+            target=self._consume_loop, name="kafka-consumer", daemon=True
+        )
+        self._thread.start()
+
+    def _consume_loop(self):
+        while not self._stopped.is_set():
+            try:
+                self._apply_backpressure()
+                messages = self.consumer.consume(self.batch_size, self.batch_linger)
+            except Exception as e:  # pylint: disable=broad-except
+                self._hand_over(e)
+                return
+            if messages:
+                self._update_buffered(len(messages))
+                self._hand_over(messages)
+
+    def _apply_backpressure(self):
+        """Pauses or resumes the assigned partitions depending on how many
+        messages are waiting to be handled."""
+        if self._paused and self._buffered <= self.max_buffered // 2:
+            self.consumer.resume()
+            self._paused = False
+            self._paused_gauge.set(0)
+            logger.info("Resumed consuming, %d messages buffered", self._buffered)
+        elif self._paused or self._buffered >= self.max_buffered:
+            if not self._paused:
+                logger.warning("Paused consuming, %d messages buffered", self._buffered)
+            self._paused = True
+            # pausing again also pauses the partitions assigned meanwhile
+            self._paused_gauge.set(self.consumer.pause())
+
+    def _update_buffered(self, count: int):
+        with self._buffered_lock:
+            self._buffered += count
+            self._buffered_gauge.set(self._buffered)
+
+    def _hand_over(self, item):
+        """Puts an item on the queue, waiting until the event loop has put it
+        there. The queue is unbounded, so this is short, and it lets messages
+        accumulate into larger batches while the event loop is busy."""
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop)
+        while True:
+            try:
+                future.result(timeout=self.poll_timeout)
+                return
+            except concurrent.futures.TimeoutError:
+                if self._stopped.is_set():
+                    future.cancel()
+                    return
+
+    async def _next_messages(self) -> List[Message]:
+        if self._pending:
+            messages = list(self._pending)
+            self._pending.clear()
+            return messages
+        self.start()
+        item = await self._queue.get()
+        if isinstance(item, Exception):
+            # the consume thread has exited
+            self._stopped.set()
+            raise item
+        return item
+
+    async def receive_raw_message(self) -> Message:
+        """Waits for the next message and makes its context the current one."""
+        if not self._pending:
+            self._pending.extend(await self._next_messages())
+        msg = self._pending.popleft()
+        self._update_buffered(-1)
+        set_message_context(msg)
+        return msg
+
+    async def receive_message(self) -> str:
+        """Waits for the next message, returns its decoded value."""
+        msg = await self.receive_raw_message()
+        return msg.value().decode("utf-8")
+
+    async def messages(self) -> AsyncIterator[Message]:
+        """Yields each raw message."""
+        while not self._stopped.is_set():
+            yield await self.receive_raw_message()
+
+    async def receive_batch(self) -> List[Message]:
+        """Waits for the next batch of messages."""
+        messages = await self._next_messages()
+        self._update_buffered(-len(messages))
+        return messages
+
+    async def commit(self, messages: List[Message]):
+        """Commits the offsets following the given messages."""
+        await asyncio.to_thread(self.consumer.commit, messages)
+
+    async def batches(self) -> AsyncIterator[List[Message]]:
+        """Yields each batch, committing it once processed."""
+        while not self._stopped.is_set():
+            messages = await self.receive_batch()
+            yield messages
+            await self.commit(messages)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._stopped.is_set():
+            raise StopAsyncIteration
+        return await self.receive_message()
+
+    async def close(self):
+        """Stops consuming and closes the consumer."""
+        self._stopped.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+        self.consumer.consumer.close()
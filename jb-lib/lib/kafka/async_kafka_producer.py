@@ -0,0 +1,219 @@
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import logging
+import os
+import socket
+import threading
+from typing import Dict, List, Optional, Tuple
+from confluent_kafka import KafkaException, Message
+from ..metrics import MESSAGES_PRODUCED, PRODUCE_ERRORS
+from .kafka_producer import KafkaProducer
+from .message_context import trace_headers
+from .partition_key import partition_key
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_BACKOFF = 30
+
+
+class AsyncKafkaProducer:
+    """Kafka producer that does not wait for each message to be delivered.
+
+    `send_message` only queues the message and returns a future for its
+    delivery. librdkafka sends the queued messages in batches, waiting up to
+    `linger.ms` for a batch to fill, and a background thread polls for the
+    delivery reports. Pending messages are flushed on `close`, which also
+    runs when the interpreter exits.
+
+        producer.send_message(topic, value)  # fire and forget
+        await producer.deliver(topic, value)  # wait until acked
+
+    The messages sent while handling a batch of consumed messages can be
+    tracked with `deliveries`, see `Deliveries`.
+    """
+
+    def __init__(
+        self,
+        producer: KafkaProducer,
+        poll_timeout: float = 0.1,
+        max_retries: int = 5,
+        retry_backoff: float = 1.0,
+    ):
+        self.producer = producer
+        self.poll_timeout = poll_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._poll_loop, name="kafka-producer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env_vars(
+        cls,
+        client_id: str = socket.gethostname(),
+        producer_config: Optional[Dict] = None,
+    ):
+        """
+        Creates an AsyncKafkaProducer from environment variables.
+        See `KafkaProducer.from_env_vars` for the connection variables, and
+        additionally:
+        - KAFKA_PRODUCER_LINGER_MS: ms a batch waits to fill up (default: 5)
+        - KAFKA_PRODUCER_COMPRESSION: compression codec of the batches, e.g.
+          none, lz4 or zstd (default: lz4)
+        - KAFKA_PRODUCER_MAX_RETRIES: times `Deliveries` sends an undelivered
+          message again (default: 5)
+        - KAFKA_PRODUCER_RETRY_BACKOFF: seconds before the first retry,
+          doubled on each retry up to 30 (default: 1)
+        """
+        producer_config = {
+            "linger.ms": int(os.getenv("KAFKA_PRODUCER_LINGER_MS") or 5),
+            "compression.type": os.getenv("KAFKA_PRODUCER_COMPRESSION") or "lz4",
+            **(producer_config or {}),
+        }
+        return cls(
+            KafkaProducer.from_env_vars(
+                client_id=client_id, producer_config=producer_config
+            ),
+            max_retries=int(os.getenv("KAFKA_PRODUCER_MAX_RETRIES") or 5),
+            retry_backoff=float(os.getenv("KAFKA_PRODUCER_RETRY_BACKOFF") or 1),
+        )
+
+    def _poll_loop(self):
+        while not self._stopped.is_set():
+            self.producer.producer.poll(self.poll_timeout)
+
+    def send_message(
+        self,
+        topic: str,
+        value: str | bytes,
+        key: Optional[str] = None,
+        headers: Optional[List[Tuple[str, bytes]]] = None,
+    ) -> concurrent.futures.Future:
+        """Queues a message, returns a future resolved once it is delivered.
+
+        Without a `key`, the message is keyed like the one being handled. The
+        current span and the send time are added to the headers.
+        """
+        if key is None:
+            key = partition_key.get()
+        delivery = concurrent.futures.Future()
+
+        def on_delivery(err, msg: Message):
+            if err is not None:
+                logger.error("Failed to deliver message to %s: %s", topic, err)
+                PRODUCE_ERRORS.labels(topic=topic).inc()
+                delivery.set_exception(KafkaException(err))
+            else:
+                delivery.set_result(msg)
+
+        while True:
+            try:
+                self.producer.producer.produce(
+                    topic,
+                    value=value,
+                    key=key,
+                    headers=trace_headers(headers),
+                    on_delivery=on_delivery,
+                )
+                MESSAGES_PRODUCED.labels(topic=topic).inc()
+                return delivery
+            except BufferError:
+                # the local queue is full, wait for some deliveries
+                self.producer.producer.poll(self.poll_timeout)
+
+    async def deliver(
+        self,
+        topic: str,
+        value: str | bytes,
+        key: Optional[str] = None,
+        headers: Optional[List[Tuple[str, bytes]]] = None,
+    ):
+        """Sends a message and waits until it is delivered."""
+        return await asyncio.wrap_future(
+            self.send_message(topic, value, key, headers)
+        )
+
+    def deliveries(self) -> "Deliveries":
+        """Tracks the deliveries of the messages sent through it."""
+        return Deliveries(self)
+
+    def close(self, timeout: float = 10.0):
+        """Stops polling and flushes the pending messages."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._thread.join()
+        remaining = self.producer.producer.flush(timeout)
+        if remaining:
+            logger.error("%d Kafka messages were not delivered", remaining)
+
+
+class Deliveries:
+    """The messages sent while handling a batch of consumed messages.
+
+    `wait` returns once they are all delivered. The messages that fail are
+    sent again, in the context they were first sent in, up to `max_retries`
+    times of the producer with exponential backoff. Those that still fail
+    are logged and dropped, so that a broker error does not stop the
+    consumer, and the batch can be committed:
+
+        async for batch in consumer.batches():
+            deliveries = producer.deliveries()
+            for msg in batch:
+                set_message_context(msg)
+                deliveries.send_message(topic, value)
+            await deliveries.wait()
+    """
+
+    def __init__(self, producer: AsyncKafkaProducer):
+        self.producer = producer
+        self._pending = []
+
+    def send_message(
+        self,
+        topic: str,
+        value: str | bytes,
+        key: Optional[str] = None,
+        headers: Optional[List[Tuple[str, bytes]]] = None,
+    ) -> concurrent.futures.Future:
+        """Queues a message like `AsyncKafkaProducer.send_message`."""
+        # a retry is keyed and traced like the first attempt
+        context = contextvars.copy_context()
+        message = (topic, value, key, headers)
+        delivery = context.run(self.producer.send_message, *message)
+        self._pending.append((context, message, delivery))
+        return delivery
+
+    async def wait(self):
+        """Waits until the messages sent so far are delivered or given up."""
+        pending, self._pending = self._pending, []
+        for attempt in range(self.producer.max_retries + 1):
+            results = await asyncio.gather(
+                *(asyncio.wrap_future(delivery) for _, _, delivery in pending),
+                return_exceptions=True,
+            )
+            pending = [
+                (context, message)
+                for (context, message, _), result in zip(pending, results)
+                if isinstance(result, Exception)
+            ]
+            if not pending:
+                return
+            if attempt == self.producer.max_retries:
+                break
+            delay = min(self.producer.retry_backoff * 2**attempt, MAX_RETRY_BACKOFF)
+            logger.warning(
+                "%d messages were not delivered, retrying in %.1fs", len(pending), delay
+            )
+            await asyncio.sleep(delay)
+            pending = [
+                (context, message, context.run(self.producer.send_message, *message))
+                for context, message in pending
+            ]
+        for _, (topic, value, _, _) in pending:
+            logger.error("Giving up on delivering message to %s: %s", topic, value)
@@ -16,9 +16,10 @@ class KafkaHandler:
         return cls.__producer__
 
     @classmethod
-    def get_consumer(cls) -> KafkaConsumer:
+    def get_consumer(cls, group_id: str) -> KafkaConsumer:
+        """Returns the consumer of the service, which joins `group_id` when
+        first created. Each service should use its own group."""
         if cls.__consumer__ is None:
-            group_id = "cooler_group_id"
             logger.info("Creating Kafka Consumer with group_id: %s", group_id)
             cls.__consumer__ = KafkaConsumer.from_env_vars(
                 group_id=group_id, auto_offset_reset="latest"
@@ -1,10 +1,47 @@
+import json
+import logging
 import os
-from typing import Dict, Optional
-from confluent_kafka import Consumer, KafkaException
+from typing import Dict, List, Optional
+from confluent_kafka import (
+    Consumer,
+    KafkaError,
+    KafkaException,
+    Message,
+    TopicPartition,
+)
+
+from ..metrics import CONSUMER_LAG
+from .memory import MemoryConsumer, memory_backend
+from .message_context import set_message_context
+
+logger = logging.getLogger(__name__)
+
+
+def record_consumer_lag(stats: str):
+    """Updates the consumer lag metric from librdkafka statistics."""
+    for topic, topic_stats in json.loads(stats).get("topics", {}).items():
+        for partition, partition_stats in topic_stats.get("partitions", {}).items():
+            if partition == "-1":
+                continue
+            lag = partition_stats.get("consumer_lag", -1)
+            if partition_stats.get("fetch_state") == "none" or lag < 0:
+                # not assigned to this consumer (anymore)
+                try:
+                    CONSUMER_LAG.remove(topic, partition)
+                except KeyError:
+                    pass
+            else:
+                CONSUMER_LAG.labels(topic=topic, partition=partition).set(lag)
 
 
 class KafkaConsumer:
     __consumer__ = None
+    REBALANCE_ERRORS = {
+        KafkaError.REBALANCE_IN_PROGRESS,
+        KafkaError.ILLEGAL_GENERATION,
+        KafkaError.UNKNOWN_MEMBER_ID,
+        KafkaError._ASSIGNMENT_LOST,
+    }
 
     def __init__(
         self,
@@ -38,12 +75,20 @@ class KafkaConsumer:
                 "auto.offset.reset": auto_offset_reset,
                 **consumer_config,
             }
-        self.consumer = Consumer(self.consumer_config)
+        if memory_backend():
+            self.consumer = MemoryConsumer(self.consumer_config)
+        else:
+            self.consumer = Consumer(self.consumer_config)
         self.subscribed = False
         self.subscribed_topics = []
 
     @classmethod
-    def from_env_vars(cls, group_id: str, auto_offset_reset: str):
+    def from_env_vars(
+        cls,
+        group_id: str,
+        auto_offset_reset: str,
+        consumer_config: Optional[Dict] = None,
+    ):
         """
         Creates a KafkaConsumer from environment variables.
         Uses the following environment variables:
@@ -51,9 +96,37 @@ class KafkaConsumer:
         - KAFKA_USE_SASL: whether to use SASL authentication (default: False)
         - KAFKA_CONSUMER_USERNAME: SASL username (default: "")
         - KAFKA_CONSUMER_PASSWORD: SASL password (default: "")
+        - KAFKA_BACKEND: memory to use the in-process broker of
+          `lib.kafka.memory`, which needs no KAFKA_BROKER (default: confluent)
+        - KAFKA_CONSUMER_GROUP_ID: overrides the group_id of the service. A
+          group without committed offsets starts at `auto_offset_reset`, so
+          with "latest" copy the offsets of the previous group first, see
+          scripts/copy-consumer-group-offsets.sh
+        - KAFKA_STATISTICS_INTERVAL_MS: how often the consumer lag metric is
+          updated (default: 30000, 0 disables it)
+        - KAFKA_CONSUMER_INSTANCE_ID: id of this replica within the group,
+          which makes it a static member (default: none). It must be unique
+          among the replicas and stay the same across restarts, e.g. a
+          StatefulSet pod name, so that a restart does not rebalance the group.
+        Partitions are assigned with the cooperative-sticky strategy, so a
+        rebalance only moves the partitions that change owner.
         You can further override these by providing arguments in the consumer_config dict.
         """
-        kafka_broker = os.getenv("KAFKA_BROKER")
+        group_id = os.getenv("KAFKA_CONSUMER_GROUP_ID") or group_id
+        instance_id = os.getenv("KAFKA_CONSUMER_INSTANCE_ID")
+        consumer_config = {
+            "partition.assignment.strategy": "cooperative-sticky",
+            "statistics.interval.ms": int(
+                os.getenv("KAFKA_STATISTICS_INTERVAL_MS") or 30000
+            ),
+            "stats_cb": record_consumer_lag,
+            **({"group.instance.id": instance_id} if instance_id else {}),
+            **(consumer_config or {}),
+        }
+
+        kafka_broker = os.getenv("KAFKA_BROKER") or (
+            "memory" if memory_backend() else None
+        )
         use_sasl = os.getenv("KAFKA_USE_SASL")
         consumer_username = os.getenv("KAFKA_CONSUMER_USERNAME")
         consumer_password = os.getenv("KAFKA_CONSUMER_PASSWORD")
@@ -65,16 +138,22 @@ class KafkaConsumer:
                 raise ValueError(
                     "KAFKA_USE_SASL is set to True, but KAFKA_CONSUMER_USERNAME or KAFKA_CONSUMER_PASSWORD is not set"
                 )
-            cls.__consumer__ = KafkaConsumer(
+            return KafkaConsumer(
                 kafka_broker,
                 group_id,
                 auto_offset_reset,
                 use_sasl=True,
                 sasl_username=consumer_username,
                 sasl_password=consumer_password,
+                consumer_config=consumer_config,
             )
         else:
-            return KafkaConsumer(kafka_broker, group_id, auto_offset_reset)
+            return KafkaConsumer(
+                kafka_broker,
+                group_id,
+                auto_offset_reset,
+                consumer_config=consumer_config,
+            )
 
     def subscribe(self, topics: list):
         self.consumer.subscribe(topics)
@@ -90,4 +169,61 @@ class KafkaConsumer:
                 continue
             if msg.error():
                 raise KafkaException(msg.error())
+            set_message_context(msg)
             return msg.value().decode("utf-8")
+
+    def pause(self) -> int:
+        """Stops fetching from the assigned partitions until `resume`, while
+        the consumer keeps polling, i.e. stays in its group. Partitions
+        assigned meanwhile are not paused. Returns the partitions paused."""
+        partitions = self.consumer.assignment()
+        if partitions:
+            self.consumer.pause(partitions)
+        return len(partitions)
+
+    def resume(self):
+        """Fetches from the assigned partitions again."""
+        partitions = self.consumer.assignment()
+        if partitions:
+            self.consumer.resume(partitions)
+
+    def consume(self, num_messages: int = 100, timeout: float = 1.0) -> List[Message]:
+        """Receives a batch of up to `num_messages` messages.
+
+        Waits until the batch is full or `timeout` seconds have passed, so
+        `timeout` is how long a batch lingers to fill up. Call `subscribe`
+        first. With `enable.auto.commit` set to false, offsets are only
+        committed by `commit`, i.e. once the batch has been processed.
+        """
+        messages = []
+        for msg in self.consumer.consume(num_messages, timeout):
+            if msg.error():
+                if msg.error().fatal():
+                    raise KafkaException(msg.error())
+                logger.error("Error while consuming from Kafka: %s", msg.error())
+                continue
+            messages.append(msg)
+        return messages
+
+    def commit(self, messages: List[Message]):
+        """Commits the offsets following the given messages."""
+        offsets = {}
+        for msg in messages:
+            partition = (msg.topic(), msg.partition())
+            offsets[partition] = max(offsets.get(partition, -1), msg.offset() + 1)
+        if not offsets:
+            return
+        try:
+            self.consumer.commit(
+                offsets=[
+                    TopicPartition(topic, partition, offset)
+                    for (topic, partition), offset in offsets.items()
+                ],
+                asynchronous=False,
+            )
+        except KafkaException as e:
+            if e.args[0].code() not in self.REBALANCE_ERRORS:
+                raise
+            # the partitions moved to another consumer, which gets the
+            # uncommitted messages again
+            logger.warning("Offsets not committed during a rebalance: %s", e)
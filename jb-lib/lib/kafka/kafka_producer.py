@@ -2,6 +2,9 @@ import os
 import socket
 from typing import Dict, Optional
 from confluent_kafka import Producer
+from ..metrics import MESSAGES_PRODUCED
+from .memory import MemoryProducer, memory_backend
+from .message_context import trace_headers
 
 
 class KafkaProducer:
@@ -36,7 +39,10 @@ class KafkaProducer:
                 "client.id": client_id,
                 **producer_config,
             }
-        self.producer = Producer(self.producer_config)
+        if memory_backend():
+            self.producer = MemoryProducer(self.producer_config)
+        else:
+            self.producer = Producer(self.producer_config)
 
     @staticmethod
     def from_env_vars(
@@ -52,11 +58,15 @@ class KafkaProducer:
         - KAFKA_USE_SASL: whether to use SASL authentication (default: False)
         - KAFKA_PRODUCER_USERNAME: SASL username (default: "")
         - KAFKA_PRODUCER_PASSWORD: SASL password (default: "")
+        - KAFKA_BACKEND: memory to use the in-process broker of
+          `lib.kafka.memory`, which needs no KAFKA_BROKER (default: confluent)
         You can further override these by providing arguments in the producer_config dict.
         """
         if producer_config is None:
             producer_config = {}
-        kafka_broker = os.getenv("KAFKA_BROKER")
+        kafka_broker = os.getenv("KAFKA_BROKER") or (
+            "memory" if memory_backend() else None
+        )
         use_sasl = os.getenv("KAFKA_USE_SASL")
         producer_username = os.getenv("KAFKA_PRODUCER_USERNAME")
         producer_password = os.getenv("KAFKA_PRODUCER_PASSWORD")
@@ -86,13 +96,27 @@ class KafkaProducer:
     ):
         """Sends a message to a topic (via `produce()`) and flushes."""
 
-        self.producer.produce(topic, value=value, key=key, callback=callback_func)
+        self.producer.produce(
+            topic,
+            value=value,
+            key=key,
+            headers=trace_headers(),
+            callback=callback_func,
+        )
+        MESSAGES_PRODUCED.labels(topic=topic).inc()
         self.producer.flush()
 
     def _send_message_async(
         self, topic: str, value: str, key: Optional[str] = None, callback_func=None
     ):
-        self.producer.produce(topic, value=value, key=key, callback=callback_func)
+        self.producer.produce(
+            topic,
+            value=value,
+            key=key,
+            headers=trace_headers(),
+            callback=callback_func,
+        )
+        MESSAGES_PRODUCED.labels(topic=topic).inc()
 
     def poll_for_callback(self, timeout=1.0):
         """Polls for callback. To be used with `send_message_async`"""
@@ -0,0 +1,344 @@
+"""In-process stand-in for a Kafka cluster.
+
+With KAFKA_BACKEND set to memory, KafkaProducer and KafkaConsumer talk to a
+broker that lives in the process instead of to KAFKA_BROKER, so services and
+their tests or benchmarks can exchange messages without a Kafka cluster. The
+broker keeps what the services rely on: topics of KAFKA_TOPIC_PARTITIONS
+partitions (default: 1) created on first use, messages partitioned by key,
+offsets, and consumer groups whose members split the partitions and resume
+from the committed offsets. Messages are kept until the process exits.
+
+MemoryProducer and MemoryConsumer implement the parts of the confluent_kafka
+Producer and Consumer interfaces that lib.kafka uses.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from confluent_kafka import TIMESTAMP_CREATE_TIME, TopicPartition
+
+
+def memory_backend() -> bool:
+    """Whether KAFKA_BACKEND selects the in-process broker."""
+    return (os.getenv("KAFKA_BACKEND") or "confluent") == "memory"
+
+
+def _to_bytes(value) -> Optional[bytes]:
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return value
+
+
+class MemoryMessage:
+    def __init__(
+        self,
+        topic: str,
+        partition: int,
+        offset: int,
+        key: Optional[bytes],
+        value: Optional[bytes],
+        headers: Optional[List[Tuple[str, bytes]]],
+    ):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._headers = headers
+        self._timestamp = int(time.time() * 1000)
+
+    def topic(self) -> str:
+        return self._topic
+
+    def partition(self) -> int:
+        return self._partition
+
+    def offset(self) -> int:
+        return self._offset
+
+    def key(self) -> Optional[bytes]:
+        return self._key
+
+    def value(self) -> Optional[bytes]:
+        return self._value
+
+    def headers(self) -> Optional[List[Tuple[str, bytes]]]:
+        return self._headers
+
+    def timestamp(self) -> Tuple[int, int]:
+        return TIMESTAMP_CREATE_TIME, self._timestamp
+
+    def error(self):
+        return None
+
+
+class MemoryBroker:
+    __instance__ = None
+
+    def __init__(self, partitions: int):
+        self.partitions = partitions
+        self.topics: Dict[str, List[List[MemoryMessage]]] = {}
+        self.committed: Dict[Tuple[str, str, int], int] = {}
+        # members of each group in the order they joined, and their topics
+        self.groups: Dict[str, Dict[int, List[str]]] = {}
+        self.generations: Dict[str, int] = {}
+        self.condition = threading.Condition()
+        self._member_ids = itertools.count()
+        self._round_robin = itertools.count()
+
+    @classmethod
+    def get_instance(cls) -> "MemoryBroker":
+        if cls.__instance__ is None:
+            cls.__instance__ = cls(int(os.getenv("KAFKA_TOPIC_PARTITIONS") or 1))
+        return cls.__instance__
+
+    @classmethod
+    def reset(cls):
+        """Drops all topics, offsets and groups."""
+        cls.__instance__ = None
+
+    def topic(self, topic: str) -> List[List[MemoryMessage]]:
+        """Returns the partitions of a topic, creating it if needed."""
+        if topic not in self.topics:
+            self.topics[topic] = [[] for _ in range(self.partitions)]
+        return self.topics[topic]
+
+    def append(self, topic: str, partition: int, key, value, headers) -> MemoryMessage:
+        with self.condition:
+            partitions = self.topic(topic)
+            if partition < 0:
+                if key is None:
+                    partition = next(self._round_robin) % len(partitions)
+                else:
+                    partition = zlib.crc32(key) % len(partitions)
+            msg = MemoryMessage(
+                topic, partition, len(partitions[partition]), key, value, headers
+            )
+            partitions[partition].append(msg)
+            self.condition.notify_all()
+            return msg
+
+    def join(self, group_id: str, topics: List[str], member_id: Optional[int]) -> int:
+        with self.condition:
+            if member_id is None:
+                member_id = next(self._member_ids)
+            for topic in topics:
+                self.topic(topic)
+            self.groups.setdefault(group_id, {})[member_id] = topics
+            self.generations[group_id] = self.generations.get(group_id, 0) + 1
+            self.condition.notify_all()
+            return member_id
+
+    def leave(self, group_id: str, member_id: int):
+        with self.condition:
+            self.groups.get(group_id, {}).pop(member_id, None)
+            self.generations[group_id] = self.generations.get(group_id, 0) + 1
+            self.condition.notify_all()
+
+    def assignment(self, group_id: str, member_id: int) -> List[Tuple[str, int]]:
+        """Spreads the partitions of each topic over the members subscribed
+        to it, in the order they joined."""
+        members = self.groups.get(group_id, {})
+        assigned = []
+        for topic in members.get(member_id, []):
+            subscribed = [
+                member for member, topics in members.items() if topic in topics
+            ]
+            index = subscribed.index(member_id)
+            for partition in range(len(self.topic(topic))):
+                if partition % len(subscribed) == index:
+                    assigned.append((topic, partition))
+        return assigned
+
+
+class MemoryProducer:
+    """In-process stand-in for confluent_kafka.Producer. Delivery reports are
+    served by `poll` and `flush`, like librdkafka does."""
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.broker = MemoryBroker.get_instance()
+        self._reports: List[Tuple[Callable, MemoryMessage]] = []
+        self._lock = threading.Lock()
+
+    def produce(
+        self,
+        topic: str,
+        value=None,
+        key=None,
+        partition: int = -1,
+        on_delivery: Optional[Callable] = None,
+        callback: Optional[Callable] = None,
+        headers=None,
+        **kwargs,
+    ):
+        if isinstance(headers, dict):
+            headers = list(headers.items())
+        if headers is not None:
+            headers = [(name, _to_bytes(header)) for name, header in headers]
+        msg = self.broker.append(
+            topic, partition, _to_bytes(key), _to_bytes(value), headers or None
+        )
+        report = on_delivery or callback
+        if report is not None:
+            with self._lock:
+                self._reports.append((report, msg))
+
+    def poll(self, timeout: Optional[float] = None) -> int:
+        with self._lock:
+            reports, self._reports = self._reports, []
+        for report, msg in reports:
+            report(None, msg)
+        if not reports and timeout:
+            time.sleep(min(timeout, 0.01))
+        return len(reports)
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        self.poll(0)
+        return 0
+
+    def __len__(self) -> int:
+        return len(self._reports)
+
+
+class MemoryConsumer:
+    """In-process stand-in for confluent_kafka.Consumer."""
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.broker = MemoryBroker.get_instance()
+        self.group_id = config["group.id"]
+        self.auto_offset_reset = config.get("auto.offset.reset", "latest")
+        self.auto_commit = (
+            str(config.get("enable.auto.commit", True)).lower() == "true"
+        )
+        self.stats_cb = config.get("stats_cb")
+        self.stats_interval = int(config.get("statistics.interval.ms", 0)) / 1000
+        self._stats_at = time.monotonic()
+        self._member_id: Optional[int] = None
+        self._generation = None
+        self._positions: Dict[Tuple[str, int], int] = {}
+        self._paused: Set[Tuple[str, int]] = set()
+
+    def subscribe(self, topics: List[str], **kwargs):
+        self._member_id = self.broker.join(self.group_id, topics, self._member_id)
+
+    def _rebalance(self):
+        """Takes over the partitions assigned since the last call. Must be
+        called with the broker condition held."""
+        generation = self.broker.generations.get(self.group_id)
+        if generation == self._generation:
+            return
+        self._generation = generation
+        positions = {}
+        for topic, partition in self.broker.assignment(self.group_id, self._member_id):
+            position = self._positions.get((topic, partition))
+            if position is None:
+                position = self.broker.committed.get((self.group_id, topic, partition))
+            if position is None:
+                if self.auto_offset_reset in ("earliest", "smallest", "beginning"):
+                    position = 0
+                else:
+                    position = len(self.broker.topic(topic)[partition])
+            positions[(topic, partition)] = position
+        self._positions = positions
+        # like librdkafka, partitions are no longer paused once revoked
+        self._paused.intersection_update(positions)
+
+    def _take(self, num_messages: int) -> List[MemoryMessage]:
+        messages = []
+        for (topic, partition), position in self._positions.items():
+            if (topic, partition) in self._paused:
+                continue
+            log = self.broker.topic(topic)[partition]
+            taken = log[position : position + num_messages - len(messages)]
+            messages.extend(taken)
+            self._positions[(topic, partition)] = position + len(taken)
+            if len(messages) == num_messages:
+                break
+        return messages
+
+    def consume(
+        self, num_messages: int = 1, timeout: float = -1
+    ) -> List[MemoryMessage]:
+        if self._member_id is None:
+            raise RuntimeError("Consumer is not subscribed")
+        deadline = time.monotonic() + (timeout if timeout >= 0 else float("inf"))
+        messages = []
+        with self.broker.condition:
+            while True:
+                self._rebalance()
+                messages.extend(self._take(num_messages - len(messages)))
+                remaining = deadline - time.monotonic()
+                if len(messages) == num_messages or remaining <= 0:
+                    break
+                self.broker.condition.wait(remaining)
+            if self.auto_commit:
+                self._commit_positions()
+        self._report_stats()
+        return messages
+
+    def poll(self, timeout: float = -1) -> Optional[MemoryMessage]:
+        messages = self.consume(1, timeout)
+        return messages[0] if messages else None
+
+    def assignment(self) -> List[TopicPartition]:
+        with self.broker.condition:
+            self._rebalance()
+            return [
+                TopicPartition(topic, partition) for topic, partition in self._positions
+            ]
+
+    def pause(self, partitions: List[TopicPartition]):
+        self._paused.update((p.topic, p.partition) for p in partitions)
+
+    def resume(self, partitions: List[TopicPartition]):
+        self._paused.difference_update((p.topic, p.partition) for p in partitions)
+
+    def _commit_positions(self):
+        for (topic, partition), position in self._positions.items():
+            self.broker.committed[(self.group_id, topic, partition)] = position
+
+    def commit(self, message=None, offsets=None, asynchronous: bool = True):
+        with self.broker.condition:
+            if message is not None:
+                offsets = [
+                    TopicPartition(
+                        message.topic(), message.partition(), message.offset() + 1
+                    )
+                ]
+            if offsets is None:
+                self._commit_positions()
+                return None
+            for offset in offsets:
+                key = (self.group_id, offset.topic, offset.partition)
+                self.broker.committed[key] = offset.offset
+        return None if asynchronous else offsets
+
+    def _report_stats(self):
+        if self.stats_cb is None or self.stats_interval <= 0:
+            return
+        if time.monotonic() - self._stats_at < self.stats_interval:
+            return
+        self._stats_at = time.monotonic()
+        topics = {}
+        with self.broker.condition:
+            for (topic, partition), position in self._positions.items():
+                log = self.broker.topic(topic)[partition]
+                topics.setdefault(topic, {"partitions": {}})["partitions"][
+                    str(partition)
+                ] = {"fetch_state": "active", "consumer_lag": len(log) - position}
+        self.stats_cb(json.dumps({"topics": topics}))
+
+    def close(self):
+        if self._member_id is None:
+            return
+        with self.broker.condition:
+            if self.auto_commit:
+                self._commit_positions()
+        self.broker.leave(self.group_id, self._member_id)
+        self._member_id = None
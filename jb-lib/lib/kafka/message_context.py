@@ -0,0 +1,60 @@
+"""Context carried by the messages from one service to the next.
+
+Handling a message starts from the context it was sent in: its partition
+key, see `partition_key`, and its trace, see `lib.tracing`.
+"""
+
+import time
+from typing import List, Optional, Tuple
+from confluent_kafka import Message
+from opentelemetry import context, trace
+from ..metrics import MESSAGE_QUEUE_SECONDS, MESSAGES_CONSUMED
+from ..tracing import SENT_AT_HEADER, SpanKind, propagator, start_span
+from .partition_key import message_key, partition_key
+
+Headers = List[Tuple[str, bytes]]
+
+
+def trace_headers(headers: Optional[Headers] = None) -> Headers:
+    """Adds the current span and the send time to the headers of a message."""
+    headers = list(headers or [])
+    headers.append((SENT_AT_HEADER, str(time.time_ns()).encode("utf-8")))
+    carrier = {}
+    propagator.inject(carrier)
+    headers.extend((key, value.encode("utf-8")) for key, value in carrier.items())
+    return headers
+
+
+def set_message_context(msg: Message):
+    """Makes the context of a received message the current context.
+
+    Records the time the message spent queued as a consumer span, which
+    becomes the parent of the spans that handle the message, and counts the
+    message in the metrics.
+    """
+    partition_key.set(message_key(msg))
+    headers = {}
+    for key, value in msg.headers() or []:
+        headers[key] = value.decode("utf-8") if isinstance(value, bytes) else value
+    sent_at = headers.get(SENT_AT_HEADER)
+    sent_at = int(sent_at) if sent_at and sent_at.isdigit() else None
+    received = start_span(
+        f"{msg.topic()} receive",
+        kind=SpanKind.CONSUMER,
+        parent=propagator.extract(headers),
+        start_ns=sent_at,
+        attributes={
+            "messaging.system": "kafka",
+            "messaging.destination.name": msg.topic(),
+            "messaging.kafka.destination.partition": msg.partition(),
+            "messaging.kafka.message.offset": msg.offset(),
+        },
+    )
+    received_at = time.time_ns()
+    received.end(received_at)
+    context.attach(trace.set_span_in_context(received))
+    MESSAGES_CONSUMED.labels(topic=msg.topic()).inc()
+    if sent_at is not None:
+        MESSAGE_QUEUE_SECONDS.labels(topic=msg.topic()).observe(
+            max(received_at - sent_at, 0) / 1e9
+        )
@@ -0,0 +1,22 @@
+"""Partition key of the message being handled.
+
+Messages are keyed by the id of the user they belong to, so all messages of
+a user land on one partition and are consumed in order, by one consumer,
+even when a service runs several replicas. The api sets the key when a user's
+message comes in. Consuming a message makes its key the current partition
+key, and messages produced while handling it are sent with the same key, so
+the key follows the user's messages through every service.
+"""
+
+from contextvars import ContextVar
+from typing import Optional
+from confluent_kafka import Message
+
+partition_key: ContextVar[Optional[str]] = ContextVar("partition_key", default=None)
+
+
+def message_key(msg: Message) -> Optional[str]:
+    key = msg.key()
+    if isinstance(key, bytes):
+        return key.decode("utf-8")
+    return key
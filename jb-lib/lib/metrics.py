@@ -0,0 +1,118 @@
+"""Prometheus metrics of the services.
+
+Metrics are recorded with prometheus_client in its default registry and
+rendered in the Prometheus text format, either by the `/metrics` route of the
+api or, for the Kafka driven services, by `start_metrics_server`, which serves
+them on METRICS_PORT (default: 9090, 0 disables it) next to the service loop:
+
+    with HANDLER_SECONDS.labels(intent=flow_input.intent.value).time():
+        ...
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+from typing import Optional
+from wsgiref.simple_server import WSGIServer
+from prometheus_client import (
+    CONTENT_TYPE_LATEST as CONTENT_TYPE,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    disable_created_metrics,
+    generate_latest,
+    start_http_server,
+)
+
+logger = logging.getLogger(__name__)
+
+# no `_created` series, which would add a series per counter and histogram
+disable_created_metrics()
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+MESSAGES_CONSUMED = Counter(
+    "jb_kafka_messages_consumed", "Kafka messages consumed", ["topic"]
+)
+MESSAGES_PRODUCED = Counter(
+    "jb_kafka_messages_produced", "Kafka messages produced", ["topic"]
+)
+PRODUCE_ERRORS = Counter(
+    "jb_kafka_produce_errors", "Kafka messages that failed to be delivered", ["topic"]
+)
+MESSAGE_QUEUE_SECONDS = Histogram(
+    "jb_kafka_message_queue_seconds",
+    "Time from sending a Kafka message to receiving it",
+    ["topic"],
+    buckets=DEFAULT_BUCKETS,
+)
+CONSUMER_LAG = Gauge(
+    "jb_kafka_consumer_lag",
+    "Messages of a partition not consumed yet",
+    ["topic", "partition"],
+)
+CONSUMER_BUFFERED = Gauge(
+    "jb_kafka_consumer_buffered",
+    "Messages consumed and waiting to be handled by the service",
+    ["group"],
+)
+CONSUMER_PAUSED = Gauge(
+    "jb_kafka_consumer_paused_partitions",
+    "Partitions paused because the service has too many messages buffered",
+    ["group"],
+)
+JOBS_IN_FLIGHT = Gauge(
+    "jb_jobs_in_flight",
+    "Jobs submitted and not finished yet, by whether they run, wait for a "
+    "slot or are parked",
+    ["state"],
+)
+HANDLER_SECONDS = Histogram(
+    "jb_handler_seconds",
+    "Time spent handling a message",
+    ["intent"],
+    buckets=DEFAULT_BUCKETS,
+)
+EXTERNAL_CALL_SECONDS = Histogram(
+    "jb_external_call_seconds",
+    "Duration of calls to external providers",
+    ["provider", "operation"],
+    buckets=DEFAULT_BUCKETS,
+)
+EXTERNAL_CALL_ERRORS = Counter(
+    "jb_external_call_errors",
+    "Calls to external providers that failed",
+    ["provider", "operation"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "jb_db_query_seconds",
+    "Duration of database queries",
+    ["operation"],
+    buckets=DEFAULT_BUCKETS,
+)
+
+
+@contextmanager
+def external_call(provider: str, operation: str):
+    """Times a call to an external provider and counts its failures."""
+    try:
+        with EXTERNAL_CALL_SECONDS.labels(
+            provider=provider, operation=operation
+        ).time():
+            yield
+    except Exception:
+        EXTERNAL_CALL_ERRORS.labels(provider=provider, operation=operation).inc()
+        raise
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[WSGIServer]:
+    """Serves `/metrics` from a background thread, so metrics can be scraped
+    even while the event loop is busy. Returns None if METRICS_PORT is 0."""
+    if port is None:
+        port = int(os.getenv("METRICS_PORT") or 9090)
+    if port == 0:
+        return None
+    server, _ = start_http_server(port)
+    logger.info("Serving metrics on port %d", server.server_port)
+    return server
@@ -5,9 +5,11 @@ from sqlalchemy import (
     Column,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    UniqueConstraint,
 )
 from sqlalchemy.dialects.postgresql import JSON, JSONB, UUID
 from sqlalchemy.orm import declarative_base, relationship
@@ -58,6 +60,7 @@ class JBChannel(Base):
     created_at = Column(
         TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
     )
+    __table_args__ = (Index("ix_jb_channel_app_id_type_status", app_id, type, status),)
 
     bot = relationship("JBBot", back_populates="channels")
     users = relationship("JBUser", back_populates="channel")
@@ -75,6 +78,12 @@ class JBUser(Base):
     created_at = Column(
         TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
     )
+    __table_args__ = (
+        # a user registers once per channel, see upsert_user in api
+        UniqueConstraint(
+            channel_id, identifier, name="uq_jb_users_channel_id_identifier"
+        ),
+    )
     channel = relationship("JBChannel", back_populates="users")
 
 
@@ -93,6 +102,15 @@ class JBSession(Base):
         nullable=False,
         onupdate=func.now(),
     )
+    __table_args__ = (
+        # latest session of a user on a channel
+        Index(
+            "ix_jb_session_user_id_channel_id_updated_at",
+            user_id,
+            channel_id,
+            updated_at,
+        ),
+    )
     turns = relationship("JBTurn", back_populates="session")
 
 
@@ -100,7 +118,7 @@ class JBTurn(Base):
     __tablename__ = "jb_turn"
 
     id = Column(String, primary_key=True)
-    session_id = Column(String, ForeignKey("jb_session.id"))
+    session_id = Column(String, ForeignKey("jb_session.id"), index=True)
     bot_id = Column(String, ForeignKey("jb_bot.id"))
     channel_id = Column(String, ForeignKey("jb_channel.id"))
     user_id = Column(String, ForeignKey("jb_users.id"))
@@ -120,7 +138,7 @@ class JBMessage(Base):
     __tablename__ = "jb_message"
 
     id = Column(String, primary_key=True)
-    turn_id = Column(String, ForeignKey("jb_turn.id"))
+    turn_id = Column(String, ForeignKey("jb_turn.id"), index=True)
     message_type = Column(String)
     message = Column(JSON)
     is_user_sent = Column(Boolean, nullable=False, default=True)
@@ -253,7 +271,7 @@ class JBFSMState(Base):
         nullable=False,
         onupdate=func.now(),
     )
-    session_id = Column(String)
+    session_id = Column(String, index=True)
     state = Column(String)
     variables = Column(JSON)
     message = Column(String)
@@ -263,7 +281,7 @@ class JBWebhookReference(Base):
     __tablename__ = "jb_webhook_reference"
 
     id = Column(String, primary_key=True)
-    turn_id = Column(String)
+    turn_id = Column(String, index=True)
     created_at = Column(
         TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
     )
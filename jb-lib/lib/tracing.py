@@ -0,0 +1,140 @@
+"""Tracing of the turns as they pass through the services.
+
+Spans are recorded with the OpenTelemetry SDK. All spans of a turn share one
+trace, whose id is derived from the turn id. The current span travels with
+the Kafka messages in a W3C `traceparent` header, next to the time the
+message was sent. Receiving a message records a consumer span from the time
+it was sent to the time it was received, i.e. the time it queued, and
+services wrap the handling of the message in a span of its own, i.e. the
+time it was processed.
+
+Spans are exported according to the following environment variables:
+- TRACING_EXPORTER: none, console (stdout) or otlp (default: none)
+- OTEL_EXPORTER_OTLP_ENDPOINT: collector the otlp exporter sends the spans
+  to over HTTP, see the other OTEL_EXPORTER_OTLP_* variables of the SDK
+  (default: http://localhost:4318)
+- OTEL_SERVICE_NAME: name of the service emitting the spans
+"""
+
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+)
+from opentelemetry.sdk.trace.id_generator import RandomIdGenerator
+from opentelemetry.trace import Span, SpanKind
+from opentelemetry.trace.propagation.tracecontext import (
+    TraceContextTextMapPropagator,
+)
+
+SENT_AT_HEADER = "jb-sent-at"
+
+# reads and writes the traceparent header of the messages
+propagator = TraceContextTextMapPropagator()
+
+# trace id of the root span being started, see `start_span`
+_turn_trace_id: ContextVar[Optional[int]] = ContextVar("turn_trace_id", default=None)
+
+
+def turn_trace_id(turn_id: str) -> int:
+    """Returns the trace id of a turn."""
+    try:
+        return uuid.UUID(turn_id).int
+    except ValueError:
+        return int(hashlib.md5(turn_id.encode("utf-8")).hexdigest(), 16)
+
+
+class TurnIdGenerator(RandomIdGenerator):
+    """Gives a root span started for a turn the trace id of the turn."""
+
+    def generate_trace_id(self) -> int:
+        return _turn_trace_id.get() or super().generate_trace_id()
+
+    def is_trace_id_random(self) -> bool:
+        return _turn_trace_id.get() is None
+
+
+def span_exporter(exporter: str) -> Optional[SpanExporter]:
+    """Returns the span exporter of a TRACING_EXPORTER value."""
+    if exporter == "none":
+        return None
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    if exporter == "otlp":
+        # pylint: disable=import-outside-toplevel
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+    raise ValueError(f"Unsupported TRACING_EXPORTER: {exporter}")
+
+
+class Tracer:
+    __instance__: Optional[trace.Tracer] = None
+
+    @classmethod
+    def get_instance(cls) -> trace.Tracer:
+        if cls.__instance__ is None:
+            provider = TracerProvider(
+                resource=Resource.create(
+                    {SERVICE_NAME: os.getenv("OTEL_SERVICE_NAME") or "jb-manager"}
+                ),
+                id_generator=TurnIdGenerator(),
+            )
+            exporter = span_exporter(os.getenv("TRACING_EXPORTER") or "none")
+            if exporter is not None:
+                provider.add_span_processor(BatchSpanProcessor(exporter))
+            cls.__instance__ = provider.get_tracer("lib")
+        return cls.__instance__
+
+
+def start_span(
+    name: str,
+    kind: SpanKind = SpanKind.INTERNAL,
+    parent: Optional[Context] = None,
+    turn_id: Optional[str] = None,
+    start_ns: Optional[int] = None,
+    attributes: Optional[Dict[str, Any]] = None,
+) -> Span:
+    """Starts a span, by default a child of the current span. With a
+    `turn_id`, the span belongs to the trace of that turn."""
+    attributes = dict(attributes or {})
+    token = None
+    if turn_id is not None:
+        attributes["jb.turn_id"] = turn_id
+        trace_id = turn_trace_id(turn_id)
+        if trace.get_current_span(parent).get_span_context().trace_id != trace_id:
+            # a root span, see TurnIdGenerator
+            parent = Context()
+            token = _turn_trace_id.set(trace_id)
+    try:
+        return Tracer.get_instance().start_span(
+            name,
+            context=parent,
+            kind=kind,
+            attributes=attributes,
+            start_time=start_ns,
+        )
+    finally:
+        if token is not None:
+            _turn_trace_id.reset(token)
+
+
+@contextmanager
+def span(name: str, **kwargs) -> Iterator[Span]:
+    """Runs the block in a new span, which is the current span meanwhile.
+    Takes the arguments of `start_span`. An exception raised by the block
+    is recorded on the span."""
+    with trace.use_span(start_span(name, **kwargs), end_on_exit=True) as current:
+        yield current
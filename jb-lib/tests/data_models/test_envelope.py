@@ -0,0 +1,70 @@
+import msgpack
+import pytest
+from lib.data_models import (
+    Channel,
+    ChannelIntent,
+    Flow,
+    FlowIntent,
+    Language,
+    decode_message,
+    encode_message,
+)
+from lib.data_models.envelope import CONTENT_TYPE_HEADER, CONTENT_TYPES
+
+flow = Flow(
+    source="channel",
+    intent=FlowIntent.USER_INPUT,
+    user_input={
+        "turn_id": "turn_id",
+        "message": {"message_type": "text", "text": {"body": "Hello"}},
+    },
+)
+channel = Channel(
+    source="flow",
+    turn_id="turn_id",
+    intent=ChannelIntent.CHANNEL_OUT,
+    bot_output={
+        "message_type": "button",
+        "button": {
+            "header": "Header",
+            "body": "Pick one",
+            "footer": "Footer",
+            "options": [{"option_id": "1", "option_text": "One"}],
+        },
+    },
+)
+language = Language(
+    source="channel",
+    turn_id="turn_id",
+    intent="language_in",
+    message={"message_type": "audio", "audio": {"media_url": "https://audio"}},
+)
+
+
+@pytest.mark.parametrize("encoding", ["json", "msgpack"])
+@pytest.mark.parametrize("message", [flow, channel, language])
+def test_message_round_trips(encoding, message):
+    value, headers = encode_message(message, encoding=encoding)
+
+    assert isinstance(value, bytes)
+    assert decode_message(type(message), value, headers) == message
+
+
+def test_msgpack_message_is_tagged_msgpack():
+    value, headers = encode_message(flow, encoding="msgpack")
+
+    assert headers == [(CONTENT_TYPE_HEADER, CONTENT_TYPES["msgpack"].encode())]
+    assert msgpack.unpackb(value) == flow.model_dump(mode="json", exclude_none=True)
+
+
+def test_message_without_content_type_is_json():
+    value = flow.model_dump_json(exclude_none=True).encode("utf-8")
+
+    assert decode_message(Flow, value, None) == flow
+
+
+def test_unknown_content_type_raises():
+    value, _ = encode_message(flow)
+
+    with pytest.raises(ValueError):
+        decode_message(Flow, value, [(CONTENT_TYPE_HEADER, b"application/xml")])
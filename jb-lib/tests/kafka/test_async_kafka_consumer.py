@@ -0,0 +1,143 @@
+import asyncio
+import time
+from typing import Optional
+from unittest.mock import MagicMock
+import pytest
+from confluent_kafka import KafkaException
+from lib.kafka import AsyncKafkaConsumer, partition_key
+
+
+def kafka_message(value: str, key: Optional[str] = None):
+    msg = MagicMock()
+    msg.value.return_value = value.encode("utf-8")
+    msg.key.return_value = key.encode("utf-8") if key is not None else None
+    return msg
+
+
+def mock_consumer(*batches):
+    """Consumer whose consume returns `batches` in order, then nothing, and
+    nothing while it is paused."""
+    batches = list(batches)
+    paused = []
+
+    def consume(num_messages, timeout):
+        if batches and not paused:
+            batch = batches.pop(0)
+            if isinstance(batch, Exception):
+                raise batch
+            return batch
+        time.sleep(0.01)
+        return []
+
+    consumer = MagicMock()
+    consumer.consume.side_effect = consume
+    consumer.pause.side_effect = lambda: paused.append(True) or 1
+    consumer.resume.side_effect = paused.clear
+    return consumer
+
+
+@pytest.mark.asyncio
+async def test_messages_are_received_in_order():
+    consumer = mock_consumer(
+        [kafka_message("first")], [], [kafka_message("second"), kafka_message("third")]
+    )
+    async_consumer = AsyncKafkaConsumer(consumer, topics=["test_topic"])
+
+    received = []
+    async for msg in async_consumer:
+        received.append(msg)
+        if len(received) == 3:
+            break
+    await async_consumer.close()
+
+    assert received == ["first", "second", "third"]
+    consumer.subscribe.assert_called_once_with(["test_topic"])
+    consumer.consumer.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_event_loop_is_free_while_consuming():
+    consumer = mock_consumer()
+    async_consumer = AsyncKafkaConsumer(consumer, topics=["test_topic"])
+
+    receive = asyncio.create_task(async_consumer.receive_message())
+    ticks = 0
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+        ticks += 1
+    receive.cancel()
+    await async_consumer.close()
+
+    assert ticks == 5
+    assert consumer.consume.call_count > 0
+
+
+@pytest.mark.asyncio
+async def test_partitions_are_paused_while_the_buffer_is_full():
+    consumer = mock_consumer(*[[kafka_message(str(i))] for i in range(10)])
+    async_consumer = AsyncKafkaConsumer(
+        consumer, topics=["test_topic"], batch_linger=0.01, max_buffered=4
+    )
+
+    assert await async_consumer.receive_message() == "0"
+    await asyncio.sleep(0.05)
+    consumer.pause.assert_called()
+    consumer.resume.assert_not_called()
+    assert async_consumer._buffered == 4
+    # the consumer keeps polling while paused, so it stays in its group
+    polls = consumer.consume.call_count
+    await asyncio.sleep(0.05)
+    assert consumer.consume.call_count > polls
+
+    received = [await async_consumer.receive_message() for _ in range(2)]
+    await asyncio.sleep(0.05)
+    consumer.resume.assert_called_once()
+    received += [await async_consumer.receive_message() for _ in range(7)]
+    assert received == [str(i) for i in range(1, 10)]
+    await async_consumer.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_is_committed_after_it_is_processed():
+    first_batch = [kafka_message("1"), kafka_message("2")]
+    second_batch = [kafka_message("3")]
+    consumer = mock_consumer(first_batch, second_batch)
+    async_consumer = AsyncKafkaConsumer(
+        consumer, topics=["test_topic"], batch_size=2, batch_linger=0.01
+    )
+
+    batches = async_consumer.batches()
+    assert await batches.__anext__() == first_batch
+    consumer.commit.assert_not_called()
+
+    assert await batches.__anext__() == second_batch
+    consumer.commit.assert_called_once_with(first_batch)
+    consumer.consume.assert_called_with(2, 0.01)
+    await async_consumer.close()
+
+
+@pytest.mark.asyncio
+async def test_received_message_key_becomes_the_partition_key():
+    consumer = mock_consumer(
+        [kafka_message("first", key="user-1"), kafka_message("second")]
+    )
+    async_consumer = AsyncKafkaConsumer(consumer, topics=["test_topic"])
+
+    assert await async_consumer.receive_message() == "first"
+    assert partition_key.get() == "user-1"
+    assert await async_consumer.receive_message() == "second"
+    assert partition_key.get() is None
+    await async_consumer.close()
+
+
+@pytest.mark.asyncio
+async def test_consume_errors_are_raised():
+    consumer = mock_consumer([kafka_message("message")], KafkaException("fatal"))
+    async_consumer = AsyncKafkaConsumer(consumer, topics=["test_topic"])
+
+    assert await async_consumer.receive_message() == "message"
+    with pytest.raises(KafkaException):
+        await async_consumer.receive_message()
+    with pytest.raises(StopAsyncIteration):
+        await async_consumer.__anext__()
+    await async_consumer.close()
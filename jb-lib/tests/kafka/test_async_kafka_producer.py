@@ -0,0 +1,131 @@
+import contextvars
+from unittest.mock import MagicMock
+import pytest
+from confluent_kafka import KafkaException
+from lib.kafka import AsyncKafkaProducer, partition_key
+
+
+def mock_producer(errors=None, queue_size=None):
+    """Producer that reports deliveries, with `errors` in order, when polled."""
+    errors = list(errors or [])
+    pending = []
+
+    def produce(topic, value, key, headers, on_delivery):
+        if queue_size is not None and len(pending) >= queue_size:
+            raise BufferError("Local: Queue full")
+        pending.append(on_delivery)
+
+    def poll(timeout):
+        while pending:
+            pending.pop(0)(errors.pop(0) if errors else None, MagicMock())
+        return 0
+
+    producer = MagicMock()
+    producer.producer.produce.side_effect = produce
+    producer.producer.poll.side_effect = poll
+    producer.producer.flush.return_value = 0
+    return producer
+
+
+def test_send_message_does_not_flush():
+    producer = mock_producer()
+    async_producer = AsyncKafkaProducer(producer, poll_timeout=0.01)
+
+    delivery = async_producer.send_message("test_topic", "test_value", key="key")
+
+    assert delivery.result(timeout=1) is not None
+    producer.producer.flush.assert_not_called()
+    async_producer.close()
+    producer.producer.flush.assert_called_once()
+
+
+def test_failed_delivery_raises():
+    producer = mock_producer(errors=["test_error"])
+    async_producer = AsyncKafkaProducer(producer, poll_timeout=0.01)
+
+    delivery = async_producer.send_message("test_topic", "test_value")
+
+    with pytest.raises(KafkaException):
+        delivery.result(timeout=1)
+    async_producer.close()
+
+
+def test_message_is_keyed_like_the_one_being_handled():
+    producer = mock_producer()
+    async_producer = AsyncKafkaProducer(producer, poll_timeout=0.01)
+
+    def handle():
+        partition_key.set("user-1")
+        async_producer.send_message("test_topic", "keyed")
+        async_producer.send_message("test_topic", "explicit", key="user-2")
+
+    contextvars.copy_context().run(handle)
+    async_producer.close()
+
+    keys = [call.kwargs["key"] for call in producer.producer.produce.call_args_list]
+    assert keys == ["user-1", "user-2"]
+
+
+def test_full_queue_waits_for_deliveries():
+    producer = mock_producer(queue_size=1)
+    async_producer = AsyncKafkaProducer(producer, poll_timeout=0.01)
+    async_producer.close()  # only the retry polls, not the background thread
+
+    deliveries = [
+        async_producer.send_message("test_topic", str(i)) for i in range(3)
+    ]
+    producer.producer.poll(0)
+
+    assert all(delivery.done() for delivery in deliveries)
+
+
+@pytest.mark.asyncio
+async def test_deliver_waits_for_delivery():
+    producer = mock_producer()
+    async_producer = AsyncKafkaProducer(producer, poll_timeout=0.01)
+
+    assert await async_producer.deliver("test_topic", "test_value") is not None
+    async_producer.close()
+
+
+@pytest.mark.asyncio
+async def test_deliveries_retry_failed_messages_with_their_key():
+    producer = mock_producer(errors=[None, "test_error"])
+    async_producer = AsyncKafkaProducer(
+        producer, poll_timeout=0.01, retry_backoff=0.01
+    )
+    deliveries = async_producer.deliveries()
+
+    def handle():
+        partition_key.set("user-1")
+        deliveries.send_message("test_topic", "delivered")
+        deliveries.send_message("test_topic", "retried")
+
+    contextvars.copy_context().run(handle)
+    await deliveries.wait()
+    async_producer.close()
+
+    sent = [
+        (call.args[0], call.kwargs["value"], call.kwargs["key"])
+        for call in producer.producer.produce.call_args_list
+    ]
+    assert sent == [
+        ("test_topic", "delivered", "user-1"),
+        ("test_topic", "retried", "user-1"),
+        ("test_topic", "retried", "user-1"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_deliveries_give_up_after_max_retries():
+    producer = mock_producer(errors=["test_error"] * 3)
+    async_producer = AsyncKafkaProducer(
+        producer, poll_timeout=0.01, max_retries=2, retry_backoff=0.01
+    )
+    deliveries = async_producer.deliveries()
+
+    deliveries.send_message("test_topic", "test_value")
+    await deliveries.wait()
+    async_producer.close()
+
+    assert producer.producer.produce.call_count == 3
@@ -0,0 +1,137 @@
+import json
+from unittest.mock import MagicMock, patch
+import pytest
+from confluent_kafka import KafkaError, KafkaException, TopicPartition
+from lib.kafka import KafkaConsumer
+from lib.kafka.kafka_consumer import record_consumer_lag
+from lib.metrics import REGISTRY
+
+
+def kafka_message(topic="test_topic", partition=0, offset=0, error=None):
+    msg = MagicMock()
+    msg.topic.return_value = topic
+    msg.partition.return_value = partition
+    msg.offset.return_value = offset
+    msg.error.return_value = error
+    return msg
+
+
+@pytest.fixture
+def consumer():
+    with patch("lib.kafka.kafka_consumer.Consumer"):
+        yield KafkaConsumer(
+            "localhost:9092",
+            "test_group_id",
+            "latest",
+            consumer_config={"enable.auto.commit": False},
+        )
+
+
+def test_consume_skips_non_fatal_errors(consumer):
+    error = MagicMock()
+    error.fatal.return_value = False
+    messages = [kafka_message(offset=0), kafka_message(error=error)]
+    consumer.consumer.consume.return_value = messages
+
+    assert consumer.consume(num_messages=10, timeout=0.5) == messages[:1]
+    consumer.consumer.consume.assert_called_once_with(10, 0.5)
+
+
+def test_consume_raises_fatal_errors(consumer):
+    error = MagicMock()
+    error.fatal.return_value = True
+    consumer.consumer.consume.return_value = [kafka_message(error=error)]
+
+    with pytest.raises(KafkaException):
+        consumer.consume()
+
+
+def test_commit_commits_the_next_offset_of_each_partition(consumer):
+    consumer.commit(
+        [
+            kafka_message(partition=0, offset=4),
+            kafka_message(partition=1, offset=7),
+            kafka_message(partition=0, offset=5),
+        ]
+    )
+
+    consumer.consumer.commit.assert_called_once_with(
+        offsets=[
+            TopicPartition("test_topic", 0, 6),
+            TopicPartition("test_topic", 1, 8),
+        ],
+        asynchronous=False,
+    )
+    assert consumer.consumer_config["enable.auto.commit"] is False
+
+
+def test_commit_during_a_rebalance_is_skipped(consumer):
+    consumer.consumer.commit.side_effect = KafkaException(
+        KafkaError(KafkaError.REBALANCE_IN_PROGRESS)
+    )
+    consumer.commit([kafka_message(offset=4)])
+
+    consumer.consumer.commit.side_effect = KafkaException(
+        KafkaError(KafkaError._TRANSPORT)
+    )
+    with pytest.raises(KafkaException):
+        consumer.commit([kafka_message(offset=4)])
+
+
+@pytest.fixture
+def consumer_env(monkeypatch):
+    monkeypatch.setenv("KAFKA_BROKER", "localhost:9092")
+    monkeypatch.delenv("KAFKA_USE_SASL", raising=False)
+    monkeypatch.delenv("KAFKA_CONSUMER_GROUP_ID", raising=False)
+    monkeypatch.delenv("KAFKA_CONSUMER_INSTANCE_ID", raising=False)
+    with patch("lib.kafka.kafka_consumer.Consumer"):
+        yield monkeypatch
+
+
+def test_from_env_vars_uses_cooperative_dynamic_membership(consumer_env):
+    consumer = KafkaConsumer.from_env_vars("flow", "latest")
+
+    assert consumer.consumer_config["group.id"] == "flow"
+    assert consumer.consumer_config["partition.assignment.strategy"] == (
+        "cooperative-sticky"
+    )
+    assert "group.instance.id" not in consumer.consumer_config
+
+
+def test_from_env_vars_configures_group_and_static_membership(consumer_env):
+    consumer_env.setenv("KAFKA_CONSUMER_GROUP_ID", "flow-canary")
+    consumer_env.setenv("KAFKA_CONSUMER_INSTANCE_ID", "flow-0")
+
+    consumer = KafkaConsumer.from_env_vars(
+        "flow", "latest", consumer_config={"session.timeout.ms": 60000}
+    )
+
+    assert consumer.consumer_config["group.id"] == "flow-canary"
+    assert consumer.consumer_config["group.instance.id"] == "flow-0"
+    assert consumer.consumer_config["session.timeout.ms"] == 60000
+
+
+def test_consumer_lag_is_recorded_for_assigned_partitions():
+    record_consumer_lag(
+        json.dumps(
+            {
+                "topics": {
+                    "test_lag_topic": {
+                        "partitions": {
+                            "0": {"fetch_state": "active", "consumer_lag": 5},
+                            "1": {"fetch_state": "none", "consumer_lag": -1},
+                            "-1": {"fetch_state": "none", "consumer_lag": -1},
+                        }
+                    }
+                }
+            }
+        )
+    )
+
+    def lag(partition):
+        return REGISTRY.get_sample_value(
+            "jb_kafka_consumer_lag", {"topic": "test_lag_topic", "partition": partition}
+        )
+
+    assert lag("0") == 5
+    assert lag("1") is None
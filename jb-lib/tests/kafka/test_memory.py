@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from lib.kafka import (
+    AsyncKafkaConsumer,
+    AsyncKafkaProducer,
+    KafkaConsumer,
+    KafkaProducer,
+)
+from lib.kafka.memory import MemoryBroker, MemoryConsumer, MemoryProducer
+
+
+@pytest.fixture(autouse=True)
+def memory_backend(monkeypatch):
+    monkeypatch.setenv("KAFKA_BACKEND", "memory")
+    monkeypatch.setenv("KAFKA_TOPIC_PARTITIONS", "4")
+    monkeypatch.delenv("KAFKA_BROKER", raising=False)
+    monkeypatch.delenv("KAFKA_USE_SASL", raising=False)
+    MemoryBroker.reset()
+    yield
+    MemoryBroker.reset()
+
+
+def consumer(group_id: str, auto_commit: bool = True) -> MemoryConsumer:
+    memory_consumer = MemoryConsumer(
+        {
+            "group.id": group_id,
+            "auto.offset.reset": "earliest",
+            "enable.auto.commit": auto_commit,
+        }
+    )
+    memory_consumer.subscribe(["test_topic"])
+    return memory_consumer
+
+
+def test_messages_of_a_key_stay_in_order_on_one_partition():
+    producer = MemoryProducer({})
+    for i in range(10):
+        producer.produce("test_topic", value=str(i), key=f"user-{i % 2}")
+
+    messages = consumer("group").consume(num_messages=20, timeout=0)
+
+    by_key = {}
+    for msg in messages:
+        by_key.setdefault(msg.key(), []).append((msg.partition(), msg.value()))
+    assert [value for _, value in by_key[b"user-0"]] == [b"0", b"2", b"4", b"6", b"8"]
+    assert len({partition for partition, _ in by_key[b"user-0"]}) == 1
+    assert len(messages) == 10
+
+
+def test_group_members_split_the_partitions_and_groups_get_all():
+    producer = MemoryProducer({})
+    for i in range(40):
+        producer.produce("test_topic", value=str(i), key=str(i))
+    first, second = consumer("group"), consumer("group")
+    other = consumer("other_group")
+
+    first_messages = first.consume(num_messages=100, timeout=0)
+    second_messages = second.consume(num_messages=100, timeout=0)
+
+    first_partitions = {msg.partition() for msg in first_messages}
+    second_partitions = {msg.partition() for msg in second_messages}
+    assert first_partitions.isdisjoint(second_partitions)
+    assert len(first_messages) + len(second_messages) == 40
+    assert len(other.consume(num_messages=100, timeout=0)) == 40
+
+
+def test_consumer_resumes_from_the_committed_offset():
+    producer = MemoryProducer({})
+    for i in range(3):
+        producer.produce("test_topic", value=str(i))
+    first = consumer("group", auto_commit=False)
+    (msg,) = first.consume(num_messages=1, timeout=0)
+    first.commit(message=msg, asynchronous=False)
+    first.consume(num_messages=1, timeout=0)
+    first.close()
+
+    values = [msg.value() for msg in consumer("group").consume(10, timeout=0)]
+
+    assert values == [b"1", b"2"]
+
+
+def test_paused_partitions_are_not_fetched_until_resumed():
+    producer = MemoryProducer({})
+    for i in range(4):
+        producer.produce("test_topic", value=str(i), key=f"user-{i}")
+    memory_consumer = consumer("group")
+
+    memory_consumer.pause(memory_consumer.assignment())
+    assert memory_consumer.consume(num_messages=10, timeout=0) == []
+
+    memory_consumer.resume(memory_consumer.assignment())
+    assert len(memory_consumer.consume(num_messages=10, timeout=0)) == 4
+
+
+def test_delivery_reports_are_served_by_poll():
+    producer = MemoryProducer({})
+    reports = []
+    producer.produce(
+        "test_topic", value="value", on_delivery=lambda *report: reports.append(report)
+    )
+
+    assert not reports
+    assert producer.poll(0) == 1
+    err, msg = reports[0]
+    assert err is None
+    assert msg.offset() == 0
+
+
+@pytest.mark.asyncio
+async def test_services_exchange_messages_through_the_memory_backend():
+    async_consumer = AsyncKafkaConsumer(
+        KafkaConsumer.from_env_vars("test_group", "earliest"),
+        topics=["test_topic"],
+        poll_timeout=0.01,
+    )
+    async_producer = AsyncKafkaProducer(KafkaProducer.from_env_vars())
+
+    await async_producer.deliver("test_topic", "hello", key="user-1")
+    msg = await asyncio.wait_for(async_consumer.receive_raw_message(), timeout=5)
+
+    assert msg.value() == b"hello"
+    assert msg.key() == b"user-1"
+    async_producer.close()
+    await async_consumer.close()
@@ -0,0 +1,39 @@
+import contextvars
+import time
+from unittest.mock import MagicMock
+from opentelemetry import trace
+from lib.kafka import partition_key, set_message_context, trace_headers
+from lib.tracing import SENT_AT_HEADER, span
+
+
+def test_received_message_continues_the_trace_it_was_sent_in():
+    with span("channel handle", turn_id="turn_id") as sender:
+        headers = dict(trace_headers([("content-type", b"application/json")]))
+    sent = sender.get_span_context()
+    assert headers["traceparent"] == (
+        f"00-{sent.trace_id:032x}-{sent.span_id:016x}-01".encode("utf-8")
+    )
+    sent_at = int(headers[SENT_AT_HEADER])
+    assert sent_at <= time.time_ns()
+
+    msg = MagicMock()
+    msg.key.return_value = b"user_id"
+    msg.headers.return_value = list(headers.items())
+    context = contextvars.copy_context()
+    context.run(set_message_context, msg)
+
+    received = context.run(trace.get_current_span)
+    assert context[partition_key] == "user_id"
+    assert received.get_span_context().trace_id == sent.trace_id
+    assert received.parent.span_id == sent.span_id
+
+
+def test_message_without_headers_starts_a_trace():
+    msg = MagicMock()
+    msg.key.return_value = None
+    msg.headers.return_value = None
+    context = contextvars.copy_context()
+    context.run(set_message_context, msg)
+
+    assert context.run(trace.get_current_span).get_span_context().is_valid
+    assert dict(trace_headers()).keys() == {SENT_AT_HEADER}
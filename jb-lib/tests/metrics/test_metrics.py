@@ -0,0 +1,78 @@
+import socket
+import urllib.request
+import pytest
+from lib.metrics import (
+    MESSAGES_CONSUMED,
+    REGISTRY,
+    Counter,
+    Histogram,
+    external_call,
+    start_metrics_server,
+)
+
+
+def test_counter_is_counted_per_label():
+    counter = Counter("test_requests", "Requests", ["path"])
+    counter.labels(path="/a").inc()
+    counter.labels(path="/a").inc(2)
+    counter.labels(path='/"b"').inc()
+
+    assert REGISTRY.get_sample_value("test_requests_total", {"path": "/a"}) == 3
+    assert REGISTRY.get_sample_value("test_requests_total", {"path": '/"b"'}) == 1
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_latency_seconds", "Latency", buckets=[0.1, 1])
+    for value in [0.05, 0.1, 0.5, 5]:
+        histogram.observe(value)
+
+    samples = {
+        le: REGISTRY.get_sample_value("test_latency_seconds_bucket", {"le": le})
+        for le in ("0.1", "1.0", "+Inf")
+    }
+    assert samples == {"0.1": 2, "1.0": 3, "+Inf": 4}
+    assert REGISTRY.get_sample_value("test_latency_seconds_count") == 4
+    assert REGISTRY.get_sample_value("test_latency_seconds_sum") == pytest.approx(5.65)
+
+
+def test_external_call_counts_failures():
+    with pytest.raises(ValueError):
+        with external_call("test_provider", "translate"):
+            raise ValueError("unavailable")
+
+    labels = {"provider": "test_provider", "operation": "translate"}
+    assert REGISTRY.get_sample_value("jb_external_call_errors_total", labels) == 1
+    assert REGISTRY.get_sample_value("jb_external_call_seconds_count", labels) == 1
+    assert (
+        REGISTRY.get_sample_value(
+            "jb_external_call_seconds_bucket", {**labels, "le": "30.0"}
+        )
+        == 1
+    )
+
+
+def test_metrics_are_served():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        port = sock.getsockname()[1]
+    Counter("test_served", "Served").inc()
+    MESSAGES_CONSUMED.labels(topic="test_served").inc()
+
+    server = start_metrics_server(port)
+    try:
+        with urllib.request.urlopen(f"http://localhost:{port}/metrics") as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert "test_served_total 1.0" in body
+    assert "_created" not in body
+    assert 'jb_kafka_messages_consumed_total{topic="test_served"} 1.0' in body
+
+
+def test_metrics_server_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("METRICS_PORT", "0")
+
+    assert start_metrics_server() is None
@@ -0,0 +1,229 @@
+"""Checks that the lookups done for every turn use indexes.
+
+The crud functions of api, flow, channel and language are run against a
+seeded database, the statements they issue are captured and each is
+EXPLAINed with sequential scans disabled, so a lookup without a usable index
+shows up as a Seq Scan, or as an index scan without an index condition.
+
+Needs a PostgreSQL database migrated to head (`alembic upgrade head`), set by
+the POSTGRES_DATABASE_* variables, and is skipped without one.
+"""
+
+import importlib
+import importlib.util
+import json
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+import pytest
+from sqlalchemy import delete, event, select, text
+from sqlalchemy.exc import OperationalError
+from lib.db_session_handler import DBSessionHandler
+from lib.models import (
+    JBBot,
+    JBChannel,
+    JBFSMState,
+    JBMessage,
+    JBSession,
+    JBTurn,
+    JBUser,
+    JBWebhookReference,
+)
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("POSTGRES_DATABASE_HOST"), reason="needs a PostgreSQL database"
+)
+
+ROOT = Path(__file__).resolve().parents[3]
+PREFIX = "plan-test"
+USERS = 1000
+CHANNEL_TYPE = "pinnacle_whatsapp"
+TURN = f"{PREFIX}-turn-0"
+SESSION = f"{PREFIX}-session-0"
+
+
+def seed_rows() -> List:
+    bot = JBBot(id=f"{PREFIX}-bot", name="Plan test", version="0.0.1")
+    rows = [bot]
+    for i in range(USERS):
+        channel = JBChannel(
+            id=f"{PREFIX}-channel-{i}",
+            bot_id=bot.id,
+            status="active",
+            type=CHANNEL_TYPE,
+            app_id=f"{PREFIX}-app-{i}",
+        )
+        user = JBUser(
+            id=f"{PREFIX}-user-{i}",
+            channel_id=channel.id,
+            identifier=f"{PREFIX}-number-{i}",
+        )
+        rows += [channel, user]
+        for j in range(2):
+            session = JBSession(
+                id=f"{PREFIX}-session-{i * 2 + j}",
+                user_id=user.id,
+                channel_id=channel.id,
+            )
+            turn = JBTurn(
+                id=f"{PREFIX}-turn-{i * 2 + j}",
+                session_id=session.id,
+                bot_id=bot.id,
+                channel_id=channel.id,
+                user_id=user.id,
+            )
+            rows += [
+                session,
+                turn,
+                JBFSMState(id=f"{PREFIX}-state-{i * 2 + j}", session_id=session.id),
+                JBMessage(id=f"{PREFIX}-message-{i * 2 + j}", turn_id=turn.id),
+                JBWebhookReference(id=f"{PREFIX}-webhook-{i * 2 + j}", turn_id=turn.id),
+            ]
+    return rows
+
+
+def delete_seeded_rows(session):
+    for model in (
+        JBWebhookReference,
+        JBMessage,
+        JBFSMState,
+        JBTurn,
+        JBSession,
+        JBUser,
+        JBChannel,
+        JBBot,
+    ):
+        session.execute(delete(model).where(model.id.like(f"{PREFIX}-%")))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded_database():
+    try:
+        with DBSessionHandler.get_sync_session() as session:
+            delete_seeded_rows(session)
+            session.add_all(seed_rows())
+            session.commit()
+            session.execute(text("ANALYZE"))
+            session.commit()
+    except OperationalError as e:
+        pytest.skip(f"database not reachable: {e}")
+    yield
+    with DBSessionHandler.get_sync_session() as session:
+        delete_seeded_rows(session)
+        session.commit()
+
+
+def load_crud(path: str):
+    """Imports the crud module of a service, within a package of the modules
+    next to it, e.g. api_app.crud for api/app/crud.py."""
+    directory = (ROOT / path).parent
+    package = f"{directory.parent.name}_{directory.name}"
+    if package not in sys.modules:
+        spec = importlib.util.spec_from_loader(package, loader=None, is_package=True)
+        sys.modules[package] = importlib.util.module_from_spec(spec)
+        sys.modules[package].__path__ = [str(directory)]
+    return importlib.import_module(f"{package}.{Path(path).stem}")
+
+
+@contextmanager
+def captured_statements(engine) -> Iterator[List]:
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def scans(node: Dict) -> Iterator[Dict]:
+    if "Relation Name" in node:
+        yield node
+    for child in node.get("Plans", []):
+        yield from scans(child)
+
+
+async def assert_index_scans(engine, statements: List):
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(("SELECT", "UPDATE")):
+                continue
+            result = await conn.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            )
+            plan = result.scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            for scan in scans(plan[0]["Plan"]):
+                assert scan["Node Type"] != "Seq Scan", (statement, scan)
+                if scan["Node Type"] in ("Index Scan", "Index Only Scan"):
+                    assert "Index Cond" in scan, (statement, scan)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "path,function,args",
+    [
+        (
+            "api/app/crud.py",
+            "get_user_by_number",
+            (f"{PREFIX}-number-0", f"{PREFIX}-channel-0"),
+        ),
+        ("api/app/crud.py", "get_turn_user_id", (TURN,)),
+        (
+            "api/app/crud.py",
+            "get_active_channel_by_identifier",
+            (f"{PREFIX}-app-0", CHANNEL_TYPE),
+        ),
+        (
+            "api/app/crud.py",
+            "get_channels_by_identifier",
+            (f"{PREFIX}-app-0", CHANNEL_TYPE),
+        ),
+        ("flow/src/crud.py", "load_turn_context", (TURN,)),
+        ("flow/src/crud.py", "get_session_by_turn_id", (TURN,)),
+        ("flow/src/crud.py", "get_state_by_session_id", (SESSION,)),
+        ("flow/src/crud.py", "get_turn_owner", (TURN,)),
+        ("flow/src/crud.py", "update_user_language", (TURN, "en")),
+        ("channel/src/crud.py", "get_channel_by_turn_id", (TURN,)),
+        ("channel/src/crud.py", "get_user_by_turn_id", (TURN,)),
+        ("language/src/crud.py", "get_user_preferred_language", (TURN,)),
+    ],
+)
+async def test_crud_lookups_use_indexes(path, function, args):
+    crud_function = getattr(load_crud(path), function)
+    engine = DBSessionHandler.get_async_session().bind
+    try:
+        with captured_statements(engine.sync_engine) as statements:
+            await crud_function(*args)
+        assert statements
+        await assert_index_scans(engine, statements)
+    finally:
+        # the pooled connections belong to the event loop of this test
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "query",
+    [
+        select(JBMessage).where(JBMessage.turn_id == TURN),
+        select(JBWebhookReference).where(JBWebhookReference.turn_id == TURN),
+        select(JBTurn).where(JBTurn.session_id == SESSION),
+    ],
+    ids=["messages of a turn", "webhook references of a turn", "turns of a session"],
+)
+async def test_turn_relation_lookups_use_indexes(query):
+    engine = DBSessionHandler.get_async_session().bind
+    try:
+        with captured_statements(engine.sync_engine) as statements:
+            async with engine.connect() as conn:
+                await conn.execute(query)
+        await assert_index_scans(engine, statements)
+    finally:
+        await engine.dispose()
@@ -0,0 +1,79 @@
+import uuid
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from opentelemetry.trace import StatusCode
+from lib.tracing import (
+    SpanKind,
+    Tracer,
+    TurnIdGenerator,
+    span,
+    span_exporter,
+    turn_trace_id,
+)
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    """Spans finished by the tracer."""
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(
+        resource=Resource.create({SERVICE_NAME: "flow"}),
+        id_generator=TurnIdGenerator(),
+    )
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(Tracer, "__instance__", provider.get_tracer("lib"))
+    yield exporter.get_finished_spans
+
+
+def test_spans_of_a_turn_share_its_trace(exported):
+    turn_id = str(uuid.uuid4())
+
+    with span("flow handle", turn_id=turn_id) as parent:
+        assert trace.get_current_span() is parent
+        with span("flow fsm") as child:
+            pass
+    assert trace.get_current_span() is trace.INVALID_SPAN
+
+    context = parent.get_span_context()
+    assert context.trace_id == uuid.UUID(turn_id).int
+    assert parent.parent is None
+    assert child.get_span_context().trace_id == context.trace_id
+    assert child.parent.span_id == context.span_id
+    assert [s.name for s in exported()] == ["flow fsm", "flow handle"]
+
+
+def test_span_of_another_turn_starts_its_trace(exported):
+    with span("flow handle", turn_id="turn_1"):
+        with span("flow handle", turn_id="turn_2") as other:
+            pass
+
+    _, turn = exported()
+    assert other.parent is None
+    assert other.get_span_context().trace_id == turn_trace_id("turn_2")
+    assert turn.get_span_context().trace_id == turn_trace_id("turn_1")
+
+
+def test_failed_span_records_the_error(exported):
+    with pytest.raises(ValueError):
+        with span("channel handle", kind=SpanKind.CONSUMER, turn_id="turn_id"):
+            raise ValueError("failed")
+
+    (finished,) = exported()
+    assert finished.resource.attributes[SERVICE_NAME] == "flow"
+    assert finished.kind == SpanKind.CONSUMER
+    assert finished.status.status_code == StatusCode.ERROR
+    assert finished.status.description == "ValueError: failed"
+    assert finished.attributes["jb.turn_id"] == "turn_id"
+    assert finished.end_time >= finished.start_time
+
+
+def test_unsupported_exporter_raises():
+    assert span_exporter("none") is None
+    with pytest.raises(ValueError):
+        span_exporter("file")
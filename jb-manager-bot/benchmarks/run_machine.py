@@ -0,0 +1,107 @@
+"""Measures the latency of `AbstractFSM.run_machine` for one turn.
+
+A turn instantiates the FSM class, restores its state and moves it forward
+until it waits for input. The FSM here is a chain of display and input states
+with a conditional branch at every step, about the size of the tutorial bots.
+It is run with the transition table compiled once per class and, for
+comparison, with a `transitions.Machine` built and sanity checked on every
+turn, which is what `AbstractFSM.__init__` used to do.
+
+Run from the jb-manager-bot directory:
+
+    python -m benchmarks.run_machine
+"""
+
+import time
+from transitions import Machine
+from jb_manager_bot import AbstractFSM
+from jb_manager_bot.data_models import Status
+
+ROUNDS = 200
+
+
+def build_fsm_class(steps: int):
+    states = ["zero"]
+    transitions = [{"source": "zero", "dest": "step_0_display", "trigger": "next"}]
+    methods = {}
+    for step in range(steps):
+        display, user_input, logic = (
+            f"step_{step}_display",
+            f"step_{step}_input",
+            f"step_{step}_logic",
+        )
+        following = f"step_{step + 1}_display" if step + 1 < steps else "end"
+        states.extend([display, user_input, logic])
+        transitions.extend(
+            [
+                {"source": display, "dest": user_input, "trigger": "next"},
+                {"source": user_input, "dest": logic, "trigger": "next"},
+                {"source": logic, "dest": display, "trigger": "next"},
+                {
+                    "source": logic,
+                    "dest": following,
+                    "trigger": "next",
+                    "conditions": "is_valid",
+                },
+            ]
+        )
+        methods[f"on_enter_{display}"] = lambda self: self.send_message("display")
+        methods[f"on_enter_{user_input}"] = lambda self: setattr(
+            self, "status", Status.WAIT_FOR_USER_INPUT
+        )
+        methods[f"on_enter_{logic}"] = lambda self: None
+    states.append("end")
+    methods.update(
+        states=states,
+        transitions=transitions,
+        conditions={"is_valid"},
+        is_valid=lambda self: self.current_input == "valid",
+        __init__=lambda self, send_message, credentials=None: AbstractFSM.__init__(
+            self, send_message
+        ),
+    )
+    return type("BenchmarkFSM", (AbstractFSM,), methods)
+
+
+def machine_per_turn(fsm_class):
+    def _bind_machine(self):
+        transitions = list(
+            sorted(
+                self.transitions,
+                key=lambda x: (x.get("source"), x.get("conditions", "")),
+                reverse=True,
+            )
+        )
+        Machine(
+            model=self,
+            states=list(self.states),
+            transitions=transitions,
+            initial="zero",
+        )
+        self.check_sanity()
+
+    return type("MachinePerTurnFSM", (fsm_class,), {"_bind_machine": _bind_machine})
+
+
+def time_turns(fsm_class) -> float:
+    state = fsm_class.run_machine(lambda message: None)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fsm_class.run_machine(lambda message: None, user_input="invalid", state=state)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    print(f"{'states':>8} {'machine per turn':>18} {'compiled':>12} {'speedup':>8}")
+    for steps in [5, 20, 50]:
+        fsm_class = build_fsm_class(steps)
+        before = time_turns(machine_per_turn(fsm_class))
+        after = time_turns(fsm_class)
+        print(
+            f"{len(fsm_class.states):>8} {before * 1e6:>16.1f}us"
+            f" {after * 1e6:>10.1f}us {before / after:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,10 @@
 import uuid
 from abc import ABC
 from enum import Enum
-from typing import Any, Dict, List, Set
+from functools import partial
+from typing import Any, Dict, List, Set, Tuple
 from pydantic import BaseModel
-from transitions import Machine
+from transitions import Machine, MachineError
 from jb_manager_bot.data_models import (
     FSMOutput,
     Message,
@@ -31,6 +32,59 @@ class Variables(BaseModel):
     pass
 
 
+class CompiledMachine:
+    """Transition table of an FSM class, built once and shared by its instances.
+
+    `table` maps (source, trigger) to the candidate transitions as
+    (dest, conditions, unless) tuples, in the order they are tried. It is None
+    when the transitions use features the table does not cover, in which case
+    every instance gets a `transitions.Machine` as before.
+    """
+
+    SUPPORTED_KEYS = {"source", "dest", "trigger", "conditions", "unless"}
+
+    def __init__(self, states: List[str], transitions: List[Dict[str, Any]]):
+        self.states = set(states)
+        self.transitions = transitions
+        self.triggers = {transition.get("trigger") for transition in transitions}
+        self.table = self._build_table(states, transitions)
+
+    @classmethod
+    def _build_table(cls, states, transitions):
+        table: Dict[Tuple[str, str], List[Tuple[str, list, list]]] = {}
+        for transition in transitions:
+            if not cls.SUPPORTED_KEYS.issuperset(transition):
+                return None
+            dest = transition.get("dest")
+            if not isinstance(dest, str) or dest == "=":
+                return None
+            source = transition.get("source")
+            if source == "*":
+                sources = list(states)
+            elif isinstance(source, str):
+                sources = [source]
+            else:
+                sources = list(source)
+            candidate = (
+                dest,
+                cls._as_list(transition.get("conditions")),
+                cls._as_list(transition.get("unless")),
+            )
+            for source_state in sources:
+                table.setdefault((source_state, transition["trigger"]), []).append(
+                    candidate
+                )
+        return table
+
+    @staticmethod
+    def _as_list(callbacks):
+        if callbacks is None:
+            return []
+        if isinstance(callbacks, (list, tuple)):
+            return list(callbacks)
+        return [callbacks]
+
+
 class AbstractFSM(ABC):
     """Abstraction of the FSM class.
     Each use case will have its own FSM class.
@@ -60,23 +114,137 @@ class AbstractFSM(ABC):
         )
         self.return_status = self.return_status_values.SUCCESS
         self.temp_variables = {}
-        transitions = list(
-            sorted(
-                self.transitions,
-                key=lambda x: (x.get("source"), x.get("conditions", "")),
-                reverse=True,
-            )
-        )
-        Machine(
-            model=self,
-            states=list(self.states),
-            transitions=transitions,
-            initial="zero",
-        )
 
         self.__input__ = None
         self.__callback__ = None
-        self.check_sanity()
+        self._bind_machine()
+
+    @classmethod
+    def build(cls):
+        """Declares states, transitions and callbacks with the builder methods.
+
+        Override it instead of calling the builders from `__init__`. It runs
+        once per class, before the transition table is first compiled.
+        """
+
+    @classmethod
+    def compiled_machine(cls) -> CompiledMachine:
+        """Returns the transition table of the class, compiling it on first use.
+
+        The table is recompiled if the states, transitions or conditions of
+        the class have been replaced or extended since it was built.
+        """
+        if not cls.__dict__.get("__built__"):
+            cls.build()
+            cls.__built__ = True
+        signature = (
+            id(cls.states),
+            len(cls.states),
+            id(cls.transitions),
+            len(cls.transitions),
+            id(cls.conditions),
+            len(cls.conditions),
+        )
+        compiled = cls.__dict__.get("__compiled_machine__")
+        if compiled is None or compiled[0] != signature:
+            cls.check_sanity()
+            transitions = list(
+                sorted(
+                    cls.transitions,
+                    key=lambda x: (x.get("source"), x.get("conditions", "")),
+                    reverse=True,
+                )
+            )
+            compiled = (signature, CompiledMachine(list(cls.states), transitions))
+            cls.__compiled_machine__ = compiled
+        return compiled[1]
+
+    def _bind_machine(self):
+        compiled = self.compiled_machine()
+        if compiled.table is None:
+            Machine(
+                model=self,
+                states=list(self.states),
+                transitions=compiled.transitions,
+                initial="zero",
+            )
+            return
+        self.state = "zero"
+        # the same helpers Machine adds to the model
+        helpers = {"trigger": partial(self._trigger_by_name, compiled)}
+        helpers["may_trigger"] = partial(self._may_trigger_by_name, compiled)
+        for state in compiled.states:
+            helpers[f"is_{state}"] = partial(self._is_state, state)
+            helpers[f"to_{state}"] = partial(self._to_state, compiled, state)
+            helpers[f"may_to_{state}"] = partial(bool, True)
+        for trigger in compiled.triggers:
+            helpers[trigger] = partial(self._trigger, compiled, trigger)
+            helpers[f"may_{trigger}"] = partial(self._may_trigger, compiled, trigger)
+        for name, helper in helpers.items():
+            # like Machine, never shadow a method the class defines itself
+            if not hasattr(self, name):
+                setattr(self, name, helper)
+
+    def _find_dest(self, compiled: CompiledMachine, trigger: str):
+        """The destination of the first transition of the trigger from the
+        current state whose conditions pass, if any."""
+        for dest, conditions, unless in compiled.table.get((self.state, trigger), []):
+            # compared like transitions does, so truthy non-bools do not pass
+            if all(self._check(condition) == True for condition in conditions) and all(
+                self._check(condition) == False for condition in unless
+            ):
+                return dest
+        return None
+
+    def _trigger(self, compiled: CompiledMachine, trigger: str) -> bool:
+        if (self.state, trigger) not in compiled.table:
+            raise MachineError(
+                f"Can't trigger event {trigger} from state {self.state}!"
+            )
+        dest = self._find_dest(compiled, trigger)
+        if dest is None:
+            return False
+        self._to_state(compiled, dest)
+        return True
+
+    def _may_trigger(self, compiled: CompiledMachine, trigger: str) -> bool:
+        return self._find_dest(compiled, trigger) is not None
+
+    def _trigger_by_name(self, compiled: CompiledMachine, trigger: str) -> bool:
+        if trigger in compiled.triggers:
+            return self._trigger(compiled, trigger)
+        if trigger.startswith("to_") and trigger[3:] in compiled.states:
+            return self._to_state(compiled, trigger[3:])
+        raise AttributeError(f"Do not know event named '{trigger}'.")
+
+    def _may_trigger_by_name(self, compiled: CompiledMachine, trigger: str) -> bool:
+        if trigger in compiled.triggers:
+            return self._may_trigger(compiled, trigger)
+        if trigger.startswith("to_") and trigger[3:] in compiled.states:
+            return True
+        raise AttributeError(f"Do not know event named '{trigger}'.")
+
+    def _is_state(self, state: str) -> bool:
+        return self.state == state
+
+    def _to_state(self, compiled: CompiledMachine, dest: str) -> bool:
+        if dest not in compiled.states:
+            raise ValueError(f"State '{dest}' is not a registered state.")
+        on_exit = getattr(self, f"on_exit_{self.state}", None)
+        if on_exit is not None:
+            on_exit()
+        self.state = dest
+        on_enter = getattr(self, f"on_enter_{dest}", None)
+        if on_enter is not None:
+            on_enter()
+        return True
+
+    def _check(self, condition):
+        if isinstance(condition, str):
+            condition = getattr(self, condition)
+            if not callable(condition):
+                return condition
+        return condition()
 
     def initialise(self, **kwargs):
         """Method to initialise the FSM config."""
@@ -288,49 +456,70 @@ class AbstractFSM(ABC):
         )
         self.status = Status.WAIT_FOR_USER_INPUT
 
-    def create_select_language(self, state_name, destination, last_state="zero"):
-        self._add_state(state_name)
-        self._add_transition(last_state, state_name)
-        self.on_enter_select_language.__name__ = f"on_enter_{state_name}"
-        setattr(self.__class__, f"on_enter_{state_name}", self.on_enter_select_language)
-        self._add_transition(state_name, destination)
+    @classmethod
+    def create_select_language(cls, state_name, destination, last_state="zero"):
+        cls._add_state(state_name)
+        cls._add_transition(last_state, state_name)
+
+        def dynamic_fn(self):
+            self._on_enter_select_language()
+
+        dynamic_fn.__name__ = f"on_enter_{state_name}"
+        setattr(cls, f"on_enter_{state_name}", dynamic_fn)
+        cls._add_transition(state_name, destination)
 
-    def _add_state(self, state_name):
-        self.states.append(state_name)
+    @classmethod
+    def _own(cls, attribute):
+        """Returns the class's own copy of an inherited list attribute.
 
-    def _add_display_state(self, state_name):
+        The builders extend the lists in place, which must not change the
+        states or transitions of a parent class.
+        """
+        if attribute not in cls.__dict__:
+            setattr(cls, attribute, list(getattr(cls, attribute)))
+        return cls.__dict__[attribute]
+
+    @classmethod
+    def _add_state(cls, state_name):
+        states = cls._own("states")
+        if state_name not in states:
+            states.append(state_name)
+
+    @classmethod
+    def _add_display_state(cls, state_name):
         if not state_name.endswith("_display"):
             state_name = f"{state_name}_display"
-        self.states.append(state_name)
-
-    def _add_method(self, name, fn: callable):
-        setattr(self.__class__, name, fn)
-
-    def _add_input_states(self, state_name):
-        self.states.extend(
-            [
-                f"{state_name}_display",
-                f"{state_name}_input",
-                f"{state_name}_logic",
-                f"{state_name}_fail_display",
-            ]
-        )
+        cls._add_state(state_name)
 
-    def _add_transition(self, source, destination, trigger="next", conditions=None):
+    @classmethod
+    def _add_method(cls, name, fn: callable):
+        setattr(cls, name, fn)
+
+    @classmethod
+    def _add_input_states(cls, state_name):
+        for state in [
+            f"{state_name}_display",
+            f"{state_name}_input",
+            f"{state_name}_logic",
+            f"{state_name}_fail_display",
+        ]:
+            cls._add_state(state)
+
+    @classmethod
+    def _add_transition(cls, source, destination, trigger="next", conditions=None):
 
         if conditions:
-            self.transitions.append(
-                {
-                    "source": source,
-                    "dest": destination,
-                    "trigger": trigger,
-                    "conditions": conditions,
-                }
-            )
+            transition = {
+                "source": source,
+                "dest": destination,
+                "trigger": trigger,
+                "conditions": conditions,
+            }
         else:
-            self.transitions.append(
-                {"source": source, "dest": destination, "trigger": trigger}
-            )
+            transition = {"source": source, "dest": destination, "trigger": trigger}
+        transitions = cls._own("transitions")
+        if transition not in transitions:
+            transitions.append(transition)
 
     def _on_enter_empty_input(self):
         self.status = Status.WAIT_FOR_ME
@@ -340,12 +529,13 @@ class AbstractFSM(ABC):
         self.status = Status.WAIT_FOR_ME
         self.status = Status.MOVE_FORWARD
 
-    def _create_on_enter_input(self, fn_name):
+    @classmethod
+    def _create_on_enter_input(cls, fn_name):
         def dynamic_fn(self):
             return self._on_enter_empty_input()
 
         dynamic_fn.__name__ = fn_name
-        setattr(self.__class__, fn_name, dynamic_fn)
+        setattr(cls, fn_name, dynamic_fn)
 
     def _on_enter_display(
         self,
@@ -424,8 +614,9 @@ class AbstractFSM(ABC):
         self.send_message(message_payload)
         self.status = Status.MOVE_FORWARD
 
+    @classmethod
     def _create_on_enter_display(
-        self,
+        cls,
         fn_name,
         message,
         options=None,
@@ -448,7 +639,7 @@ class AbstractFSM(ABC):
             )
 
         dynamic_fn.__name__ = fn_name
-        setattr(self.__class__, fn_name, dynamic_fn)
+        setattr(cls, fn_name, dynamic_fn)
 
     def _on_enter_input_logic(
         self, write_var, options=None, message=None, validation=None
@@ -485,27 +676,30 @@ class AbstractFSM(ABC):
             setattr(self.variables, write_var, None)
         self.status = Status.MOVE_FORWARD
 
+    @classmethod
     def _create_on_enter_input_logic_method(
-        self, state_name, write_var, options, message, validation
+        cls, state_name, write_var, options, message, validation
     ):
         def dynamic_fn(self):
             self._on_enter_input_logic(write_var, options, message, validation)
 
         dynamic_fn.__name__ = f"on_enter_{state_name}"
-        setattr(self.__class__, f"on_enter_{state_name}", dynamic_fn)
+        setattr(cls, f"on_enter_{state_name}", dynamic_fn)
 
-    def _create_state_with_empty_on_enter(self, state_name):
-        self._add_state(state_name)
+    @classmethod
+    def _create_state_with_empty_on_enter(cls, state_name):
+        cls._add_state(state_name)
 
         def dynamic_fn(self):
             self.status = Status.WAIT_FOR_ME
             self.status = Status.MOVE_FORWARD
 
         dynamic_fn.__name__ = f"on_enter_{state_name}"
-        setattr(self.__class__, f"on_enter_{state_name}", dynamic_fn)
+        setattr(cls, f"on_enter_{state_name}", dynamic_fn)
 
+    @classmethod
     def create_display_task(
-        self,
+        cls,
         source,
         dest,
         message,
@@ -518,11 +712,11 @@ class AbstractFSM(ABC):
         format_variables=None,
     ):
         # if format_variables:
-        #     write_variables = {k: self.__class__.variables[k] for k in format_variables}
+        #     write_variables = {k: cls.variables[k] for k in format_variables}
         #     message = message.format(write_variables)
-        self._add_display_state(source)
-        self._add_transition(source, dest)
-        self._create_on_enter_display(
+        cls._add_display_state(source)
+        cls._add_transition(source, dest)
+        cls._create_on_enter_display(
             f"on_enter_{source}",
             message,
             options,
@@ -533,8 +727,9 @@ class AbstractFSM(ABC):
             dest_channel,
         )
 
+    @classmethod
     def create_input_task(
-        self,
+        cls,
         name,
         message,
         success_dest,
@@ -549,12 +744,11 @@ class AbstractFSM(ABC):
         validation_expression=None,
     ):
 
-        self._add_input_states(name)
-        self._add_transition(f"{name}_display", f"{name}_input")
-        self._add_transition(f"{name}_input", f"{name}_logic")
-        self._add_transition(f"{name}_logic", fail_dest)
+        cls._add_input_states(name)
+        cls._add_transition(f"{name}_display", f"{name}_input")
+        cls._add_transition(f"{name}_input", f"{name}_logic")
 
-        self._create_on_enter_display(
+        cls._create_on_enter_display(
             f"on_enter_{name}_display",
             message,
             options,
@@ -564,28 +758,31 @@ class AbstractFSM(ABC):
             media_url,
         )
 
-        self._create_on_enter_input(f"on_enter_{name}_input")
-        self._create_on_enter_input_logic_method(
+        cls._create_on_enter_input(f"on_enter_{name}_input")
+        cls._create_on_enter_input_logic_method(
             f"{name}_logic", write_var, options, message, validation_expression
         )
-        self._create_is_valid_method(
+        cls._create_is_valid_method(
             f"is_valid_{write_var}", validation_expression, write_var
         )
-        self._add_transition(
+        # transitions are tried in order, the fallback goes last
+        cls._add_transition(
             f"{name}_logic", success_dest, conditions=f"is_valid_{write_var}"
         )
+        cls._add_transition(f"{name}_logic", fail_dest)
 
-    def create_branching_task(self, source, transitions):
-        self._create_state_with_empty_on_enter(source)
+    @classmethod
+    def create_branching_task(cls, source, transitions):
+        cls._create_state_with_empty_on_enter(source)
 
         for transition in transitions:
             condition = transition["condition"]
             if "expression" in transition:
                 expression = transition["expression"]
                 var = transition["variable"]
-                self._create_is_valid_method(f"{condition}", expression, var)
+                cls._create_is_valid_method(f"{condition}", expression, var)
             dest = transition["dest"]
-            self._add_transition(source, dest, conditions=condition)
+            cls._add_transition(source, dest, conditions=condition)
 
     def _on_enter_plugin(self, plugin, input_variables, output_variables, message=None):
         self.status = Status.WAIT_FOR_ME
@@ -621,8 +818,9 @@ class AbstractFSM(ABC):
 
         self.status = Status.MOVE_FORWARD
 
+    @classmethod
     def create_plugin_task(
-        self,
+        cls,
         source,
         message,
         plugin_fn,
@@ -630,22 +828,23 @@ class AbstractFSM(ABC):
         output_variables: Dict,
         transitions: List[Dict],
     ):
-        self._add_state(source)
+        cls._add_state(source)
 
         def dynamic_fn(self):
             self._on_enter_plugin(plugin_fn, input_variables, output_variables, message)
 
         dynamic_fn.__name__ = f"on_enter_{source}"
-        setattr(self.__class__, f"on_enter_{source}", dynamic_fn)
+        setattr(cls, f"on_enter_{source}", dynamic_fn)
 
         for transition in transitions:
             condition = transition["condition"]
             condition_fn_name = f"is_error_code_{condition}"
-            self._create_plugin_error_code_method(condition_fn_name, condition)
+            cls._create_plugin_error_code_method(condition_fn_name, condition)
             dest = transition["dest"]
-            self._add_transition(source, dest, conditions=condition_fn_name)
+            cls._add_transition(source, dest, conditions=condition_fn_name)
 
-    def _create_is_valid_method(self, fn_name, expression, variable):
+    @classmethod
+    def _create_is_valid_method(cls, fn_name, expression, variable):
         def dynamic_fn(self):
             variable_name = variable
             condition = expression.replace(variable_name, f"{variable_name}")
@@ -653,7 +852,7 @@ class AbstractFSM(ABC):
             return self._validate_method(variable_name, lambda_func)
 
         dynamic_fn.__name__ = f"{fn_name}"
-        setattr(self.__class__, dynamic_fn.__name__, dynamic_fn)
+        setattr(cls, dynamic_fn.__name__, dynamic_fn)
 
     def _validate_method(self, variable_name, lambda_func):
         value = getattr(self.variables, variable_name)
@@ -662,20 +861,22 @@ class AbstractFSM(ABC):
     def _plugin_error_code_validation(self, error_code):
         return self.temp_variables["error_code"] == error_code
 
-    def _create_plugin_error_code_method(self, name, error_code):
+    @classmethod
+    def _create_plugin_error_code_method(cls, name, error_code):
         def dynamic_fn(self):
             return self._plugin_error_code_validation(error_code)
 
         dynamic_fn.__name__ = name
-        setattr(self.__class__, name, dynamic_fn)
+        setattr(cls, name, dynamic_fn)
 
     def _on_enter_assign(self, variable_name, lambda_func):
         value = getattr(self.variables, variable_name)
         setattr(self.variables, variable_name, lambda_func(value))
 
-    def create_assign_task(self, source, dest, fn_name, expression, variable):
-        self._add_display_state(source)
-        self._add_transition(source, dest)
+    @classmethod
+    def create_assign_task(cls, source, dest, fn_name, expression, variable):
+        cls._add_display_state(source)
+        cls._add_transition(source, dest)
 
         def dynamic_fn(self):
             variable_name = variable
@@ -684,4 +885,4 @@ class AbstractFSM(ABC):
             setattr(self.variables, variable_name, lambda_func)
 
         dynamic_fn.__name__ = f"{fn_name}"
-        setattr(self.__class__, dynamic_fn.__name__, dynamic_fn)
+        setattr(cls, dynamic_fn.__name__, dynamic_fn)
@@ -0,0 +1,129 @@
+import unittest
+from typing import Optional
+from unittest.mock import MagicMock
+from jb_manager_bot import AbstractFSM, Variables
+from jb_manager_bot.data_models import FSMIntent
+
+
+class GreetingVariables(Variables):
+    name: Optional[str] = None
+
+
+class AgeVariables(Variables):
+    age: Optional[str] = None
+
+
+class GreetingFSM(AbstractFSM):
+    states = ["zero", "end"]
+    transitions = []
+    variable_names = GreetingVariables
+    builds = 0
+
+    def __init__(self, send_message: callable, credentials=None):
+        self.variables = self.variable_names()
+        super().__init__(send_message=send_message)
+
+    @classmethod
+    def build(cls):
+        cls.builds += 1
+        cls.create_select_language("language_selection", "welcome_display")
+        cls.create_display_task("welcome_display", "check_name", "Welcome!")
+        cls.create_branching_task(
+            "check_name",
+            [
+                {
+                    "condition": "has_name",
+                    "expression": "name is not None",
+                    "variable": "name",
+                    "dest": "end",
+                },
+                {
+                    "condition": "has_no_name",
+                    "expression": "name is None",
+                    "variable": "name",
+                    "dest": "end",
+                },
+            ],
+        )
+
+
+class AgeFSM(AbstractFSM):
+    states = ["zero", "end"]
+    transitions = [{"source": "zero", "dest": "age_display", "trigger": "next"}]
+    variable_names = AgeVariables
+
+    def __init__(self, send_message: callable, credentials=None):
+        self.variables = self.variable_names()
+        super().__init__(send_message=send_message)
+
+    @classmethod
+    def build(cls):
+        cls.create_input_task(
+            "age",
+            "How old are you?",
+            success_dest="end",
+            fail_dest="age_fail_display",
+            write_var="age",
+            validation_expression="age is not None and age.isdigit()",
+        )
+        cls.create_display_task("age_fail_display", "age_display", "Try again")
+
+
+class HelperInInitFSM(AbstractFSM):
+    states = ["zero", "end"]
+
+    def __init__(self, send_message: callable, credentials=None):
+        self.create_display_task("welcome_display", "end", "Welcome!")
+        self._add_transition("zero", "welcome_display")
+        super().__init__(send_message=send_message)
+
+
+class TestBuilders(unittest.TestCase):
+    def test_build_runs_once_per_class(self):
+        for _ in range(3):
+            GreetingFSM.run_machine(MagicMock())
+
+        self.assertEqual(GreetingFSM.builds, 1)
+        self.assertEqual(
+            GreetingFSM.states,
+            [
+                "zero",
+                "end",
+                "language_selection",
+                "welcome_display",
+                "check_name",
+            ],
+        )
+        self.assertEqual(len(GreetingFSM.transitions), 5)
+
+    def test_select_language_state_asks_for_language(self):
+        send_message = MagicMock()
+
+        state = GreetingFSM.run_machine(send_message)
+
+        self.assertEqual(state["main"]["state"], "language_selection")
+        self.assertEqual(
+            send_message.call_args.args[0].intent, FSMIntent.LANGUAGE_CHANGE
+        )
+
+    def test_input_task_moves_on_when_the_input_is_valid(self):
+        for age, state in [("42", "end"), ("old", "age_fail_display")]:
+            fsm = AgeFSM(MagicMock())
+            fsm.state = "age_logic"
+            fsm.variables.age = age
+            fsm.next()
+
+            self.assertEqual(fsm.state, state)
+
+    def test_builders_called_from_init_do_not_grow_the_class(self):
+        for _ in range(3):
+            HelperInInitFSM(MagicMock())
+
+        self.assertEqual(HelperInInitFSM.states, ["zero", "end", "welcome_display"])
+        self.assertEqual(len(HelperInInitFSM.transitions), 2)
+        self.assertEqual(AbstractFSM.states, [])
+        self.assertEqual(AbstractFSM.transitions, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from typing import Optional
+from unittest.mock import patch
+from transitions import Machine, MachineError
+from jb_manager_bot import AbstractFSM, Variables
+from jb_manager_bot.data_models import Status
+
+
+class AgeVariables(Variables):
+    age: Optional[int] = None
+
+
+class AgeFSM(AbstractFSM):
+    states = ["zero", "ask_age", "adult", "minor", "end"]
+    transitions = [
+        {"source": "zero", "dest": "ask_age", "trigger": "next"},
+        {"source": "ask_age", "dest": "minor", "trigger": "next"},
+        {
+            "source": "ask_age",
+            "dest": "adult",
+            "trigger": "next",
+            "conditions": "is_adult",
+        },
+        {"source": "adult", "dest": "end", "trigger": "next"},
+        {"source": "minor", "dest": "end", "trigger": "next"},
+    ]
+    conditions = {"is_adult"}
+    output_variables = {"age"}
+    variable_names = AgeVariables
+
+    def __init__(self, send_message: callable, credentials=None):
+        self.variables = self.variable_names()
+        super().__init__(send_message=send_message)
+
+    def on_enter_ask_age(self):
+        self.status = Status.WAIT_FOR_USER_INPUT
+
+    def on_enter_adult(self):
+        self.send_message("adult")
+
+    def on_enter_minor(self):
+        self.send_message("minor")
+
+    def is_adult(self):
+        return int(self.current_input) >= 18
+
+
+class TestCompiledMachine(unittest.TestCase):
+    def run_turns(self, *user_inputs):
+        messages = []
+        state = None
+        for user_input in user_inputs:
+            state = AgeFSM.run_machine(messages.append, user_input, state=state)
+        return messages, state
+
+    def test_conditions_are_tried_before_the_fallback_transition(self):
+        messages, state = self.run_turns(None, "30")
+        self.assertEqual(messages, ["adult"])
+        self.assertEqual(state["main"]["state"], "zero")
+
+        messages, _ = self.run_turns(None, "12")
+        self.assertEqual(messages, ["minor"])
+
+    def test_machine_is_compiled_once_per_class(self):
+        if "__compiled_machine__" in AgeFSM.__dict__:
+            del AgeFSM.__compiled_machine__
+        with patch.object(AgeFSM, "check_sanity") as mock_check_sanity:
+            self.run_turns(None, "30", None, "12")
+        mock_check_sanity.assert_called_once()
+
+    def test_extending_the_class_recompiles(self):
+        class ExtendedFSM(AgeFSM):
+            states = list(AgeFSM.states)
+            transitions = list(AgeFSM.transitions)
+
+        first = ExtendedFSM.compiled_machine()
+        ExtendedFSM.transitions.append(
+            {"source": "end", "dest": "ask_age", "trigger": "next"}
+        )
+        self.assertIsNot(ExtendedFSM.compiled_machine(), first)
+        self.assertIn(("end", "next"), ExtendedFSM.compiled_machine().table)
+        self.assertIs(ExtendedFSM.compiled_machine(), ExtendedFSM.compiled_machine())
+
+    def test_trigger_without_transition_raises(self):
+        fsm = AgeFSM(print)
+        fsm.state = "end"
+        with self.assertRaises(MachineError):
+            fsm.next()
+
+    def test_helpers_of_machine_are_bound(self):
+        model = type("Model", (), {})()
+        Machine(
+            model=model,
+            states=AgeFSM.states,
+            transitions=AgeFSM.transitions,
+            initial="zero",
+        )
+        fsm = AgeFSM(print)
+        for name in vars(model):
+            self.assertTrue(hasattr(fsm, name), name)
+
+    def test_helpers_behave_like_machine(self):
+        messages = []
+        fsm = AgeFSM(messages.append)
+        self.assertTrue(fsm.is_zero())
+        self.assertTrue(fsm.to_minor())
+        self.assertTrue(fsm.is_minor())
+        self.assertEqual(messages, ["minor"])
+        self.assertTrue(fsm.may_next())
+        self.assertTrue(fsm.trigger("next"))
+        self.assertEqual(fsm.state, "end")
+        self.assertFalse(fsm.may_next())
+        self.assertTrue(fsm.trigger("to_ask_age"))
+        fsm.submit_input("30")
+        self.assertTrue(fsm.may_trigger("next"))
+        fsm.next()
+        self.assertEqual(messages, ["minor", "adult"])
+        with self.assertRaises(AttributeError):
+            fsm.trigger("unknown")
+
+    def test_unsupported_transition_falls_back_to_machine(self):
+        class CallbackFSM(AgeFSM):
+            transitions = [
+                {"source": "zero", "dest": "ask_age", "trigger": "next"},
+                {
+                    "source": "ask_age",
+                    "dest": "adult",
+                    "trigger": "next",
+                    "after": "on_enter_minor",
+                },
+                {"source": "adult", "dest": "end", "trigger": "next"},
+            ]
+
+        messages = []
+        state = CallbackFSM.run_machine(messages.append)
+        CallbackFSM.run_machine(messages.append, "30", state=state)
+        self.assertIsNone(CallbackFSM.compiled_machine().table)
+        self.assertEqual(messages, ["adult", "minor"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,11 @@
 """Main module for language service."""
 
 import asyncio
-import json
+import concurrent.futures
 import os
 import logging
 import traceback
-from typing import List, Callable
+from typing import List, Callable, Optional
 from dotenv import load_dotenv
 
 from .crud import (
@@ -18,9 +18,18 @@ from lib.data_models import (
     Flow,
     Language,
     LanguageIntent,
+    decode_message,
+    encode_message,
+)
+from lib.kafka import (
+    AsyncKafkaConsumer,
+    AsyncKafkaProducer,
+    Deliveries,
+    set_message_context,
 )
-from lib.kafka_utils import KafkaConsumer, KafkaProducer
 from lib.model import LanguageCodes
+from lib.metrics import HANDLER_SECONDS, start_metrics_server
+from lib.tracing import span
 
 load_dotenv()
 
@@ -34,20 +43,27 @@ channel_topic = os.getenv("KAFKA_CHANNEL_TOPIC")
 
 logger.info("Connecting with topic: %s", language_topic)
 
-consumer = KafkaConsumer.from_env_vars(
-    group_id="cooler_group_id", auto_offset_reset="latest"
+# offsets are committed once a batch of messages has been handled
+consumer = AsyncKafkaConsumer.from_env_vars(
+    group_id="language",
+    auto_offset_reset="latest",
+    topics=[language_topic],
+    manual_commit=True,
 )
-producer = KafkaProducer.from_env_vars()
+producer = AsyncKafkaProducer.from_env_vars()
 
 logger.info("Connected with topic: %s", language_topic)
 
 
-def send_message(data: Flow | Channel):
-    """Sends message to Kafka topic"""
+def send_message(
+    deliveries: Deliveries, data: Flow | Channel, key: Optional[str] = None
+) -> concurrent.futures.Future:
+    """Sends message to Kafka topic through `deliveries`, keyed like the
+    message being handled unless a key is given. Returns its delivery."""
     topic = flow_topic if isinstance(data, Flow) else channel_topic
-    msg = data.model_dump_json()
-    logger.info("Sending message to %s topic: %s", topic, msg)
-    producer.send_message(topic, msg)
+    logger.info("Sending message to %s topic: %s", topic, data)
+    value, headers = encode_message(data)
+    return deliveries.send_message(topic, value, key=key, headers=headers)
 
 
 async def handle_incoming_message(language_input: Language, callback: Callable):
@@ -85,16 +101,29 @@ async def handle_incoming_message(language_input: Language, callback: Callable):
 
 async def start():
     """Starts the language service."""
-    while True:
-        try:
-            msg = consumer.receive_message(language_topic)
-            logger.info("Received message %s", msg)
-            msg = json.loads(msg)
-            input_data = Language(**msg)
-            logger.info("Received message %s", input_data)
-            await handle_incoming_message(input_data, callback=send_message)
-        except Exception as e:
-            logger.error("Error %s :: %s", e, traceback.format_exc())
+    start_metrics_server()
+    async for batch in consumer.batches():
+        deliveries = producer.deliveries()
+
+        def send(data: Flow | Channel):
+            send_message(deliveries, data)
+
+        for msg in batch:
+            try:
+                # messages sent while handling it are keyed and traced like it
+                set_message_context(msg)
+                input_data = decode_message(Language, msg.value(), msg.headers())
+                logger.info("Received message %s", input_data)
+                with (
+                    span("language handle", turn_id=input_data.turn_id),
+                    HANDLER_SECONDS.labels(intent=input_data.intent.value).time(),
+                ):
+                    await handle_incoming_message(input_data, callback=send)
+            except Exception as e:
+                logger.error("Error %s :: %s", e, traceback.format_exc())
+        # the batch is committed once the messages sent for it are delivered,
+        # or given up after retrying them
+        await deliveries.wait()
 
 
 asyncio.run(start())
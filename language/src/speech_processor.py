@@ -9,6 +9,7 @@ from abc import ABC, abstractmethod
 import azure.cognitiveservices.speech as speechsdk
 import httpx
 
+from lib.metrics import external_call
 from lib.model import InternalServerException, LanguageCodes
 from .audio_converter import convert_wav_bytes_to_mp3_bytes
 
@@ -431,7 +432,12 @@ class CompositeSpeechProcessor(SpeechProcessor):
             ):
                 pass
             else:
-                return await speech_processor.speech_to_text(wav_data, input_language)
+                with external_call(
+                    type(speech_processor).__name__, "speech_to_text"
+                ):
+                    return await speech_processor.speech_to_text(
+                        wav_data, input_language
+                    )
             # except Exception as exc:
             #     print("EXCEPTION", exc)
             #     excs.append(exc)
@@ -456,7 +462,12 @@ class CompositeSpeechProcessor(SpeechProcessor):
             ):
                 pass
             else:
-                return await speech_processor.text_to_speech(text, input_language)
+                with external_call(
+                    type(speech_processor).__name__, "text_to_speech"
+                ):
+                    return await speech_processor.text_to_speech(
+                        text, input_language
+                    )
         #     except Exception as exc:
         #         excs.append(exc)
 
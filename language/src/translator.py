@@ -7,6 +7,7 @@ from abc import ABC, abstractmethod
 import aiohttp
 import httpx
 
+from lib.metrics import external_call
 from lib.model import InternalServerException, LanguageCodes
 
 logger = logging.getLogger("translator")
@@ -308,11 +309,12 @@ class CompositeTranslator(Translator):
         excs = []
         for translator in self.translators:
             try:
-                return await translator.translate_text(
-                    text,
-                    source_language,
-                    destination_language,
-                )
+                with external_call(type(translator).__name__, "translate_text"):
+                    return await translator.translate_text(
+                        text,
+                        source_language,
+                        destination_language,
+                    )
             except Exception as exc:
                 excs.append(exc)
 
@@ -1,5 +1,4 @@
 import asyncio
-import json
 import logging
 import os
 import sys
@@ -8,8 +7,10 @@ import traceback
 from dotenv import load_dotenv
 from langchain_community.vectorstores import PGVector
 from langchain_openai import AzureOpenAIEmbeddings, OpenAIEmbeddings
-from lib.data_models import RAG, Flow
-from lib.kafka_utils import KafkaConsumer, KafkaProducer
+from lib.data_models import RAG, Flow, decode_message, encode_message
+from lib.kafka import AsyncKafkaConsumer, AsyncKafkaProducer
+from lib.metrics import HANDLER_SECONDS, start_metrics_server
+from lib.tracing import span
 from r2r import R2R, VectorSearchSettings
 
 load_dotenv()
@@ -22,10 +23,12 @@ flow_topic = os.getenv("KAFKA_FLOW_TOPIC")
 
 print("Connecting", file=sys.stderr)
 
-consumer = KafkaConsumer.from_env_vars(
-    group_id="cooler_group_id", auto_offset_reset="latest"
+consumer = AsyncKafkaConsumer.from_env_vars(
+    group_id="retriever",
+    auto_offset_reset="latest",
+    topics=[retriever_topic],
 )
-producer = KafkaProducer.from_env_vars()
+producer = AsyncKafkaProducer.from_env_vars()
 
 print("Connections done", file=sys.stderr)
 
@@ -61,8 +64,9 @@ def get_embeddings():
     return OpenAIEmbeddings(client="")
 
 
-def send_message(data):
-    producer.send_message(flow_topic, data)
+def send_message(data: Flow):
+    value, headers = encode_message(data)
+    producer.send_message(flow_topic, value, headers=headers)
 
 
 async def querying(
@@ -123,18 +127,16 @@ async def querying(
     flow_input = Flow(**flow_input)
 
     if callback:
-        callback(flow_input.model_dump_json())
+        callback(flow_input)
 
 
 async def start_retriever():
     """Starts the retriever server"""
+    start_metrics_server()
     logger.info("Starting Listening")
-    while True:
+    async for message in consumer.messages():
         try:
-            # will keep trying until non-null message is received
-            message = consumer.receive_message(retriever_topic, timeout=1.0)
-            data = json.loads(message)
-            data = RAG(**data)
+            data = decode_message(RAG, message.value(), message.headers())
             retriever_input = data.model_dump(
                 include={
                     "type",
@@ -145,7 +147,11 @@ async def start_retriever():
                     "do_hybrid_search",
                 }
             )
-            await querying(**retriever_input, callback=send_message)
+            with (
+                span("retriever handle", turn_id=data.turn_id),
+                HANDLER_SECONDS.labels(intent=data.type).time(),
+            ):
+                await querying(**retriever_input, callback=send_message)
         except Exception as e:
             logger.error("Exception %s :: %s", e, traceback.format_exc())
 
@@ -0,0 +1,30 @@
+#!/bin/bash
+
+# Copies the offsets committed by a consumer group on a topic to another group,
+# so that the other group resumes where the first one stopped. A group without
+# offsets starts at the end of the topic and skips the messages queued before
+# it first joined. Stop the consumers of both groups first.
+
+from_group=$1
+to_group=$2
+topic=$3
+
+# Get the container ID for the service
+CONTAINER_ID=$(./scripts/get-container-id.sh kafka)
+
+# Check for error
+if [ $? -ne 0 ]; then
+    exit 1
+fi
+
+# topic,partition,offset of each partition with a committed offset
+offsets=$(docker exec -i $CONTAINER_ID kafka-consumer-groups.sh --bootstrap-server localhost:9092 --describe --group $from_group 2>/dev/null \
+    | awk -v topic=$topic '$2 == topic && $4 ~ /^[0-9]+$/ { print $2 "," $3 "," $4 }')
+
+if [ -z "$offsets" ]; then
+    echo "No offsets committed by $from_group on $topic"
+    exit 1
+fi
+
+echo "$offsets" | docker exec -i $CONTAINER_ID bash -c \
+    "cat > /tmp/$to_group-offsets.csv && kafka-consumer-groups.sh --bootstrap-server localhost:9092 --group $to_group --reset-offsets --from-file /tmp/$to_group-offsets.csv --execute"
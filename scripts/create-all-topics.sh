@@ -10,12 +10,21 @@ while ! kafka_ready; do
     sleep 5
 done
 
+# Messages are keyed by user, so each partition can go to another consumer
+partitions=${KAFKA_TOPIC_PARTITIONS:-1}
+
 echo "Creating topics now"
 
-kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_FLOW_TOPIC --if-not-exists
-kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_LANGUAGE_TOPIC --if-not-exists
-kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_CHANNEL_TOPIC --if-not-exists
-kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_RETRIEVER_TOPIC --if-not-exists
-kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_INDEXER_TOPIC --if-not-exists
+kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_FLOW_TOPIC --partitions $partitions --if-not-exists
+kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_LANGUAGE_TOPIC --partitions $partitions --if-not-exists
+kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_CHANNEL_TOPIC --partitions $partitions --if-not-exists
+kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_RETRIEVER_TOPIC --partitions $partitions --if-not-exists
+kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_INDEXER_TOPIC --partitions $partitions --if-not-exists
+if [ -n "$KAFKA_INGEST_TOPIC" ]; then
+    kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_INGEST_TOPIC --partitions $partitions --if-not-exists
+fi
+if [ -n "$KAFKA_INGEST_DEAD_LETTER_TOPIC" ]; then
+    kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $KAFKA_INGEST_DEAD_LETTER_TOPIC --partitions $partitions --if-not-exists
+fi
 
 kafka-topics.sh --bootstrap-server localhost:9092 --list
\ No newline at end of file
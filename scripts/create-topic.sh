@@ -1,6 +1,7 @@
 #!/bin/bash
 
 topic=$1
+partitions=${2:-1}
 
 # Get the container ID for the service
 CONTAINER_ID=$(./scripts/get-container-id.sh kafka)
@@ -11,7 +12,7 @@ if [ $? -ne 0 ]; then
 fi
 
 # Create the topic
-docker exec -i $CONTAINER_ID kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $topic
+docker exec -i $CONTAINER_ID kafka-topics.sh --create --bootstrap-server localhost:9092 --topic $topic --partitions $partitions
 
 
 